@@ -0,0 +1,212 @@
+import json
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context
+
+from extensions import db
+from models import Venue, Artist, Show, Genre, venue_genre_table, artist_genre_table, DEFAULT_SHOW_DURATION
+from routing import replica_reads
+import scheduling
+
+#----------------------------------------------------------------------------#
+# Versioned read API.
+#
+# Every listing is streamed straight from a server-side cursor (yield_per)
+# through a generator response, so exporting a whole table runs in constant
+# memory and the first bytes go out as soon as the first rows arrive.
+# Results are NDJSON when asked for with ?format=ndjson or an
+# application/x-ndjson Accept header, and a chunked JSON array otherwise.
+#----------------------------------------------------------------------------#
+
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+NDJSON = 'application/x-ndjson'
+
+def wants_ndjson():
+    if request.args.get('format'):
+        return request.args['format'] == 'ndjson'
+    return request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+
+def stream(records):
+    if wants_ndjson():
+        def body():
+            for record in records:
+                yield json.dumps(record) + '\n'
+        mimetype = NDJSON
+    else:
+        def body():
+            yield '['
+            separator = ''
+            for record in records:
+                yield separator + json.dumps(record)
+                separator = ','
+            yield ']\n'
+        mimetype = 'application/json'
+    return Response(stream_with_context(body()), mimetype=mimetype)
+
+def batched(query):
+    return query.yield_per(current_app.config['API_STREAM_BATCH_SIZE'])
+
+def genres_by_owner(link_table, owner_key):
+    # Streams (owner id, [genre names]) ordered by owner id, for merging
+    # with an owner stream that has the same order.
+    names = dict(db.session.query(Genre.id, Genre.name))
+    links = batched(db.session.query(owner_key, link_table.c.genre_id).order_by(owner_key))
+    for owner_id, rows in groupby(links, key=itemgetter(0)):
+        yield owner_id, sorted(names[genre_id] for _, genre_id in rows)
+
+def with_genres(rows, genres):
+    # Merge join of two streams ordered by id.
+    pending = next(genres, None)
+    for row in rows:
+        while pending is not None and pending[0] < row.id:
+            pending = next(genres, None)
+        if pending is not None and pending[0] == row.id:
+            yield row, pending[1]
+        else:
+            yield row, []
+
+def date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    import dateutil.parser
+    try:
+        return dateutil.parser.parse(value)
+    except (ValueError, OverflowError):
+        abort(400)
+
+def entities(columns, link_table, owner_key):
+    rows = batched(db.session.query(*columns).order_by(columns[0]))
+    genres = genres_by_owner(link_table, owner_key)
+    for row, genre_names in with_genres(rows, genres):
+        record = row._asdict()
+        record['genres'] = genre_names
+        yield record
+
+@api_v1.route('/venues')
+@replica_reads
+def venues():
+    return stream(entities([
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.phone,
+        Venue.website, Venue.facebook_link, Venue.image_link,
+        Venue.seeking_talent, Venue.seeking_description,
+        Venue.upcoming_show_count, Venue.past_show_count
+    ], venue_genre_table, venue_genre_table.c.venue_id))
+
+@api_v1.route('/artists')
+@replica_reads
+def artists():
+    return stream(entities([
+        Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+        Artist.website, Artist.facebook_link, Artist.image_link,
+        Artist.seeking_venue, Artist.seeking_description,
+        Artist.upcoming_show_count, Artist.past_show_count
+    ], artist_genre_table, artist_genre_table.c.artist_id))
+
+@api_v1.route('/shows')
+@replica_reads
+def shows():
+    start = date_arg('from')
+    end = date_arg('to')
+    venue_id = request.args.get('venue_id', type=int)
+    artist_id = request.args.get('artist_id', type=int)
+
+    query = db.session.query(
+        Show.id, Show.start_time, Show.end_time,
+        Show.venue_id, Venue.name.label('venue_name'),
+        Show.artist_id, Artist.name.label('artist_name')
+    ).join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id)
+    if start:
+        query = query.filter(Show.start_time >= start)
+    if end:
+        query = query.filter(Show.start_time < end)
+    if venue_id:
+        query = query.filter(Show.venue_id == venue_id)
+    if artist_id:
+        query = query.filter(Show.artist_id == artist_id)
+    rows = batched(query.order_by(Show.start_time, Show.id))
+
+    def records():
+        for row in rows:
+            record = row._asdict()
+            record['start_time'] = row.start_time.isoformat()
+            record['end_time'] = row.end_time.isoformat()
+            yield record
+    return stream(records())
+
+def parse_booking(item):
+    # A proposed booking from a conflict check request, or an error message.
+    import dateutil.parser
+    try:
+        start = dateutil.parser.parse(item['start_time'])
+        if item.get('end_time'):
+            end = dateutil.parser.parse(item['end_time'])
+        elif item.get('duration'):
+            end = start + timedelta(minutes=int(item['duration']))
+        else:
+            end = start + DEFAULT_SHOW_DURATION
+        booking = {
+            'id': int(item['id']) if item.get('id') is not None else None,
+            'venue_id': int(item['venue_id']),
+            'artist_id': int(item['artist_id']),
+            'start_time': start,
+            'end_time': end,
+        }
+    except KeyError as e:
+        return 'Missing %s.' % e
+    except (TypeError, ValueError, OverflowError):
+        return 'Ids must be integers, times ISO 8601 and duration minutes.'
+    if start.tzinfo or end.tzinfo:
+        return 'Times are local and must not carry a UTC offset.'
+    return scheduling.invalid(booking) or booking
+
+def conflict_record(conflict):
+    return dict(conflict, start_time=conflict['start_time'].isoformat(),
+                end_time=conflict['end_time'].isoformat())
+
+@api_v1.route('/shows/conflicts', methods=['POST'])
+def check_bookings():
+    # Validates up to SHOW_CONFLICT_MAX_BOOKINGS proposed bookings against
+    # the stored shows and each other. Not marked @replica_reads: a
+    # lagging replica could miss a booking made a moment ago.
+    payload = request.get_json(silent=True)
+    items = payload.get('bookings') if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        abort(400)
+    if len(items) > current_app.config['SHOW_CONFLICT_MAX_BOOKINGS']:
+        abort(413)
+
+    invalid, bookings, indexes = [], [], []
+    for index, item in enumerate(items):
+        booking = parse_booking(item)
+        if isinstance(booking, str):
+            invalid.append({'booking': index, 'error': booking})
+        else:
+            bookings.append(booking)
+            indexes.append(index)
+
+    conflicts = scheduling.report(db.session.connection(), bookings)
+    for conflict in conflicts:
+        conflict['booking'] = indexes[conflict['booking']]
+        if conflict['other_booking'] is not None:
+            conflict['other_booking'] = indexes[conflict['other_booking']]
+    return jsonify({
+        'checked': len(bookings),
+        'invalid': invalid,
+        'conflicts': [conflict_record(conflict) for conflict in conflicts],
+    })
+
+@api_v1.route('/shows/conflicts')
+@replica_reads
+def stored_conflicts():
+    # Overlapping stored shows between ?from and ?to, both required.
+    start = date_arg('from')
+    end = date_arg('to')
+    if not start or not end:
+        abort(400)
+    conflicts = scheduling.stored_conflicts(db.session.connection(), start, end)
+    return stream(conflict_record(conflict) for conflict in conflicts)
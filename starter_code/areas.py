@@ -0,0 +1,103 @@
+import click
+from sqlalchemy import event, func, inspect, select, tuple_
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Venue, area
+
+#----------------------------------------------------------------------------#
+# Area rollup for the venues page.
+#
+# `area` holds one row per (state, city) that has venues, with the number
+# of venues and the sum of their upcoming_show_count. The venues page pages
+# through it by primary key instead of grouping every venue per request.
+#
+# Rows are recomputed for just the areas a change touches: venues that are
+# created, moved or deleted (on flush and in the importer) and venues whose
+# show counters change (show_stats.refresh). `flask refresh-areas`
+# rebuilds the whole table.
+#----------------------------------------------------------------------------#
+
+# Areas per statement when refreshing many at once.
+KEY_CHUNK = 500
+
+COLUMNS = ['state', 'city', 'venue_count', 'upcoming_show_count']
+
+def totals(where=None):
+    query = select(Venue.state, Venue.city, func.count(Venue.id),
+                   func.coalesce(func.sum(Venue.upcoming_show_count), 0)) \
+        .where(Venue.state.isnot(None), Venue.city.isnot(None)) \
+        .group_by(Venue.state, Venue.city)
+    if where is not None:
+        query = query.where(where)
+    return query
+
+def upsert(connection, where):
+    # Writes the totals of the areas matching `where` in one statement.
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        connection.execute(area.delete().where(
+            tuple_(area.c.state, area.c.city).in_(select(Venue.state, Venue.city).where(where))))
+        connection.execute(area.insert().from_select(COLUMNS, totals(where)))
+        return
+    statement = insert(area).from_select(COLUMNS, totals(where))
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[area.c.state, area.c.city],
+        set_={'venue_count': statement.excluded.venue_count,
+              'upcoming_show_count': statement.excluded.upcoming_show_count}))
+
+def refresh(connection, keys, prune=True):
+    # Recomputes the given (state, city) areas. With prune, areas left
+    # without venues are dropped.
+    keys = sorted({key for key in keys if None not in key})
+    for i in range(0, len(keys), KEY_CHUNK):
+        chunk = keys[i:i + KEY_CHUNK]
+        upsert(connection, tuple_(Venue.state, Venue.city).in_(chunk))
+        if prune:
+            venues = select(Venue.id).where(Venue.state == area.c.state, Venue.city == area.c.city)
+            connection.execute(area.delete().where(
+                tuple_(area.c.state, area.c.city).in_(chunk), ~venues.exists()))
+
+def refresh_venues(connection, ids):
+    # Refreshes the areas of the given venues, or every area when ids is
+    # None. The venues still exist, so no area empties.
+    if ids is None:
+        return rebuild(connection)
+    if ids:
+        upsert(connection, tuple_(Venue.state, Venue.city).in_(
+            select(Venue.state, Venue.city).where(Venue.id.in_(sorted(ids)))))
+
+def rebuild(connection):
+    connection.execute(area.delete())
+    connection.execute(area.insert().from_select(COLUMNS, totals()))
+
+@event.listens_for(Session, 'after_flush')
+def refresh_after_flush(session, flush_context):
+    keys, prune = set(), False
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Venue):
+            continue
+        attrs = inspect(obj).attrs
+        histories = (attrs.state.history, attrs.city.history)
+        if obj in session.dirty and not any(history.has_changes() for history in histories):
+            continue
+        # The venue's area before and after the flush; only moves and
+        # deletes can leave an area empty.
+        keys.add(tuple((history.deleted or history.unchanged or [None])[0] for history in histories))
+        keys.add(tuple((history.added or history.unchanged or [None])[0] for history in histories))
+        prune = prune or obj not in session.new
+
+    if keys:
+        refresh(session.connection(), keys, prune)
+
+def init_app(app):
+    @app.cli.command('refresh-areas')
+    def refresh_areas_command():
+        """Rebuild the area rollup of the venues page."""
+        with db.engine.begin() as connection:
+            rebuild(connection)
+        click.echo('Areas rebuilt.')
@@ -0,0 +1,232 @@
+import re
+
+from flask import Blueprint, current_app, flash, redirect, render_template, request, url_for
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from genre_cache import resolve_genres
+from models import Venue, Artist, Show
+from queries import partition_shows, search_results, recommended_artists, availability, availability_range, availability_response
+from read_views import read_view
+from response_cache import cache
+from routing import replica_reads
+import response_cache
+import search
+
+#----------------------------------------------------------------------------#
+# Artist pages.
+#----------------------------------------------------------------------------#
+
+bp = Blueprint('artists', __name__)
+
+@bp.route('/artists')
+@replica_reads
+@cache.cached('artists')
+@read_view
+def artists():
+    artists = (yield select(Artist.id, Artist.name).order_by(Artist.name)).all()
+    data=[]
+    for artist_id, name in artists:
+        data.append({
+            "id":artist_id,
+            "name":name
+        })
+    return render_template('pages/artists.html', artists=data)
+
+
+@bp.route('/artists/search', methods=['POST'])
+@replica_reads
+@read_view
+def search_artists():
+    search_term = request.form.get('search_term', '')
+    artist_ids = yield from search.find('artist', search_term, current_app.config['SEARCH_RESULTS_LIMIT'])
+    response = yield from search_results(Artist, artist_ids)
+    return render_template('pages/search_artists.html', results=response, search_term=search_term)
+
+@bp.route('/artists/<int:artist_id>')
+@replica_reads
+@cache.cached('artist:{artist_id}')
+@read_view
+def show_artist(artist_id):
+    artist = (yield select(Artist).options(joinedload(Artist.genres))
+        .where(Artist.id == artist_id)).unique().scalar_one_or_none()
+
+    if not artist:
+        return redirect(url_for('pages.index'))
+
+    genres = [ genre.name for genre in artist.genres ]
+    upcoming_shows, upcoming_shows_count, past_shows, past_shows_count = yield from \
+        partition_shows(Show.artist_id, artist_id, Venue, 'venue', current_app.config['SHOWS_PER_SECTION'])
+    response_cache.tag(*{ 'venue:%d' % show['venue_id'] for show in upcoming_shows + past_shows })
+    recommended = yield from recommended_artists('artist', artist_id)
+
+    data={
+        "id": artist_id,
+        "name": artist.name,
+        "genres": genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": (artist.phone[:3] + '-' + artist.phone[3:6] + '-' + artist.phone[6:]),
+        "website": artist.website,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+        "past_shows": past_shows,
+        "past_shows_count": past_shows_count,
+        "upcoming_shows": upcoming_shows,
+        "upcoming_shows_count": upcoming_shows_count,
+        "recommended_artists": recommended
+    }
+    return render_template('pages/show_artist.html', artist=data)
+
+@bp.route('/artists/<int:artist_id>/availability')
+@replica_reads
+@cache.cached('artist:{artist_id}')
+@read_view
+def artist_availability(artist_id):
+    start, end = availability_range()
+    artists = yield from availability(Artist, Show.artist_id, Venue, Show.venue_id, 'venue',
+        Artist.id == artist_id, start, end)
+    return availability_response(artist_id, artists, 'venue', start, end)
+
+#  ----------------------------------------------------------------
+#  Update Artist
+#  ----------------------------------------------------------------
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+    from forms import ArtistForm
+    artist = Artist.query.get(artist_id)
+    if not artist:
+        return redirect(url_for('pages.index'))
+    else:
+        form = ArtistForm(obj=artist)
+
+    genres = [genre.name for genre in artist.genres]
+
+    artist = {
+        "id": artist_id,
+        "name": artist.name,
+        "genres": genres,
+        "city": artist.city,
+        "state": artist.state,
+        "phone": (artist.phone[:3] + '-' + artist.phone[3:6] + '-' + artist.phone[6:]),
+        "website": artist.website,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link
+    }
+    return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+    from forms import ArtistForm
+    form = ArtistForm()
+
+    name = form.name.data.strip()
+    city = form.city.data.strip()
+    state = form.state.data
+    phone = form.phone.data
+    phone = re.sub('\D', '', phone)
+    genres = form.genres.data
+    seeking_venue = form.seeking_venue.data
+    seeking_description = form.seeking_description.data.strip()
+    image_link = form.image_link.data.strip()
+    website = form.website_link.data.strip()
+    facebook_link = form.facebook_link.data.strip()
+
+    if not form.validate():
+        flash( form.errors )
+        return redirect(url_for('.edit_artist_submission', artist_id=artist_id))
+
+    else:
+        error_in_update = False
+
+        try:
+            artist = Artist.query.get(artist_id)
+            artist.genres = resolve_genres(db.session, genres)
+
+            artist.name=name
+            artist.city=city
+            artist.state=state
+            artist.phone=phone
+            artist.seeking_venue=seeking_venue
+            artist.seeking_description = seeking_description
+            artist.image_link = image_link
+            artist.website = website
+            artist.facebook_link = facebook_link
+
+            db.session.commit()
+        except Exception as e:
+            error_in_update = True
+            print(e)
+            db.session.rollback()
+        finally:
+            db.session.close()
+
+        if not error_in_update:
+            flash('Artist ' + request.form['name'] + ' was successfully updated!')
+            return redirect(url_for('.show_artist', artist_id=artist_id))
+        else:
+            flash('An error occurred. Artist ' + name + ' could not be updated.')
+            print("Error in edit_artist_submission()")
+            return render_template('pages/home.html')
+
+#  ----------------------------------------------------------------
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@bp.route('/artists/create', methods=['GET'])
+def create_artist_form():
+    from forms import ArtistForm
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+
+@bp.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+    from forms import ArtistForm
+    form = ArtistForm()
+
+    name = form.name.data.strip()
+    city = form.city.data.strip()
+    state = form.state.data
+    phone = form.phone.data
+    phone = re.sub('\D', '', phone)
+    genres = form.genres.data
+    seeking_venue = form.seeking_venue.data
+    seeking_description = form.seeking_description.data.strip()
+    image_link = form.image_link.data.strip()
+    website = form.website_link.data.strip()
+    facebook_link = form.facebook_link.data.strip()
+
+    if not form.validate():
+        flash( form.errors )
+        return redirect(url_for('.create_artist_submission'))
+
+    else:
+        error_in_insert = False
+
+        try:
+            new_artist = Artist(name=name, city=city, state=state, phone=phone, seeking_venue=seeking_venue, \
+                seeking_description=seeking_description, image_link=image_link, website=website,\
+                facebook_link=facebook_link, genres=resolve_genres(db.session, genres))
+
+            db.session.add(new_artist)
+            db.session.commit()
+        except Exception as e:
+            error_in_insert = True
+            print(e)
+            db.session.rollback()
+        finally:
+            db.session.close()
+
+        if not error_in_insert:
+            flash('Artist ' + request.form['name'] + ' was successfully listed!')
+            return redirect(url_for('pages.index'))
+        else:
+            flash('An error occurred. Artist ' + name + ' could not be listed.')
+            print("Error in create_artist_submission()")
+            return render_template('pages/home.html')
@@ -0,0 +1,157 @@
+import io
+import sys
+
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from werkzeug.exceptions import HTTPException
+
+from app import create_app
+from config import engine_options
+from extensions import db
+from read_views import run_async
+from response_cache import cache
+from routing import read_bind
+
+#----------------------------------------------------------------------------#
+# ASGI entry point.
+#
+#   pip install -r requirements.txt   # asgiref, uvicorn, asyncpg/aiosqlite
+#   uvicorn asgi:application --workers 4
+#
+# Read views written with @read_view (listings, detail pages and searches)
+# run on AsyncSessions over an async driver, so one worker serves many of
+# them concurrently while they wait on the database. Every other route,
+# including the create and edit forms, is the unchanged Flask app behind
+# asgiref's WSGI adapter, which runs it in a thread pool.
+#
+# Both paths share the app's request handling: before/after request hooks,
+# sessions and flashes, the response cache and replica routing. The async
+# engines connect to the same databases as the sync ones, with the driver
+# swapped (ASYNC_DATABASE_URL overrides the primary's URL). In-memory
+# SQLite cannot be shared between the two and is not supported.
+#----------------------------------------------------------------------------#
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+def async_url(url):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+def wsgi_environ(scope, body):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'SERVER_NAME': (scope.get('server') or ('localhost', 80))[0],
+        'SERVER_PORT': str((scope.get('server') or ('localhost', 80))[1]),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = environ[name] + ',' + value if name in environ and name.startswith('HTTP_') else value
+    return environ
+
+class AsyncReads:
+    def __init__(self, app):
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+        with app.app_context():
+            urls = {key: async_url(engine.url) for key, engine in db.engines.items()}
+        if app.config.get('ASYNC_DATABASE_URL'):
+            urls[None] = make_url(app.config['ASYNC_DATABASE_URL'])
+        self.engines = {key: create_async_engine(url, **engine_options(str(url)))
+                        for key, url in urls.items()}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        match = self.match(scope) if scope['type'] == 'http' else None
+        if match is None:
+            return await self.wsgi(scope, receive, send)
+
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        response = await self.handle(scope, body, *match)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                        for name, value in response.headers.items()],
+        })
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+        response.close()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in self.engines.values():
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def match(self, scope):
+        # (view, URL arguments) of a read view, or None to leave the request
+        # to the WSGI app, including 404s, 405s and redirects.
+        adapter = self.app.url_map.bind('localhost', script_name=scope.get('root_path') or None)
+        try:
+            endpoint, args = adapter.match(scope['path'], method=scope['method'])
+        except HTTPException:
+            return None
+        view = self.app.view_functions.get(endpoint)
+        return (view, args) if hasattr(view, 'page') else None
+
+    async def handle(self, scope, body, view, args):
+        # Mirrors Flask.full_dispatch_request with an awaited view.
+        with self.app.request_context(wsgi_environ(scope, body)):
+            try:
+                try:
+                    rv = self.app.preprocess_request()
+                    if rv is None:
+                        rv = await self.dispatch(view, args)
+                except Exception as e:
+                    rv = self.app.handle_user_exception(e)
+                response = self.app.finalize_request(rv)
+            except Exception as e:
+                response = self.app.handle_exception(e)
+            response.get_data()
+            return response
+
+    async def dispatch(self, view, args):
+        tags = getattr(view, 'cache_tags', None)
+        if tags is None or not cache.usable():
+            return await self.render(view, args)
+        hit = cache.lookup(tags, args)
+        if hit is not None:
+            return hit
+        response = self.app.make_response(await self.render(view, args))
+        cache.store(response)
+        return response
+
+    async def render(self, view, args):
+        async with AsyncSession(self.engines[read_bind(self.app, view)]) as session:
+            return await run_async(view.page(**args), session)
+
+app = create_app()
+application = AsyncReads(app)
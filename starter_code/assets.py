@@ -0,0 +1,223 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+import click
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+
+#----------------------------------------------------------------------------#
+# Static bundles.
+#
+#   flask build-assets
+#
+# Concatenates and minifies the stylesheets and scripts of each bundle,
+# names every bundle after a hash of its contents, writes gzip (and, with
+# the brotli package installed, brotli) copies next to it, and records the
+# file names in manifest.json under ASSETS_DIR.
+#
+# Templates link bundles with assets('<bundle>'), which lists the URLs to
+# include: the fingerprinted bundle once it has been built, or the source
+# files one by one before that. Bundles are served from /static/dist with
+# the best precompressed copy the client accepts and a year-long immutable
+# Cache-Control, since a changed file gets a new name.
+#----------------------------------------------------------------------------#
+
+# Bundle -> source files under static/, in load order.
+BUNDLES = {
+    'css/main.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css',
+                     'css/main.responsive.css', 'css/main.quickfix.css'],
+    'js/head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    'js/main.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js'],
+    # Loaded on their own: respond.js only by old IE, jQuery only when its
+    # CDN copy fails.
+    'js/respond.js': ['js/libs/respond-1.4.2.min.js'],
+    'js/jquery.js': ['js/libs/jquery-1.11.1.min.js'],
+}
+
+# Bundles are served under <static URL>/DIST.
+DIST = 'dist'
+
+MANIFEST = 'manifest.json'
+
+# Content-Encoding -> suffix, best first.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+#----------------------------------------------------------------------------#
+# Minification.
+#----------------------------------------------------------------------------#
+
+CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)''', re.S)
+CSS_URL = re.compile(r'''url\(\s*(["']?)([^"')]+)\1\s*\)''')
+
+def minify_css(text):
+    # Drops comments (but not /*! license comments) and the whitespace
+    # around braces, semicolons, commas and child combinators. Strings are
+    # left alone. Spaces before colons stay, since "a :hover" and "a:hover"
+    # select different elements.
+    parts = []
+    code = []
+    position = 0
+    for match in CSS_TOKENS.finditer(text):
+        code.append(text[position:match.start()])
+        if match.group(1) or match.group(2).startswith('/*!'):
+            parts += [squeeze_css(''.join(code)), match.group(0)]
+            code = []
+        position = match.end()
+    code.append(text[position:])
+    parts.append(squeeze_css(''.join(code)))
+    return ''.join(parts).strip()
+
+def squeeze_css(text):
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r' ?([{};,>]) ?', r'\1', text)
+    text = re.sub(r': ', ':', text)
+    return text.replace(';}', '}')
+
+def minify_js(text):
+    # JavaScript is only minified when rjsmin is installed; otherwise it is
+    # bundled as is.
+    try:
+        import rjsmin
+    except ImportError:
+        return text.strip()
+    return rjsmin.jsmin(text)
+
+def rebase_urls(text, source, bundle):
+    # Rewrites the relative url()s of a stylesheet at static/<source> so
+    # they still point at the same files from static/DIST/<bundle>.
+    def rebase(match):
+        quote, url = match.groups()
+        if re.match(r'^([a-z][a-z0-9+.-]*:|/|#)', url, re.I):
+            return match.group(0)
+        path, query = re.match(r'^([^?#]*)(.*)$', url).groups()
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+        url = posixpath.relpath(target, posixpath.dirname(posixpath.join(DIST, bundle))) + query
+        return 'url(%s%s%s)' % (quote, url, quote)
+    return CSS_URL.sub(rebase, text)
+
+def bundle(static_folder, name, sources):
+    contents = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as file:
+            text = file.read()
+        if name.endswith('.css'):
+            text = rebase_urls(text, source, name)
+            contents.append(text.strip() if source.endswith('.min.css') else minify_css(text))
+        else:
+            contents.append(text.strip() if source.endswith('.min.js') else minify_js(text))
+    # Scripts are joined with a semicolon in case one omits its last.
+    separator = '\n' if name.endswith('.css') else ';\n'
+    return (separator.join(contents) + '\n').encode('utf-8')
+
+def compress(data):
+    # Precompressed copies by suffix, at the highest levels, since they
+    # are made once per build.
+    copies = {'.gz': gzip.compress(data, 9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        return copies
+    copies['.br'] = brotli.compress(data, quality=11)
+    return copies
+
+#----------------------------------------------------------------------------#
+# Build.
+#----------------------------------------------------------------------------#
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+def build(static_folder, directory):
+    """Builds every bundle into `directory`.
+
+    Returns the manifest and, per bundle, its size and the sizes of its
+    precompressed copies by suffix. Files of earlier builds are kept, so pages rendered before a deploy
+    can still load the bundles they link.
+    """
+    manifest = {}
+    sizes = {}
+    for name, sources in BUNDLES.items():
+        data = bundle(static_folder, name, sources)
+        stem, extension = posixpath.splitext(name)
+        filename = '%s.%s%s' % (stem, hashlib.sha256(data).hexdigest()[:12], extension)
+        write(os.path.join(directory, filename), data)
+        copies = compress(data)
+        for suffix, copy in copies.items():
+            write(os.path.join(directory, filename + suffix), copy)
+        manifest[name] = filename
+        sizes[name] = dict({'': len(data)}, **{suffix: len(copy) for suffix, copy in copies.items()})
+    # The manifest goes last, so a running app never sees it name a
+    # bundle that is not written yet.
+    write(os.path.join(directory, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest, sizes
+
+#----------------------------------------------------------------------------#
+# Runtime.
+#----------------------------------------------------------------------------#
+
+class Assets:
+    def __init__(self):
+        self.directory = None
+        self.manifest = {}
+        self.prefix = '/static'
+        self.max_age = 0
+
+    def init_app(self, app):
+        self.directory = app.config['ASSETS_DIR']
+        self.max_age = app.config.get('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        self.prefix = app.static_url_path
+        self.load()
+        app.add_template_global(self.urls, 'assets')
+        app.add_url_rule(self.prefix + '/' + DIST + '/<path:filename>', 'assets', self.send)
+
+        @app.cli.command('build-assets')
+        def build_assets_command():
+            """Bundle, fingerprint and precompress the static files."""
+            manifest, sizes = build(app.static_folder, self.directory)
+            for name, filename in sorted(manifest.items()):
+                click.echo('%s -> %s (%s bytes)' % (name, filename, ', '.join(
+                    '%s %d' % (suffix[1:] or 'raw', size) for suffix, size in sizes[name].items())))
+            self.load()
+
+    def load(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST), encoding='utf-8') as file:
+                self.manifest = json.load(file)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def urls(self, name):
+        if name in self.manifest:
+            return ['%s/%s/%s' % (self.prefix, DIST, self.manifest[name])]
+        return ['%s/%s' % (self.prefix, source) for source in BUNDLES[name]]
+
+    def send(self, filename):
+        # The manifest itself is not fingerprinted, so it is not served.
+        path = safe_join(self.directory, filename)
+        if path is None or filename == MANIFEST or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0]
+        encoding = None
+        for name, suffix in ENCODINGS:
+            if request.accept_encodings[name] and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, name
+                break
+
+        response = send_file(path, mimetype=mimetype, max_age=self.max_age)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+assets = Assets()
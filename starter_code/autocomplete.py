@@ -0,0 +1,190 @@
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from flask import current_app
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Venue, Artist, change_counter
+
+#----------------------------------------------------------------------------#
+# In-process prefix index for typeahead.
+#
+# Every word position of every venue and artist name is stored as a key in
+# one sorted list, so "moo" finds "The Blue Moon" through its "moon ..." key
+# with a single bisect. The index is loaded once per process and then kept
+# current from committed session changes, so lookups rarely touch the
+# database.
+#
+# Each worker process holds its own copy. Every transaction that adds,
+# renames or deletes a venue or artist, including those of `flask import`,
+# also bumps the 'names' change counter. A worker reads the counter at most
+# every AUTOCOMPLETE_CHECK_SECONDS and reloads the index once it has moved
+# past the value the index reflects.
+#----------------------------------------------------------------------------#
+
+KINDS = {Venue: 'venue', Artist: 'artist'}
+
+# Upper bound on keys examined per lookup, so very short prefixes that
+# match most of the index still answer in constant time.
+MAX_SCAN = 2000
+
+COUNTER = 'names'
+
+def normalize(text):
+    return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+def name_keys(name):
+    words = normalize(name).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+class PrefixIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.keys = []
+        self.names = {}
+        # The change counter value the index reflects, and when it was
+        # last compared with the database.
+        self.version = 0
+        self.checked_at = 0
+
+    def load(self, entries, version=0):
+        keys = []
+        names = {}
+        for kind, entity_id, name in entries:
+            names[(kind, entity_id)] = name
+            keys.extend((key, kind, entity_id) for key in name_keys(name))
+        keys.sort()
+        with self.lock:
+            self.keys = keys
+            self.names = names
+            self.version = version
+            self.checked_at = time.monotonic()
+            self.loaded = True
+
+    def _remove(self, kind, entity_id):
+        name = self.names.pop((kind, entity_id), None)
+        if name is None:
+            return
+        for key in name_keys(name):
+            i = bisect_left(self.keys, (key, kind, entity_id))
+            if i < len(self.keys) and self.keys[i] == (key, kind, entity_id):
+                del self.keys[i]
+
+    def update(self, changed, removed, version=None):
+        # `version` is the counter value the change was committed as. The
+        # index only takes it when nothing else was committed in between.
+        with self.lock:
+            if version is not None and version == self.version + 1:
+                self.version = version
+            for kind, entity_id in removed:
+                self._remove(kind, entity_id)
+            for kind, entity_id, name in changed:
+                self._remove(kind, entity_id)
+                self.names[(kind, entity_id)] = name
+                for key in name_keys(name):
+                    insort(self.keys, (key, kind, entity_id))
+
+    def lookup(self, prefix, limit):
+        # Returns up to `limit` (id, name) pairs per kind. Names that start
+        # with the prefix come before names that only contain a word
+        # starting with it.
+        prefix = normalize(prefix)
+        results = {kind: {} for kind in KINDS.values()}
+        if not prefix:
+            return {kind: [] for kind in results}
+
+        with self.lock:
+            i = bisect_left(self.keys, (prefix,))
+            end = min(len(self.keys), i + MAX_SCAN)
+            while i < end:
+                key, kind, entity_id = self.keys[i]
+                if not key.startswith(prefix):
+                    break
+                found = results[kind]
+                if entity_id not in found:
+                    name = self.names[(kind, entity_id)]
+                    found[entity_id] = (not normalize(name).startswith(prefix), name.lower(), entity_id, name)
+                i += 1
+
+        return {
+            kind: [(entity_id, name) for _, _, entity_id, name in sorted(found.values())[:limit]]
+            for kind, found in results.items()
+        }
+
+index = PrefixIndex()
+
+def read_counter(connection):
+    return connection.execute(select(change_counter.c.value)
+        .where(change_counter.c.name == COUNTER)).scalar() or 0
+
+def bump(connection):
+    # Counts a name change in the current transaction and returns the new
+    # value.
+    if not connection.execute(update(change_counter).where(change_counter.c.name == COUNTER)
+                              .values(value=change_counter.c.value + 1)).rowcount:
+        connection.execute(change_counter.insert().values(name=COUNTER, value=1))
+    return read_counter(connection)
+
+def ensure_loaded():
+    if index.loaded:
+        if time.monotonic() - index.checked_at < current_app.config['AUTOCOMPLETE_CHECK_SECONDS']:
+            return
+        index.checked_at = time.monotonic()
+    # The counter is read before the names, so a change committed during
+    # the load makes the next check reload again.
+    version = read_counter(db.session)
+    if index.loaded and version <= index.version:
+        return
+    entries = []
+    for model, kind in KINDS.items():
+        entries.extend((kind, entity_id, name) for entity_id, name in db.session.query(model.id, model.name))
+    index.load(entries, version)
+
+def lookup(prefix, limit):
+    ensure_loaded()
+    return index.lookup(prefix, limit)
+
+#----------------------------------------------------------------------------#
+# Incremental updates.
+#
+# Changes are collected per flush and only applied once the transaction
+# commits, so a rolled back edit never shows up in suggestions. The first
+# flush with a name change bumps the change counter in the same
+# transaction.
+#----------------------------------------------------------------------------#
+
+@event.listens_for(Session, 'after_flush')
+def collect_changes(session, flush_context):
+    pending = session.info.setdefault('autocomplete', {'changed': {}, 'removed': set(), 'version': None})
+    changed = False
+    for obj in list(session.new) + list(session.dirty):
+        if type(obj) in KINDS and obj not in session.deleted:
+            if obj in session.dirty and not inspect(obj).attrs.name.history.has_changes():
+                continue
+            pending['changed'][(KINDS[type(obj)], obj.id)] = obj.name
+            changed = True
+    for obj in session.deleted:
+        if type(obj) in KINDS:
+            key = (KINDS[type(obj)], obj.id)
+            pending['changed'].pop(key, None)
+            pending['removed'].add(key)
+            changed = True
+    if changed and pending['version'] is None:
+        pending['version'] = bump(session.connection())
+
+@event.listens_for(Session, 'after_commit')
+def apply_changes(session):
+    pending = session.info.pop('autocomplete', None)
+    if pending and index.loaded:
+        index.update(
+            [(kind, entity_id, name) for (kind, entity_id), name in pending['changed'].items()],
+            pending['removed'], pending['version'])
+
+@event.listens_for(Session, 'after_rollback')
+def discard_changes(session):
+    session.info.pop('autocomplete', None)
@@ -0,0 +1,67 @@
+"""Bytes and requests for the stylesheets and scripts of a page.
+
+    python -m benchmarks.assets [--runs 50]
+
+The home page is rendered twice, first before any build, when it links
+every source file through Flask's static route, then after
+`flask build-assets` has written the bundles to a throwaway ASSETS_DIR.
+Every linked file is requested with and without Accept-Encoding, and the
+table lists the request count, the bytes transferred and the median time
+to serve all of them. The jQuery fallback is counted too, although
+browsers only load it when the CDN copy fails.
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+LINK = re.compile(r'''(?:href|src)=["'](/static/(?:css|js|dist)/[^"']+)''')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=50, help='times every file is requested (default 50)')
+    return parser.parse_args()
+
+
+def measure(client, runs, encoding):
+    urls = LINK.findall(client.get('/').get_data(as_text=True))
+    size, samples, cached = 0, [], True
+    for n in range(runs):
+        start = time.perf_counter()
+        for url in urls:
+            response = client.get(url, headers={'Accept-Encoding': encoding})
+            data = response.get_data()
+            if n == 0:
+                size += len(data)
+                cached = cached and 'immutable' in (response.headers.get('Cache-Control') or '')
+        samples.append((time.perf_counter() - start) * 1000)
+    return len(urls), size, statistics.median(samples), cached
+
+
+def main():
+    args = parse_args()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'assets.db')
+    os.environ['ASSETS_DIR'] = tempfile.mkdtemp()
+
+    from app import create_app
+    import assets
+    app = create_app()
+    client = app.test_client()
+
+    print(f'{"mode":<22} {"requests":>8} {"bytes":>9} {"ms":>8}  immutable')
+    for mode in ('sources', 'bundles'):
+        if mode == 'bundles':
+            assets.build(app.static_folder, app.config['ASSETS_DIR'])
+            assets.assets.load()
+        for encoding in ('identity', 'gzip, br'):
+            requests, size, ms, cached = measure(client, args.runs, encoding)
+            label = f'{mode} ({encoding.split(",")[0]})'
+            print(f'{label:<22} {requests:>8} {size:>9} {ms:>8.2f}  {"yes" if cached else "no"}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
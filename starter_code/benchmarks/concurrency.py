@@ -0,0 +1,153 @@
+"""Throughput of the read routes under the sync WSGI app and the ASGI mode.
+
+    python -m benchmarks.concurrency [--shows 20000] [--concurrency 1,8,32,128]
+                                     [--duration 10] [--cores 1] [--url DATABASE_URL]
+
+Each mode is served by one server process pinned to --cores CPUs: the sync
+app by werkzeug's threaded server, the async one by uvicorn running
+asgi:application. Clients keep --concurrency connections busy with the
+read routes for --duration seconds, and requests per second per core and
+latency percentiles are reported for every level. The response cache is
+off, so every request reaches the database.
+
+Without --url a throwaway SQLite file is seeded. The async mode gains the
+most where database round trips are slow; point --url at a Postgres
+server over the network to see that (asyncpg must be installed).
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PATHS = ['/venues', '/artists', '/shows', '/venues/{venue}', '/artists/{artist}']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='database to run against instead of a seeded SQLite file')
+    parser.add_argument('--shows', type=int, default=20000, help='shows to seed (default 20000)')
+    parser.add_argument('--concurrency', default='1,8,32,128', help='client counts (default 1,8,32,128)')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per level (default 10)')
+    parser.add_argument('--cores', type=int, default=1, help='CPUs each server may use (default 1)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--serve', choices=['sync', 'async'], help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def serve(mode, port):
+    from response_cache import cache
+    if mode == 'sync':
+        from app import create_app
+        app = create_app()
+    else:
+        import asgi
+        app = asgi.app
+    cache.ttl = 0
+    app.config['SLOW_REQUEST_MS'] = None
+    if mode == 'sync':
+        from werkzeug.serving import make_server
+        import logging
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        uvicorn.run(asgi.application, host='127.0.0.1', port=port, log_level='warning', access_log=False)
+
+
+async def request(port, path):
+    # One connection per request, read to EOF, so neither server's
+    # keep-alive handling affects the numbers.
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1]) if response else 0
+
+
+async def client(port, paths, deadline, samples, errors):
+    rng = random.Random(len(samples))
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        status = await request(port, rng.choice(paths))
+        samples.append(time.perf_counter() - start)
+        if status != 200:
+            errors.append(status)
+
+
+async def load(port, paths, clients, duration):
+    samples, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(client(port, paths, deadline, samples, errors) for _ in range(clients)))
+    return samples, errors
+
+
+def wait_for(port, process, timeout=30):
+    import socket
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit('server exited with status %d' % process.returncode)
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit('server did not start')
+
+
+def main():
+    args = parse_args()
+    if args.serve:
+        return serve(args.serve, args.port)
+
+    if args.url:
+        os.environ['DATABASE_URL'] = args.url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'concurrency.db')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + path
+
+    from app import create_app
+    from extensions import db
+    app = create_app()
+    from benchmarks.generate import seed
+    from benchmarks.routes import busiest
+
+    with app.app_context():
+        if not args.url:
+            db.create_all()
+            with db.engine.begin() as connection:
+                seed(connection, shows=args.shows)
+        ids = busiest(db)
+    paths = [path.format(**ids) for path in PATHS]
+    levels = [int(level) for level in args.concurrency.split(',')]
+    cores = list(range(min(args.cores, os.cpu_count())))
+
+    print(f'{"mode":<6} {"clients":>7} {"req/s/core":>11} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    for mode in ('sync', 'async'):
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.concurrency', '--serve', mode, '--port', str(args.port)],
+            env=os.environ, preexec_fn=lambda: os.sched_setaffinity(0, cores))
+        try:
+            wait_for(args.port, process)
+            for clients in levels:
+                samples, errors = asyncio.run(load(args.port, paths, clients, args.duration))
+                samples.sort()
+                rate = len(samples) / args.duration / len(cores)
+                p50 = statistics.median(samples) * 1000
+                p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+                print(f'{mode:<6} {clients:>7} {rate:>11.1f} {p50:>8.1f} {p99:>8.1f} {len(errors):>7}')
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
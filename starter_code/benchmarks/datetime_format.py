@@ -0,0 +1,68 @@
+"""Per-row cost of show time formatting on a 10k-show page.
+
+    python -m benchmarks.datetime_format [--rows 10000]
+
+Compares the old path, where the view stringified start_time, reformatted
+it with dateutil + babel and the template filter parsed that output again,
+with formatting.format_datetime applied once to the datetime itself.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from formatting import FORMATS, format_datetime
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(date, FORMATS.get(format, format), locale='en')
+
+
+def legacy_row(start_time):
+    return legacy_format_datetime(legacy_format_datetime(str(start_time)), 'full')
+
+
+def fast_row(start_time):
+    return format_datetime(start_time, 'full')
+
+
+def measure(label, fn, values):
+    start = time.perf_counter()
+    for value in values:
+        fn(value)
+    elapsed = time.perf_counter() - start
+    print(f'{label:<34} {elapsed * 1000:9.1f} ms  {elapsed / len(values) * 1e6:8.2f} us/row')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    # Shows start on the hour, so a year of them repeats timestamps.
+    typical = [now + timedelta(hours=rng.randint(0, 365 * 24)) for _ in range(args.rows)]
+    distinct = [now + timedelta(minutes=i) for i in range(args.rows)]
+
+    for label, values in (('typical', typical), ('distinct', distinct)):
+        print(f'{args.rows} rows, {label} start times')
+        legacy = measure('  str -> dateutil -> babel (x2)', legacy_row, values)
+        fast = measure('  format_datetime(datetime)', fast_row, values)
+        print(f'  {legacy / fast:.0f}x faster')
+
+        # The results must not change.
+        mismatches = sum(legacy_row(value) != fast_row(value) for value in values[:500])
+        if mismatches:
+            print(f'  {mismatches} mismatching rows')
+            return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import itertools
+import random
+from datetime import datetime, timedelta
+
+from models import Venue, Artist, Show, Genre, venue_genre_table, artist_genre_table, DEFAULT_SHOW_DURATION
+import geo
+import recommendations
+import search
+import show_stats
+
+#----------------------------------------------------------------------------#
+# Deterministic synthetic data for benchmarks.
+#
+# The same seed always yields the same rows. Cities, genres and bookings
+# are skewed the way real listings are: a few large cities hold most
+# venues, a few genres dominate, popular venues and artists get most of
+# the shows, and shows start in the evening and never double-book.
+#----------------------------------------------------------------------------#
+
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+          'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+          'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll',
+          'Soul', 'Other']
+
+# Relative share of each genre, in GENRES order.
+GENRE_WEIGHTS = [8, 5, 3, 6, 7, 4, 3, 9, 3, 2, 6, 2, 10, 4, 5, 2, 10, 4, 2]
+
+STATES = ['CA', 'NY', 'TX', 'FL', 'IL', 'PA', 'OH', 'GA', 'NC', 'MI', 'WA', 'LA']
+
+# Recommended artists stored per venue and artist, as in config.py.
+RECOMMENDATIONS = 6
+
+# Show start hours and their relative frequency.
+HOURS = [(18, 1), (19, 3), (20, 5), (21, 4), (22, 2), (23, 1)]
+
+def zipf_weights(count, exponent=1.0):
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+def pick_genres(rng, cum_weights):
+    # One to three distinct genre ids, popular genres more often.
+    count = rng.choices((1, 2, 3), weights=(3, 5, 2))[0]
+    picked = []
+    while len(picked) < count:
+        genre_id = rng.choices(range(1, len(GENRES) + 1), cum_weights=cum_weights)[0]
+        if genre_id not in picked:
+            picked.append(genre_id)
+    return picked
+
+def seed(connection, shows=10000, venues=None, artists=None, cities=200, seed=0, batch_size=5000):
+    # Inserts genres, venues, artists and shows through executemany, then
+    # fills the search index, the show counters and the recommendations.
+    # Shows are spread over two years around now, so about half are
+    # upcoming.
+    rng = random.Random(seed)
+    venues = venues or max(10, shows // 20)
+    artists = artists or max(10, shows // 10)
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    def insert(table, rows):
+        for i in range(0, len(rows), batch_size):
+            connection.execute(table.insert(), rows[i:i + batch_size])
+
+    insert(Genre.__table__, [{'id': i + 1, 'name': name} for i, name in enumerate(GENRES)])
+    areas = [('City %d' % i, rng.choice(STATES)) for i in range(cities)]
+    # The made-up cities are in no centroid file, so each gets a point in
+    # the contiguous US of its own, from a separate generator so that the
+    # rest of the data does not change.
+    places = random.Random(seed + 1)
+    coordinates = {city: (round(places.uniform(25, 49), 4), round(places.uniform(-124, -67), 4)) for city, _ in areas}
+    area_weights = zipf_weights(cities)
+    genre_weights = list(itertools.accumulate(GENRE_WEIGHTS))
+
+    def entities(count):
+        for i in range(1, count + 1):
+            city, state = rng.choices(areas, cum_weights=area_weights)[0]
+            yield i, city, state, pick_genres(rng, genre_weights)
+
+    venue_rows = list(entities(venues))
+    artist_rows = list(entities(artists))
+
+    insert(Venue.__table__, [{
+        'id': i, 'name': 'Venue %d' % i, 'city': city, 'state': state,
+        'latitude': coordinates[city][0], 'longitude': coordinates[city][1], 'geo_cell': geo.cell(*coordinates[city]),
+        'address': '%d Main St' % i, 'phone': '555%07d' % i, 'seeking_talent': i % 3 == 0,
+    } for i, city, state, _ in venue_rows])
+    insert(Artist.__table__, [{
+        'id': i, 'name': 'Artist %d' % i, 'city': city, 'state': state,
+        'phone': '555%07d' % i, 'seeking_venue': i % 4 == 0,
+    } for i, city, state, _ in artist_rows])
+
+    insert(venue_genre_table, [{'venue_id': i, 'genre_id': g}
+        for i, _, _, genre_ids in venue_rows for g in genre_ids])
+    insert(artist_genre_table, [{'artist_id': i, 'genre_id': g}
+        for i, _, _, genre_ids in artist_rows for g in genre_ids])
+
+    # Popularity is shuffled so that it does not follow the ids.
+    venue_ids = rng.sample(range(1, venues + 1), venues)
+    artist_ids = rng.sample(range(1, artists + 1), artists)
+    venue_weights = zipf_weights(venues, 0.8)
+    artist_weights = zipf_weights(artists, 0.8)
+    hours, hour_weights = zip(*HOURS)
+    midnight = now.replace(hour=0)
+
+    # At most one show per venue and per artist a day, so that no two
+    # overlap. A show whose day is taken moves to another day, and to
+    # another venue and artist when their calendars are nearly full.
+    taken = set()
+    show_rows = []
+    for i, hour in zip(range(1, shows + 1), rng.choices(hours, weights=hour_weights, k=shows)):
+        for attempt in itertools.count():
+            if attempt % 20 == 0:
+                venue_id = rng.choices(venue_ids, cum_weights=venue_weights)[0]
+                artist_id = rng.choices(artist_ids, cum_weights=artist_weights)[0]
+            day = rng.randint(-365, 365)
+            if ('venue', venue_id, day) not in taken and ('artist', artist_id, day) not in taken:
+                break
+        taken.update({('venue', venue_id, day), ('artist', artist_id, day)})
+        start_time = midnight + timedelta(days=day, hours=hour)
+        show_rows.append({
+            'id': i,
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': start_time,
+            'end_time': start_time + DEFAULT_SHOW_DURATION,
+        })
+    insert(Show.__table__, show_rows)
+
+    for kind, rows in (('venue', venue_rows), ('artist', artist_rows)):
+        for i in range(0, len(rows), batch_size):
+            search.write_documents(connection, [
+                search.make_document(kind, entity_id, '%s %d' % (kind.title(), entity_id), city, state,
+                                     [GENRES[g - 1] for g in genre_ids])
+                for entity_id, city, state, genre_ids in rows[i:i + batch_size]])
+    show_stats.refresh(connection, Venue)
+    show_stats.refresh(connection, Artist)
+    recommendations.rebuild(connection, RECOMMENDATIONS)
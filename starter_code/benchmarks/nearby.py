@@ -0,0 +1,95 @@
+"""Venues read and time per /venues/nearby search as the venue count grows.
+
+    python -m benchmarks.nearby [--venues 1000 10000 100000] [--radius 50] [--runs 200]
+
+For each size a throwaway SQLite database is seeded with venues at random
+points in the contiguous US, and --runs searches around random points are
+answered twice: by geo.nearby(), which reads the grid cells around the
+point through the geo_cell index, and by a scan that ranks every venue.
+The table lists the median index entries the cell ranges cover, the
+entries a (latitude, longitude) index would read for the same search (its
+whole latitude band), the rows the scan reads and the milliseconds of
+both. Only the cell search reads a number of entries that does not grow
+with the width of the country.
+"""
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--venues', type=int, nargs='+', default=[1000, 10000, 100000], help='venue counts')
+    parser.add_argument('--radius', type=float, default=50, help='search radius in km (default 50)')
+    parser.add_argument('--runs', type=int, default=200, help='searches per size (default 200)')
+    return parser.parse_args()
+
+
+def point(rng):
+    return rng.uniform(25, 49), rng.uniform(-124, -67)
+
+
+def scan(lat, lon, radius, limit):
+    # Every venue, ranked in Python: the baseline without the index.
+    from sqlalchemy import select
+    from models import Venue
+    import geo
+    rows = (yield select(Venue.id, Venue.latitude, Venue.longitude).where(Venue.latitude.isnot(None))).all()
+    hits = ((geo.distance_km(lat, lon, row.latitude, row.longitude), row) for row in rows)
+    return heapq.nsmallest(limit, (hit for hit in hits if hit[0] <= radius), key=lambda hit: (hit[0], hit[1].id)), len(rows)
+
+
+def timed(db, page):
+    from read_views import run
+    start = time.perf_counter()
+    result = run(page, db.session)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    args = parse_args()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'nearby.db')
+    from app import create_app
+    from extensions import db
+    from models import Venue
+    import geo
+    app = create_app()
+    rng = random.Random(0)
+
+    print(f'{"venues":>8} {"cell entries":>13} {"ms":>8} {"band entries":>13} {"rows scanned":>13} {"ms":>8}')
+    with app.app_context():
+        db.create_all()
+        seeded = 0
+        for count in sorted(args.venues):
+            # Each size adds venues to those of the one before.
+            points = [point(rng) for _ in range(seeded, count)]
+            db.session.execute(Venue.__table__.insert(), [
+                {'latitude': lat, 'longitude': lon, 'geo_cell': geo.cell(lat, lon), 'name': 'Venue %d' % i}
+                for i, (lat, lon) in enumerate(points, start=seeded)])
+            db.session.commit()
+            seeded = count
+
+            read, band, indexed, scanned, full = [], [], [], [], []
+            for _ in range(args.runs):
+                lat, lon = point(rng)
+                lat0, lat1, spans = geo.bounding_box(lat, lon, args.radius)
+                read.append(db.session.query(Venue.id).filter(db.or_(
+                    *[Venue.geo_cell.between(a, b) for a, b in geo.cell_ranges(lat0, lat1, spans)])).count())
+                band.append(db.session.query(Venue.id).filter(Venue.latitude.between(lat0, lat1)).count())
+                hits, ms = timed(db, geo.nearby(lat, lon, args.radius, 20))
+                indexed.append(ms)
+                (expected, rows), ms = timed(db, scan(lat, lon, args.radius, 20))
+                scanned.append(rows)
+                full.append(ms)
+                assert [hit[1].id for hit in hits] == [hit[1].id for hit in expected]
+            print(f'{count:>8} {statistics.median(read):>13.0f} {statistics.median(indexed):>8.2f} '
+                  f'{statistics.median(band):>13.0f} {statistics.median(scanned):>13.0f} {statistics.median(full):>8.2f}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
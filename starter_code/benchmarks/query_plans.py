@@ -0,0 +1,98 @@
+"""Query plans and timings of the hot queries with and without their indexes.
+
+    python -m benchmarks.query_plans [--shows 100000] [--url DATABASE_URL]
+
+Without --url a throwaway SQLite database is created and seeded. With --url
+the given database is used as is; its hot query indexes are dropped and
+recreated one at a time, so do not point it at a live database.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='database to run against instead of a seeded SQLite file')
+    parser.add_argument('--shows', type=int, default=100000, help='shows to seed (default 100000)')
+    parser.add_argument('--runs', type=int, default=20, help='timed runs per query (default 20)')
+    return parser.parse_args()
+
+
+# index name -> (table, columns, query it serves, parameters)
+CASES = {
+    'ix_Show_venue_id_start_time': ('Show', '(venue_id, start_time)',
+        'SELECT start_time, artist_id FROM "Show" '
+        'WHERE venue_id = :id AND start_time > :now ORDER BY start_time', {'id': 7}),
+    'ix_Show_artist_id_start_time': ('Show', '(artist_id, start_time)',
+        'SELECT start_time, venue_id FROM "Show" '
+        'WHERE artist_id = :id AND start_time > :now ORDER BY start_time', {'id': 7}),
+    'ix_Show_start_time_id': ('Show', '(start_time, id)',
+        'SELECT id, start_time FROM "Show" '
+        'WHERE start_time >= :now ORDER BY start_time, id LIMIT 31', {}),
+    'ix_Venue_state_city': ('Venue', '(state, city)',
+        'SELECT v.id, v.name FROM (SELECT state, city FROM area ORDER BY state, city LIMIT 51) a '
+        'JOIN "Venue" v ON v.state = a.state AND v.city = a.city ORDER BY a.state, a.city, v.id', {}),
+}
+
+
+def explain(connection, sql, params):
+    from sqlalchemy import text
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+    return [row[-1] for row in connection.execute(text(prefix + sql), params)]
+
+
+def timed(connection, sql, params, runs):
+    from sqlalchemy import text
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        connection.execute(text(sql), params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    args = parse_args()
+    if args.url:
+        os.environ['DATABASE_URL'] = args.url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'query_plans.db')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + path
+
+    from sqlalchemy import text
+    from app import create_app
+    from extensions import db
+    app = create_app()
+    from benchmarks.generate import seed
+
+    with app.app_context():
+        if not args.url:
+            db.create_all()
+            with db.engine.begin() as connection:
+                seed(connection, shows=args.shows)
+
+        with db.engine.begin() as connection:
+            for name in CASES:
+                connection.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+
+            for name, (table, columns, sql, params) in CASES.items():
+                params = dict(params, now=datetime.now())
+                before_plan = explain(connection, sql, params)
+                before = timed(connection, sql, params, args.runs)
+                connection.execute(text(f'CREATE INDEX "{name}" ON "{table}" {columns}'))
+                connection.execute(text(f'ANALYZE "{table}"'))
+                after_plan = explain(connection, sql, params)
+                after = timed(connection, sql, params, args.runs)
+
+                print(f'{name}: {before:.2f} ms -> {after:.2f} ms')
+                print('  before: ' + '\n          '.join(before_plan))
+                print('  after:  ' + '\n          '.join(after_plan))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""Time to score, rebuild and refresh the genre recommendations.
+
+    python -m benchmarks.recommendations [--shows 100000] [--runs 5]
+
+A throwaway SQLite database is seeded, and the median of --runs is
+reported for each step:
+
+  compute   recommendations.compute(), which groups entities by genre set
+            and scores every pair of sets
+  pairwise  the same lists from an entity-by-entity Jaccard matrix, in
+            batches of rows, checked to agree with compute()
+  rebuild   `flask refresh-recommendations`
+  refresh   the background refresh after one artist's genres change,
+            with the number of lists it rewrote, checked to
+            leave the table as compute() would
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BATCH = 256
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shows', type=int, default=100000, help='shows to seed (default 100000)')
+    parser.add_argument('--runs', type=int, default=5, help='runs per step (default 5)')
+    return parser.parse_args()
+
+
+def timed(function, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(samples)
+
+
+def pairwise(connection, count):
+    # Top `count` artists per venue and artist straight from the incidence
+    # matrix. Equal scores go to the artist with more upcoming shows, as in
+    # compute(): the priority term is far smaller than the gap between two
+    # distinct Jaccard indexes of small genre sets.
+    import numpy as np
+    from sqlalchemy import select
+    from models import Artist
+    import recommendations
+
+    links = {kind: np.asarray(connection.execute(select(column, column.table.c.genre_id)).all(), dtype=np.int64)
+             for kind, column in recommendations.RELATIONS.items()}
+    genres = np.unique(np.concatenate([pairs[:, 1] for pairs in links.values()]))
+
+    def incidence(pairs):
+        ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+        matrix = np.zeros((len(ids), len(genres)), dtype=np.float32)
+        matrix[rows.reshape(-1), np.searchsorted(genres, pairs[:, 1])] = 1
+        return ids, matrix
+
+    artist_ids, artists = incidence(links['artist'])
+    ordered = connection.execute(select(Artist.id).order_by(Artist.upcoming_show_count.desc(), Artist.id)).scalars()
+    rank = {artist_id: position for position, artist_id in enumerate(ordered)}
+    penalty = np.array([rank[artist_id] for artist_id in artist_ids]) * 1e-9
+    sizes = artists.sum(axis=1)
+
+    results = {}
+    for kind in recommendations.RELATIONS:
+        ids, sources = (artist_ids, artists) if kind == 'artist' else incidence(links[kind])
+        lists = results[kind] = {}
+        for start in range(0, len(ids), BATCH):
+            batch = sources[start:start + BATCH]
+            shared = batch @ artists.T
+            union = batch.sum(axis=1)[:, None] + sizes[None, :] - shared
+            scores = np.divide(shared, union, out=np.zeros_like(shared), where=shared > 0).astype(np.float64)
+            if kind == 'artist':
+                scores[np.arange(len(batch)), np.arange(start, start + len(batch))] = 0
+            keys = np.where(scores > 0, scores - penalty, -1)
+            top = np.argpartition(-keys, min(count, keys.shape[1] - 1), axis=1)[:, :count]
+            for row, entity_id in enumerate(ids[start:start + BATCH]):
+                picks = sorted(top[row], key=lambda index: -keys[row, index])
+                lists[int(entity_id)] = [int(artist_ids[index]) for index in picks if scores[row, index] > 0]
+    return results
+
+
+def main():
+    args = parse_args()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'recommendations.db')
+
+    from app import create_app
+    from extensions import db
+    from sqlalchemy import select
+    from models import Artist, Genre, recommendation
+    import recommendations
+    from benchmarks.generate import seed
+    app = create_app()
+    count = app.config['RECOMMENDATIONS_COUNT']
+
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            seed(connection, shows=args.shows)
+
+        with db.engine.connect() as connection:
+            computed, compute_ms = timed(lambda: recommendations.compute(connection, count), args.runs)
+            expected, pairwise_ms = timed(lambda: pairwise(connection, count), args.runs)
+        agree = all([artist_id for artist_id, _ in picks] == expected[kind][entity_id]
+                    for kind, lists in computed.items() for entity_id, picks in lists.items())
+        with db.engine.begin() as connection:
+            _, rebuild_ms = timed(lambda: recommendations.rebuild(connection, count), args.runs)
+
+        artist = db.session.get(Artist, 1)
+        genres = db.session.query(Genre).order_by(Genre.id).all()
+        samples, rewritten = [], 0
+        for run in range(args.runs):
+            artist.genres = [genres[run % len(genres)], genres[(run + 7) % len(genres)]]
+            db.session.commit()
+            # The commit queued the same refresh in the background.
+            recommendations.refresher.wait()
+            with db.engine.begin() as connection:
+                start = time.perf_counter()
+                changed = recommendations.refresh(connection, count, (), {artist.id})
+                samples.append((time.perf_counter() - start) * 1000)
+            rewritten = sum(len(ids) for ids in changed.values())
+        with db.engine.connect() as connection:
+            stored = {kind: {} for kind in recommendations.RELATIONS}
+            for kind, entity_id, artist_id in connection.execute(select(
+                    recommendation.c.kind, recommendation.c.entity_id, recommendation.c.artist_id)
+                    .order_by(recommendation.c.kind, recommendation.c.entity_id, recommendation.c.rank)):
+                stored[kind].setdefault(entity_id, []).append(artist_id)
+            refreshed = stored == {kind: {entity_id: [artist_id for artist_id, _ in picks]
+                                          for entity_id, picks in lists.items() if picks}
+                                   for kind, lists in recommendations.compute(connection, count).items()}
+
+    lists = sum(len(lists) for lists in computed.values())
+    print(f'{"step":<10} {"ms":>10}  notes')
+    print(f'{"compute":<10} {compute_ms:>10.1f}  {lists} lists')
+    print(f'{"pairwise":<10} {pairwise_ms:>10.1f}  {"agrees" if agree else "DIFFERS"}')
+    print(f'{"rebuild":<10} {rebuild_ms:>10.1f}  {lists} lists written')
+    print(f'{"refresh":<10} {statistics.median(samples):>10.1f}  {rewritten} lists rewritten, '
+          f'{"agrees" if refreshed else "DIFFERS"}')
+    return 0 if agree and refreshed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""Latency percentiles and SQL statement counts of every route.
+
+    python -m benchmarks.routes [--shows 10000] [--runs 20] [--url DATABASE_URL]
+                                [--baseline FILE] [--save-baseline] [--warm]
+
+Every route registered on the app is requested through the Flask test
+client against a deterministically seeded database. A route fails when it
+runs more statements than its budget in CASES, when it does not answer
+with a 2xx/3xx status, or when its statement count or median latency has
+grown past the baseline, by default routes_baseline.json next to this
+file. A route without a case fails too, so new routes have to declare a
+budget. Exits with status 1 on any failure, and without running anything
+when the baseline file is missing; --save-baseline writes it instead of
+comparing. Latencies depend on the machine, so take a baseline on the one
+that runs the comparison.
+
+Without --url a throwaway SQLite database is created and seeded; with
+--url the given database is used as is and must already hold data. The
+write routes create, edit and delete rows, so do not point it at a live
+database. The response cache is cleared before every request unless
+--warm is given.
+"""
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'routes_baseline.json')
+
+VENUE_FORM = {
+    'name': 'Benchmark Hall', 'city': 'City 1', 'state': 'CA', 'address': '1 Main St',
+    'phone': '555-555-5555', 'genres': ['Jazz', 'Blues'], 'image_link': 'https://example.com/hall.jpg',
+    'facebook_link': 'https://www.facebook.com/benchmark', 'website_link': 'https://example.com',
+    'seeking_talent': 'y', 'seeking_description': 'Looking for bands',
+}
+
+ARTIST_FORM = {
+    'name': 'Benchmark Band', 'city': 'City 1', 'state': 'CA',
+    'phone': '555-555-5555', 'genres': ['Rock n Roll', 'Pop'], 'image_link': 'https://example.com/band.jpg',
+    'facebook_link': 'https://www.facebook.com/benchmark', 'website_link': 'https://example.com',
+    'seeking_venue': 'y', 'seeking_description': 'Looking for venues',
+}
+
+SLOT_START = datetime(2030, 1, 1, 20)
+
+# A scheduler's check of a month of nightly shows at the busiest venue.
+PROPOSED_BOOKINGS = {'json': {'bookings': [
+    {'venue_id': '{venue}', 'artist_id': '{artist}', 'start_time': '2030-02-%02dT20:00:00' % day, 'duration': 150}
+    for day in range(1, 29)]}}
+
+# 'METHOD rule' -> (URL, form data, statement budget). URLs are filled in
+# with {venue} and {artist}, the busiest venue and artist, and {doomed}, a
+# different venue for every run of the delete route, taken from the venues
+# the create route added (venues with shows cannot be deleted), and {slot},
+# a different start time for every run so that new shows do not clash.
+# {today} and {next_month} are dates around which the seeded shows lie.
+# {bundle} is the stylesheet bundle, built into a throwaway ASSETS_DIR.
+# {pictured} is a venue whose image_link points at a local image server.
+# {lat} and {lon} are the location of the busiest venue.
+CASES = {
+    'GET /': ('/', None, 0),
+    'GET /venues': ('/venues', None, 1),
+    'POST /venues/search': ('/venues/search', {'search_term': 'venue 1'}, 3),
+    'GET /venues/<int:venue_id>': ('/venues/{venue}', None, 5),
+    'GET /venues/<int:venue_id>/availability': ('/venues/{venue}/availability?from={today}&to={next_month}', None, 1),
+    'GET /venues/availability': ('/venues/availability?city=City 0&date={today}', None, 1),
+    'GET /venues/nearby': ('/venues/nearby?lat={lat}&lon={lon}&radius=200', None, 2),
+    'GET /venues/create': ('/venues/create', None, 0),
+    'POST /venues/create': ('/venues/create', VENUE_FORM, 9),
+    'GET /venues/<int:venue_id>/edit': ('/venues/{venue}/edit', None, 2),
+    'POST /venues/<int:venue_id>/edit': ('/venues/{venue}/edit', VENUE_FORM, 12),
+    'GET /artists': ('/artists', None, 1),
+    'POST /artists/search': ('/artists/search', {'search_term': 'artist 1'}, 3),
+    'GET /artists/<int:artist_id>': ('/artists/{artist}', None, 5),
+    'GET /artists/<int:artist_id>/availability': ('/artists/{artist}/availability', None, 1),
+    'GET /artists/create': ('/artists/create', None, 0),
+    'POST /artists/create': ('/artists/create', ARTIST_FORM, 8),
+    'GET /artists/<int:artist_id>/edit': ('/artists/{artist}/edit', None, 2),
+    'POST /artists/<int:artist_id>/edit': ('/artists/{artist}/edit', ARTIST_FORM, 10),
+    'GET /shows': ('/shows', None, 1),
+    'GET /shows/create': ('/shows/create', None, 0),
+    'POST /shows/create': ('/shows/create', {
+        'venue_id': '{venue}', 'artist_id': '{artist}', 'start_time': '{slot}', 'duration': '120'}, 8),
+    # The first request reads the change counter and loads the prefix index.
+    'GET /api/autocomplete': ('/api/autocomplete?q=ven', None, 3),
+    'GET /cache/stats': ('/cache/stats', None, 0),
+    'GET /metrics': ('/metrics', None, 0),
+    'GET /static/dist/<path:filename>': ('/static/dist/{bundle}', None, 0),
+    'GET /img/<kind>/<int:entity_id>/<size>': ('/img/venue/{pictured}/small', None, 1),
+    'GET /api/v1/venues': ('/api/v1/venues', None, 3),
+    'GET /api/v1/artists': ('/api/v1/artists', None, 3),
+    'GET /api/v1/shows': ('/api/v1/shows?venue_id={venue}', None, 1),
+    'GET /api/v1/shows/conflicts': ('/api/v1/shows/conflicts?from=2000-01-01&to=2100-01-01', None, 1),
+    'POST /api/v1/shows/conflicts': ('/api/v1/shows/conflicts', PROPOSED_BOOKINGS, 2),
+    'GET /venues/<venue_id>/delete': ('/venues/{doomed}/delete', None, 10),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='database to run against instead of a seeded SQLite file')
+    parser.add_argument('--shows', type=int, default=10000, help='shows to seed (default 10000)')
+    parser.add_argument('--runs', type=int, default=20, help='requests per route (default 20)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file (default %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true', help='write this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed median latency growth over the baseline (default 0.25)')
+    parser.add_argument('--warm', action='store_true', help='keep the response cache between requests')
+    return parser.parse_args()
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def fill(value, ids):
+    if isinstance(value, dict):
+        return {key: fill(item, ids) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, ids) for item in value]
+    if isinstance(value, str):
+        return value.format(**ids)
+    return value
+
+
+def busiest(db):
+    from models import Venue, Artist
+    venue, lat, lon = db.session.query(Venue.id, Venue.latitude, Venue.longitude) \
+        .order_by(Venue.upcoming_show_count.desc(), Venue.id).first()
+    artist = db.session.query(Artist.id).order_by(Artist.upcoming_show_count.desc(), Artist.id).first()[0]
+    db.session.remove()
+    return {'venue': venue, 'artist': artist, 'lat': lat, 'lon': lon}
+
+
+def created_venues(db, busiest_venue):
+    # The edit route gives the busiest venue the same name.
+    from models import Venue
+    ids = [venue_id for venue_id, in db.session.query(Venue.id)
+           .filter(Venue.name == VENUE_FORM['name'], Venue.id != busiest_venue)]
+    db.session.remove()
+    return ids or [0]
+
+
+def image_server():
+    # Stands in for the hosts image_links point at: serves one 2000x1500
+    # JPEG on a local port and returns its URL.
+    from PIL import Image
+    output = io.BytesIO()
+    Image.new('RGB', (2000, 1500), (200, 80, 40)).save(output, 'JPEG')
+    image = output.getvalue()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(image)))
+            self.end_headers()
+            self.wfile.write(image)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return 'http://127.0.0.1:%d/venue.jpg' % server.server_port
+
+
+def picture_venue(db, busiest_venue, url):
+    # Not the busiest venue, which the edit route gives another image_link.
+    from models import Venue
+    venue = db.session.query(Venue).filter(Venue.id != busiest_venue).order_by(Venue.id).first()
+    venue.image_link = url
+    db.session.commit()
+    venue_id = venue.id
+    db.session.remove()
+    return venue_id
+
+
+def csrf_token(client):
+    # The forms keep CSRF protection on; the token is bound to the test
+    # client's session, so one token serves every POST. Without one every
+    # form POST would fail validation and measure only the error page.
+    html = client.get('/venues/create').get_data(as_text=True)
+    match = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', html)
+    if match is None:
+        raise RuntimeError('/venues/create renders no csrf_token field')
+    return match.group(1)
+
+
+def measure(client, counter, cache, method, url, data, ids, doomed, runs, warm):
+    import recommendations
+    samples, statements, statuses, rejected = [], 0, set(), False
+    for run in range(runs):
+        run_ids = dict(ids, doomed=doomed[run % len(doomed)] if doomed else 0,
+                       slot=(SLOT_START + timedelta(days=run)).strftime('%Y-%m-%d %H:%M:%S'))
+        if not warm:
+            cache.backend.clear()
+        counter[0] = 0
+        start = time.perf_counter()
+        body = fill(data, run_ids)
+        # {'json': ...} is sent as a JSON body, anything else as a form.
+        body = {'json': body['json']} if body and 'json' in body else {'data': body}
+        response = client.open(fill(url, run_ids), method=method, **body)
+        response.get_data()
+        if body.get('data'):
+            # A form that failed validation flashes or renders its errors.
+            with client.session_transaction() as session:
+                flashes = session.pop('_flashes', [])
+            rejected |= 'The CSRF token' in response.get_data(as_text=True) or any(
+                isinstance(message, dict) and 'csrf_token' in message for _, message in flashes)
+        samples.append((time.perf_counter() - start) * 1000)
+        statements = max(statements, counter[0])
+        statuses.add(response.status_code)
+        recommendations.refresher.wait()
+    return {
+        'p50': round(percentile(samples, 0.50), 3),
+        'p95': round(percentile(samples, 0.95), 3),
+        'p99': round(percentile(samples, 0.99), 3),
+        'statements': statements,
+        'status': max(statuses),
+    }, rejected
+
+
+def main():
+    args = parse_args()
+    baseline = {}
+    if not args.save_baseline:
+        if not os.path.exists(args.baseline):
+            print(f'No baseline at {args.baseline}; run with --save-baseline to take one.')
+            return 1
+        with open(args.baseline) as source:
+            baseline = json.load(source)
+        if baseline.get('shows') != args.shows:
+            print(f'warning: baseline was taken with {baseline.get("shows")} shows, this run seeds {args.shows}')
+
+    if args.url:
+        os.environ['DATABASE_URL'] = args.url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'routes.db')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    os.environ['ASSETS_DIR'] = tempfile.mkdtemp()
+    os.environ['THUMBNAIL_CACHE_DIR'] = tempfile.mkdtemp()
+    os.environ['THUMBNAIL_ALLOW_PRIVATE_HOSTS'] = '1'
+
+    from sqlalchemy import event
+    from app import create_app
+    from extensions import db
+    app = create_app()
+    import assets
+    from response_cache import cache
+    from benchmarks.generate import seed
+
+    failures = []
+
+    with app.app_context():
+        if not args.url:
+            db.create_all()
+            with db.engine.begin() as connection:
+                seed(connection, shows=args.shows)
+        ids = busiest(db)
+        today = datetime.now().date()
+        ids.update(today=today.isoformat(), next_month=(today + timedelta(days=30)).isoformat())
+        manifest, _ = assets.build(app.static_folder, app.config['ASSETS_DIR'])
+        assets.assets.load()
+        ids['bundle'] = manifest['css/main.css']
+        ids['pictured'] = picture_venue(db, ids['venue'], image_server())
+
+        counter = [0]
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count(*_):
+            # Only the requests' own statements, not those of the
+            # recommendations refresh that write routes queue.
+            if threading.current_thread() is threading.main_thread():
+                counter[0] += 1
+
+    rules = {'%s %s' % (method, rule.rule)
+             for rule in app.url_map.iter_rules() if rule.endpoint != 'static'
+             for method in rule.methods - {'HEAD', 'OPTIONS'}}
+    failures += ['%s: no benchmark case' % key for key in sorted(rules - set(CASES))]
+
+    results = {}
+    client = app.test_client()
+    token = csrf_token(client)
+    print(f'{"route":<44} {"status":>6} {"sql":>7} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}')
+    for key, (url, data, budget) in CASES.items():
+        if key not in rules:
+            failures.append('%s: case for a route that does not exist' % key)
+            continue
+        method = key.split(' ', 1)[0]
+        if data is not None and 'json' not in data:
+            data = dict(data, csrf_token=token)
+        doomed = None
+        if '{doomed}' in url:
+            with app.app_context():
+                doomed = created_venues(db, ids['venue'])
+        result, rejected = measure(client, counter, cache, method, url, data, ids, doomed, args.runs, args.warm)
+        results[key] = result
+        print(f'{key:<44} {result["status"]:>6} {result["statements"]:>3}/{budget:<3} '
+              f'{result["p50"]:>9.2f} {result["p95"]:>9.2f} {result["p99"]:>9.2f}')
+
+        if result['status'] >= 400:
+            failures.append('%s: status %d' % (key, result['status']))
+        if rejected:
+            failures.append('%s: CSRF token rejected' % key)
+        if result['statements'] > budget:
+            failures.append('%s: %d statements, budget %d' % (key, result['statements'], budget))
+        before = baseline.get('routes', {}).get(key)
+        if before:
+            if result['statements'] > before['statements']:
+                failures.append('%s: %d statements, baseline %d' % (key, result['statements'], before['statements']))
+            # Sub-millisecond medians are mostly noise.
+            if result['p50'] > max(before['p50'] * (1 + args.tolerance), before['p50'] + 1):
+                failures.append('%s: median %.2f ms, baseline %.2f ms' % (key, result['p50'], before['p50']))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as target:
+            json.dump({'shows': args.shows, 'routes': results}, target, indent=2, sort_keys=True)
+        print(f'Baseline written to {args.baseline}')
+
+    for failure in failures:
+        print('FAIL ' + failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Cold-start time of a worker and the imports it spends it on.
+
+    python -m benchmarks.startup [--starts 10] [--top 15]
+
+Each stage runs --starts times in a fresh interpreter: importing the app
+module, building an app with create_app(), and serving the first request
+to / and to a form page. The median wall time of each is reported, with
+the modules of the heavy dependencies that are loaded by the end of it.
+
+The import report comes from `python -X importtime` on one create_app()
+run and lists the top-level packages that took the longest to import,
+counting each module's own time once.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+
+# Dependencies the views load on first use rather than at startup.
+LAZY = ('wtforms', 'flask_wtf', 'babel', 'dateutil')
+
+STAGES = {
+    'import': 'import app',
+    'create_app': 'import app; app.create_app()',
+    'first page': "import app; app.create_app().test_client().get('/')",
+    'first form': "import app; app.create_app().test_client().get('/venues/create')",
+}
+
+PROBE = '''
+import sys, time
+start = time.perf_counter()
+{code}
+print((time.perf_counter() - start) * 1000, ' '.join(m for m in {lazy!r} if m in sys.modules))
+'''
+
+IMPORTTIME = re.compile(r'import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--starts', type=int, default=10, help='processes per stage (default 10)')
+    parser.add_argument('--top', type=int, default=15, help='packages in the import report (default 15)')
+    return parser.parse_args()
+
+
+def run(code, *flags):
+    return subprocess.run([sys.executable, *flags, '-c', code], check=True, capture_output=True, text=True)
+
+
+def stage(code, starts):
+    samples, loaded = [], ''
+    for _ in range(starts):
+        ms, _, loaded = run(PROBE.format(code=code, lazy=LAZY)).stdout.strip().partition(' ')
+        samples.append(float(ms))
+    return statistics.median(samples), loaded
+
+
+def import_report(top):
+    # Self time per top-level package, in milliseconds.
+    totals = Counter()
+    for line in run(STAGES['create_app'], '-X', 'importtime').stderr.splitlines():
+        match = IMPORTTIME.match(line)
+        if match:
+            totals[match.group(2).split('.')[0]] += int(match.group(1)) / 1000
+    return totals.most_common(top), sum(totals.values())
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'startup.db'))
+
+    print(f'{"stage":<12} {"ms":>9}  lazy modules loaded')
+    for name, code in STAGES.items():
+        ms, loaded = stage(code, args.starts)
+        print(f'{name:<12} {ms:>9.2f}  {loaded or "-"}')
+
+    packages, total = import_report(args.top)
+    print()
+    print(f'{"package":<24} {"import ms":>9}')
+    for package, ms in packages:
+        print(f'{package:<24} {ms:>9.2f}')
+    print(f'{"total":<24} {total:>9.2f}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""Template load time at startup, with and without the bytecode cache.
+
+    python -m benchmarks.templates [--starts 10]
+
+--starts fresh processes each import the app and load every template, once
+with an empty bytecode cache directory (every template is parsed and
+compiled) and once with a directory a previous process filled.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--starts', type=int, default=10, help='processes per startup mode (default 10)')
+    parser.add_argument('--load', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def load_templates():
+    # Run in a fresh process: prints the milliseconds spent loading every
+    # template.
+    from app import create_app
+    app = create_app()
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+    start = time.perf_counter()
+    for name in names:
+        app.jinja_env.get_template(name)
+    print((time.perf_counter() - start) * 1000)
+
+
+def startup(starts):
+    results = {}
+    warm = tempfile.mkdtemp()
+    for mode in ('cold', 'warm'):
+        samples = []
+        for _ in range(starts):
+            directory = warm if mode == 'warm' else tempfile.mkdtemp()
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.templates', '--load'],
+                env=dict(os.environ, TEMPLATE_BYTECODE_CACHE_DIR=directory),
+                check=True, capture_output=True, text=True).stdout
+            samples.append(float(output.split()[-1]))
+        if mode == 'cold':
+            # Fill the warm directory.
+            subprocess.run([sys.executable, '-m', 'benchmarks.templates', '--load'],
+                           env=dict(os.environ, TEMPLATE_BYTECODE_CACHE_DIR=warm), check=True, capture_output=True)
+        results[mode] = statistics.median(samples)
+    return results
+
+
+def main():
+    args = parse_args()
+    if args.load:
+        return load_templates()
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'templates.db')
+    loads = startup(args.starts)
+    print(f'{"startup":<10} {"cold ms":>9} {"warm ms":>9}')
+    print(f'{"templates":<10} {loads["cold"]:>9.2f} {loads["warm"]:>9.2f}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
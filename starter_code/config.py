@@ -7,8 +7,124 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 DEBUG = True
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Most past/upcoming shows listed per section on venue and artist pages.
+# The section headings still show the full counts. None lists them all.
+SHOWS_PER_SECTION = 50
+
+# Page size of the /shows listing.
+SHOWS_PER_PAGE = 30
+
+# Cities per page of /venues.
+AREAS_PER_PAGE = 50
+
+# Most venues/artists returned by a search, best matches first.
+SEARCH_RESULTS_LIMIT = 100
+
+# Suggestions returned per kind by /api/autocomplete.
+AUTOCOMPLETE_LIMIT = 8
+
+# Each worker's autocomplete index checks at most this often whether
+# another process has changed a name since it loaded, and reloads if so.
+AUTOCOMPLETE_CHECK_SECONDS = 5
+
+# Cache for the listing and detail pages. 'memory' keeps an LRU per
+# process; 'redis' shares one cache between workers. A TTL of 0 disables it.
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_REDIS_URL = os.environ.get('RESPONSE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+RESPONSE_CACHE_TTL = 60
+RESPONSE_CACHE_SIZE = 512
+
+# Rows fetched per round trip by the streaming /api/v1 endpoints.
+API_STREAM_BATCH_SIZE = 1000
+
+# Most proposed bookings one POST /api/v1/shows/conflicts may check.
+SHOW_CONFLICT_MAX_BOOKINGS = 10000
+
+# Default and longest range of the availability endpoints, in days.
+AVAILABILITY_DAYS = 7
+AVAILABILITY_MAX_DAYS = 92
+
+# /venues/nearby: default and largest search radius, and venues returned.
+NEARBY_RADIUS_KM = 25
+NEARBY_MAX_RADIUS_KM = 500
+NEARBY_LIMIT = 20
+NEARBY_MAX_LIMIT = 100
+
+# Compiled templates are cached on disk so that new workers start warm.
+# None uses a per-user directory under the system temp dir.
+TEMPLATE_BYTECODE_CACHE = True
+TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR')
+
+# Static bundles built by `flask build-assets` (assets.py). Until a build
+# has written a manifest there, templates link the source files instead.
+ASSETS_DIR = os.environ.get('ASSETS_DIR', os.path.join(basedir, 'static', 'dist'))
+ASSETS_MAX_AGE = 365 * 24 * 3600
+
+# Thumbnails of venue and artist images served from /img (thumbnails.py).
+# Sizes are the longest side in pixels. The cache is trimmed to
+# THUMBNAIL_CACHE_BYTES, and thumbnails older than
+# THUMBNAIL_REFRESH_SECONDS are refetched in the background.
+THUMBNAIL_SIZES = {'small': 400, 'large': 1000}
+THUMBNAIL_CACHE_DIR = os.environ.get('THUMBNAIL_CACHE_DIR', os.path.join(basedir, 'thumbnails'))
+THUMBNAIL_CACHE_BYTES = 512 * 1024 * 1024
+THUMBNAIL_REFRESH_SECONDS = 24 * 3600
+THUMBNAIL_MAX_AGE = 24 * 3600
+THUMBNAIL_FETCH_TIMEOUT = 5
+THUMBNAIL_MAX_SOURCE_BYTES = 10 * 1024 * 1024
+# Also fetch sources on loopback and private addresses. Only for local
+# stand-ins; in production it lets image_link reach internal services.
+THUMBNAIL_ALLOW_PRIVATE_HOSTS = os.environ.get('THUMBNAIL_ALLOW_PRIVATE_HOSTS') == '1'
+
+# Requests slower than this are logged with their slowest statements.
+# None turns the log off.
+SLOW_REQUEST_MS = 500
+SLOW_REQUEST_STATEMENTS = 3
+
+# Artists stored per venue and artist by recommendations.py, and shown on
+# their pages.
+RECOMMENDATIONS_COUNT = 6
+
+# Rows per transaction for `flask import`.
+IMPORT_BATCH_SIZE = 5000
+
 # Connect to the database
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://jlabr@localhost:5432/fyyur'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://jlabr@localhost:5432/fyyur')
+
+# Primary database for the async read views of asgi.py. Defaults to
+# DATABASE_URL with an async driver (asyncpg, aiosqlite).
+ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL')
+
+# Read replicas, as a comma separated list of URLs. Routes marked with
+# routing.replica_reads read from one of them; everything else, every
+# request within REPLICA_READ_AFTER_WRITE_SECONDS of a write by the same
+# client, and cached routes within that time of any cache invalidation use
+# the primary.
+DATABASE_REPLICA_URLS = [url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url]
+REPLICA_READ_AFTER_WRITE_SECONDS = 5
+
+# Connection pool of every engine. pre_ping replaces connections the
+# server has closed; recycle keeps them under server and proxy idle limits.
+DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 10))
+DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW', 20))
+DATABASE_POOL_TIMEOUT = 30
+DATABASE_POOL_RECYCLE = 1800
+DATABASE_POOL_PRE_PING = True
+
+def engine_options(url):
+    # SQLite pools take no sizes.
+    if url.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': DATABASE_POOL_SIZE,
+        'max_overflow': DATABASE_MAX_OVERFLOW,
+        'pool_timeout': DATABASE_POOL_TIMEOUT,
+        'pool_recycle': DATABASE_POOL_RECYCLE,
+        'pool_pre_ping': DATABASE_POOL_PRE_PING,
+    }
+
+SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+SQLALCHEMY_BINDS = {'replica%d' % i: dict(engine_options(url), url=url)
+                    for i, url in enumerate(DATABASE_REPLICA_URLS)}
@@ -0,0 +1,35 @@
+import click
+from flask_moment import Moment
+from flask_sqlalchemy import SQLAlchemy
+
+from routing import RoutingSession
+
+#----------------------------------------------------------------------------#
+# Flask extensions.
+#
+# Created unbound so that models and helpers can import `db` without
+# building an app; app.create_app() binds them to each app it makes.
+#
+# Flask-Migrate imports Alembic, which imports every SQLAlchemy dialect, and
+# only `flask db` needs it. migrate_commands() registers a stand-in `db`
+# group that sets Flask-Migrate up the first time the group is used.
+#----------------------------------------------------------------------------#
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+moment = Moment()
+
+def migrate_commands(app):
+    class MigrateGroup(click.Group):
+        def load(self):
+            from flask_migrate import Migrate
+            from flask_migrate.cli import db as commands
+            if 'migrate' not in app.extensions:
+                Migrate(app, db)
+            return commands
+
+        def make_context(self, info_name, args, parent=None, **extra):
+            # Click runs the command the context is made for, so from here
+            # on Flask-Migrate's own group parses and handles `flask db`.
+            return self.load().make_context(info_name, args, parent=parent, **extra)
+
+    app.cli.add_command(MigrateGroup('db', help='Perform database migrations.'))
@@ -0,0 +1,35 @@
+from datetime import datetime
+from functools import lru_cache
+
+#----------------------------------------------------------------------------#
+# Date formatting.
+#
+# Views hand datetime objects straight to the `datetime` template filter.
+# Babel patterns and locales are parsed once, and formatted strings are
+# memoized, since listing pages repeat the same show times over and over.
+# Babel and dateutil are imported on first use rather than at startup.
+#----------------------------------------------------------------------------#
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+@lru_cache(maxsize=None)
+def compiled_pattern(format, locale):
+    import babel.dates
+    from babel import Locale
+    return babel.dates.parse_pattern(FORMATS.get(format, format)), Locale.parse(locale)
+
+@lru_cache(maxsize=16384)
+def _format(value, format, locale):
+    pattern, locale = compiled_pattern(format, locale)
+    return pattern.apply(value, locale)
+
+def format_datetime(value, format='medium', locale='en'):
+    # Strings are still accepted for callers that have not switched to
+    # datetime objects yet.
+    if not isinstance(value, datetime):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    return _format(value, format, locale)
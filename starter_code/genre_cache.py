@@ -0,0 +1,151 @@
+import threading
+
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import Genre, change_counter
+
+#----------------------------------------------------------------------------#
+# Genre resolution.
+#
+# Forms submit genres by name. resolve_genres() turns a list of names into
+# Genre instances with at most one SELECT ... IN for the names it has not
+# seen before and one INSERT ... ON CONFLICT for names that do not exist
+# yet. Known names are served from a process-wide name -> id cache and
+# attached to the session without loading them.
+#
+# Ids of genres inserted by a transaction only reach the cache once that
+# transaction commits. Renaming or deleting a Genre, in any process and
+# including `flask import`, bumps the 'genres' change counter in the same
+# transaction. Every resolve first reads the counter by primary key and
+# drops the cache once the counter has moved past the value the cache
+# reflects, so an id cached by one worker is never linked after another
+# worker removed its genre.
+#----------------------------------------------------------------------------#
+
+COUNTER = 'genres'
+
+_lock = threading.Lock()
+_ids = {}
+# The change counter value that _ids reflects.
+_version = None
+
+def cached_ids():
+    with _lock:
+        return dict(_ids)
+
+def invalidate():
+    with _lock:
+        _ids.clear()
+
+def read_counter(connection):
+    return connection.execute(select(change_counter.c.value)
+        .where(change_counter.c.name == COUNTER)).scalar() or 0
+
+def bump(connection):
+    # Counts a genre rename or delete in the current transaction.
+    if not connection.execute(update(change_counter).where(change_counter.c.name == COUNTER)
+                              .values(value=change_counter.c.value + 1)).rowcount:
+        connection.execute(change_counter.insert().values(name=COUNTER, value=1))
+
+def _check(version):
+    # Drops the cache if it predates counter value `version`.
+    global _version
+    with _lock:
+        if _version != version:
+            _ids.clear()
+            _version = version
+
+def _attach(session, genre_id, name):
+    genre = Genre(id=genre_id, name=name)
+    make_transient_to_detached(genre)
+    return session.merge(genre, load=False)
+
+def _insert(session, names):
+    # Inserts the missing names, tolerating concurrent inserts of the same
+    # name, and returns (id, name) for all of them.
+    dialect = session.get_bind().dialect
+    table = Genre.__table__
+    rows = [{'name': name} for name in names]
+
+    if dialect.name == 'postgresql':
+        stmt = postgresql.insert(table).values(rows)
+    elif dialect.name == 'sqlite':
+        stmt = sqlite.insert(table).values(rows)
+    else:
+        session.execute(table.insert().values(rows))
+        return session.query(Genre.id, Genre.name).filter(Genre.name.in_(names)).all()
+
+    if getattr(dialect, 'insert_returning', dialect.name == 'postgresql'):
+        # A no-op update makes conflicting rows part of RETURNING too.
+        stmt = stmt.on_conflict_do_update(index_elements=['name'], set_={'name': stmt.excluded.name})
+        return session.execute(stmt.returning(table.c.id, table.c.name)).fetchall()
+
+    session.execute(stmt.on_conflict_do_nothing(index_elements=['name']))
+    return session.query(Genre.id, Genre.name).filter(Genre.name.in_(names)).all()
+
+def resolve_genre_ids(session, names):
+    # Returns {name: id} for the given names, creating missing genres.
+    names = list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+    if not names:
+        return {}
+    version = read_counter(session)
+    _check(version)
+    ids = {}
+    with _lock:
+        for name in names:
+            if name in _ids:
+                ids[name] = _ids[name]
+
+    pending = session.info.get('genre_cache', {})
+    for name in names:
+        if name not in ids and name in pending:
+            ids[name] = pending[name]
+
+    missing = [name for name in names if name not in ids]
+    if missing:
+        found = dict((name, genre_id) for genre_id, name in
+            session.query(Genre.id, Genre.name).filter(Genre.name.in_(missing)))
+        with _lock:
+            # Ids read under an older counter value may already be stale.
+            if _version == version:
+                _ids.update(found)
+        ids.update(found)
+
+        missing = [name for name in names if name not in ids]
+        if missing:
+            inserted = dict((name, genre_id) for genre_id, name in _insert(session, missing))
+            session.info.setdefault('genre_cache', {}).update(inserted)
+            ids.update(inserted)
+
+    return ids
+
+def resolve_genres(session, names):
+    ids = resolve_genre_ids(session, names)
+    return [_attach(session, genre_id, name) for name, genre_id in ids.items()]
+
+@event.listens_for(Session, 'after_commit')
+def publish_inserted(session):
+    inserted = session.info.pop('genre_cache', None)
+    if inserted:
+        with _lock:
+            _ids.update(inserted)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_inserted(session):
+    session.info.pop('genre_cache', None)
+
+@event.listens_for(Genre, 'after_update')
+def genre_renamed(mapper, connection, target):
+    # Linking a genre to a venue or artist also marks it dirty, so only a
+    # real change of name or id counts.
+    state = inspect(target)
+    if state.attrs.name.history.has_changes() or state.attrs.id.history.has_changes():
+        bump(connection)
+        invalidate()
+
+@event.listens_for(Genre, 'after_delete')
+def genre_deleted(mapper, connection, target):
+    bump(connection)
+    invalidate()
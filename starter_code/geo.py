@@ -0,0 +1,176 @@
+import csv
+import heapq
+import math
+import os
+
+import click
+from sqlalchemy import event, func, inspect, or_, select, update
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Venue
+
+#----------------------------------------------------------------------------#
+# Venue locations and proximity search.
+#
+# Venues are placed at the centroid of their city, looked up by (state,
+# city) in data/us_cities.csv, which ships with the app so geocoding never
+# leaves the process. A venue in a city missing from the file gets no
+# coordinates and cannot be found by proximity; the create and edit pages,
+# `flask import` and `flask geocode-venues` say which cities those are, and
+# /venues/nearby counts such venues in its answer. Coordinates are set
+# whenever a venue's city or state is flushed, by the importer, and for
+# every venue by `flask geocode-venues`.
+#
+# A B-tree over (latitude, longitude) only narrows a search down to a band
+# of latitude, which spans the whole country. Venues therefore also store
+# the cell of a CELL_DEGREES grid they fall in, numbered row by row, so the
+# cells of one row of the search box are one range of geo_cell. nearby()
+# reads those ranges through the geo_cell index, which touches only the
+# venues in the cells around the point, then ranks them by great-circle
+# distance.
+#----------------------------------------------------------------------------#
+
+CITIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'us_cities.csv')
+
+EARTH_RADIUS_KM = 6371.0088
+
+# About 28 km of latitude: a default search reads a handful of cells, the
+# largest one a few dozen rows of them.
+CELL_DEGREES = 0.25
+CELL_ROWS = int(180 / CELL_DEGREES)
+CELL_COLUMNS = int(360 / CELL_DEGREES)
+
+_centroids = None
+
+def normalize(city):
+    # "St. Louis", "saint louis" and "St Louis" are one city.
+    words = city.replace('.', ' ').lower().split()
+    if words and words[0] == 'saint':
+        words[0] = 'st'
+    return ' '.join(words)
+
+def centroids():
+    global _centroids
+    if _centroids is None:
+        with open(CITIES, newline='', encoding='utf-8') as file:
+            _centroids = {(row['state'], normalize(row['city'])): (float(row['latitude']), float(row['longitude']))
+                          for row in csv.DictReader(file)}
+    return _centroids
+
+def locate(city, state):
+    """Returns (latitude, longitude) of a city, or (None, None)."""
+    if not city or not state:
+        return None, None
+    return centroids().get((state.strip().upper(), normalize(city)), (None, None))
+
+def cell_row(lat):
+    return min(int((lat + 90) / CELL_DEGREES), CELL_ROWS - 1)
+
+def cell_column(lon):
+    return min(int((lon + 180) / CELL_DEGREES), CELL_COLUMNS - 1)
+
+def cell(lat, lon):
+    """Returns the grid cell of a point, or None without coordinates."""
+    if lat is None or lon is None:
+        return None
+    return cell_row(lat) * CELL_COLUMNS + cell_column(lon)
+
+def cell_ranges(lat0, lat1, spans):
+    # (first, last) geo_cell ranges covering a bounding_box(), one per
+    # row and longitude span, with adjacent ranges joined.
+    ranges = []
+    for first, last in sorted((row * CELL_COLUMNS + cell_column(start), row * CELL_COLUMNS + cell_column(end))
+                              for row in range(cell_row(lat0), cell_row(lat1) + 1) for start, end in spans):
+        if ranges and ranges[-1][1] + 1 >= first:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], last))
+        else:
+            ranges.append((first, last))
+    return ranges
+
+def distance_km(lat1, lon1, lat2, lon2):
+    # Haversine.
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1, math.sqrt(a)))
+
+def bounding_box(lat, lon, radius_km):
+    """Latitude range and longitude ranges of a box around the circle.
+
+    The box is split in two where it crosses the antimeridian and spans
+    every longitude where it reaches a pole.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    lat0, lat1 = lat - dlat, lat + dlat
+    if lat0 <= -90 or lat1 >= 90:
+        return max(lat0, -90), min(lat1, 90), [(-180, 180)]
+    dlon = math.degrees(math.asin(min(1, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))))
+    lon0, lon1 = lon - dlon, lon + dlon
+    if lon0 < -180:
+        return lat0, lat1, [(lon0 + 360, 180), (-180, lon1)]
+    if lon1 > 180:
+        return lat0, lat1, [(lon0, 180), (-180, lon1 - 360)]
+    return lat0, lat1, [(lon0, lon1)]
+
+def nearby(lat, lon, radius_km, limit):
+    # Read view step (see read_views.py): the `limit` venues closest to the
+    # point within radius_km, nearest first, as (distance, row) pairs.
+    lat0, lat1, spans = bounding_box(lat, lon, radius_km)
+    rows = (yield select(Venue.id, Venue.name, Venue.city, Venue.state, Venue.latitude, Venue.longitude,
+                         Venue.upcoming_show_count)
+        .where(or_(*[Venue.geo_cell.between(first, last) for first, last in cell_ranges(lat0, lat1, spans)]))).all()
+    hits = ((distance_km(lat, lon, row.latitude, row.longitude), row) for row in rows)
+    return heapq.nsmallest(limit, (hit for hit in hits if hit[0] <= radius_km), key=lambda hit: (hit[0], hit[1].id))
+
+#----------------------------------------------------------------------------#
+# Maintenance.
+#----------------------------------------------------------------------------#
+
+@event.listens_for(Session, 'before_flush')
+def locate_before_flush(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Venue):
+            continue
+        attrs = inspect(obj).attrs
+        if obj in session.dirty and not (attrs.city.history.has_changes() or attrs.state.history.has_changes()):
+            continue
+        obj.latitude, obj.longitude = locate(obj.city, obj.state)
+        obj.geo_cell = cell(obj.latitude, obj.longitude)
+
+def unlocated():
+    # Read view step: the number of venues without coordinates.
+    return (yield select(func.count()).select_from(Venue).where(Venue.geo_cell.is_(None))).scalar()
+
+def describe_unplaced(cities):
+    # "City, ST (n venues)" for a {(city, state): count} mapping, most
+    # venues first.
+    return ', '.join('%s, %s (%d)' % (city, state, count)
+                     for (city, state), count in sorted(cities.items(), key=lambda item: (-item[1], item[0])))
+
+def locate_all(connection):
+    # Sets the coordinates of every venue, one UPDATE per city. Returns how
+    # many venues were placed and the venue count of every city that was
+    # not, by (city, state).
+    placed = 0
+    unplaced = {}
+    cities = connection.execute(select(Venue.state, Venue.city).distinct()).all()
+    for state, city in cities:
+        latitude, longitude = locate(city, state)
+        count = connection.execute(update(Venue)
+            .where(Venue.state == state, Venue.city == city)
+            .values(latitude=latitude, longitude=longitude, geo_cell=cell(latitude, longitude))).rowcount
+        if latitude is None:
+            unplaced[(city, state)] = count
+        else:
+            placed += count
+    return placed, unplaced
+
+def init_app(app):
+    @app.cli.command('geocode-venues')
+    def geocode_venues_command():
+        """Place every venue at its city centroid."""
+        with db.engine.begin() as connection:
+            placed, unplaced = locate_all(connection)
+        click.echo('%d venues placed, %d in cities without a centroid.' % (placed, sum(unplaced.values())))
+        if unplaced:
+            click.echo('Not in data/us_cities.csv: ' + describe_unplaced(unplaced))
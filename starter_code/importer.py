@@ -0,0 +1,372 @@
+import csv
+import io
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import func, select, text
+from werkzeug.datastructures import MultiDict
+
+from extensions import db
+from models import Venue, Artist, Show, venue_genre_table, artist_genre_table, DEFAULT_SHOW_DURATION
+from genre_cache import resolve_genre_ids
+import areas
+import autocomplete
+import geo
+import recommendations
+import response_cache
+import scheduling
+import search
+import show_stats
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+#   flask import venues venues.csv
+#   flask import shows shows.jsonl --batch-size 20000 --rejects rejects.jsonl
+#
+# Rows are validated with the same forms as the create pages and then
+# loaded batch by batch, one transaction per batch: genres are resolved in
+# bulk, rows go in through executemany (or COPY on Postgres), and the search
+# index, show counters and area rollup are brought up to date in the same
+# transaction. Genre recommendations are refreshed once the whole file is
+# in.
+#
+# CSV genres are separated by ";". An optional "id" column keeps the ids of
+# the source system so that a shows file can refer to them. Shows take an
+# end_time or a duration in minutes, and shows that would double-book a
+# venue or artist are rejected, as are lines that are not JSON objects.
+#
+# The import runs in its own process, outside the web workers. Their
+# autocomplete indexes notice new names through the change counter, and
+# listing tiles are keyed by what they show, but cached pages are only
+# purged in the workers with RESPONSE_CACHE_BACKEND=redis. With the default
+# per-worker memory cache the workers serve their cached pages until
+# RESPONSE_CACHE_TTL runs out; restart them to show the import at once.
+#----------------------------------------------------------------------------#
+
+FALSE_VALUES = ('', '0', 'false', 'f', 'no', 'n', 'off')
+
+def read_rows(path, format):
+    # Yields (line number, row, errors). A line that is not a JSON object
+    # comes with errors and its text as the row.
+    with open(path, newline='', encoding='utf-8') as source:
+        if format == 'csv':
+            for number, row in enumerate(csv.DictReader(source), start=2):
+                if 'genres' in row:
+                    row['genres'] = [g for g in re.split(r'\s*;\s*', row['genres'] or '') if g]
+                yield number, row, {}
+        else:
+            for number, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield number, line.rstrip('\n'), {'row': ['Invalid JSON: %s.' % e]}
+                    continue
+                if isinstance(row, dict):
+                    yield number, row, {}
+                else:
+                    yield number, line.rstrip('\n'), {'row': ['Expected a JSON object.']}
+
+def form_data(row, booleans=()):
+    data = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key in booleans:
+            if str(value).strip().lower() not in FALSE_VALUES:
+                data.add(key, 'y')
+        elif isinstance(value, list):
+            for item in value:
+                data.add(key, str(item))
+        else:
+            data.add(key, str(value))
+    if 'website' in data and 'website_link' not in data:
+        data['website_link'] = data['website']
+    return data
+
+def optional_id(row):
+    value = row.get('id')
+    return int(value) if value not in (None, '') else None
+
+def venue_record(form, row):
+    latitude, longitude = geo.locate(form.city.data, form.state.data)
+    return {
+        'id': optional_id(row),
+        'name': form.name.data.strip(),
+        'city': form.city.data.strip(),
+        'state': form.state.data,
+        'latitude': latitude,
+        'longitude': longitude,
+        'geo_cell': geo.cell(latitude, longitude),
+        'address': form.address.data.strip(),
+        'phone': re.sub(r'\D', '', form.phone.data or ''),
+        'image_link': (form.image_link.data or '').strip(),
+        'website': (form.website_link.data or '').strip(),
+        'facebook_link': form.facebook_link.data.strip(),
+        'seeking_talent': form.seeking_talent.data,
+        'seeking_description': (form.seeking_description.data or '').strip(),
+    }, form.genres.data
+
+def artist_record(form, row):
+    return {
+        'id': optional_id(row),
+        'name': form.name.data.strip(),
+        'city': form.city.data.strip(),
+        'state': form.state.data,
+        'phone': re.sub(r'\D', '', form.phone.data or ''),
+        'image_link': (form.image_link.data or '').strip(),
+        'website': (form.website_link.data or '').strip(),
+        'facebook_link': form.facebook_link.data.strip(),
+        'seeking_venue': form.seeking_venue.data,
+        'seeking_description': (form.seeking_description.data or '').strip(),
+    }, form.genres.data
+
+def show_record(form, row):
+    start_time = form.start_time.data
+    duration = timedelta(minutes=form.duration.data) if form.duration.data else DEFAULT_SHOW_DURATION
+    return {
+        'venue_id': int(form.venue_id.data),
+        'artist_id': int(form.artist_id.data),
+        'start_time': start_time,
+        'end_time': start_time + duration,
+    }, None
+
+def normalize_show(row):
+    # ShowForm expects "YYYY-mm-dd HH:MM:SS" and a duration in minutes;
+    # accept ISO 8601 and an end_time as well.
+    row = dict(row)
+    try:
+        start_time = datetime.fromisoformat(str(row.get('start_time', '')))
+        row['start_time'] = start_time.strftime('%Y-%m-%d %H:%M:%S')
+        if row.get('end_time') and not row.get('duration'):
+            end_time = datetime.fromisoformat(str(row['end_time']))
+            row['duration'] = int((end_time - start_time).total_seconds() // 60)
+    except ValueError:
+        pass
+    return row
+
+# Forms are named rather than imported, so that loading the CLI commands
+# does not load WTForms.
+KINDS = {
+    'venues': (Venue, 'VenueForm', venue_record, venue_genre_table, 'venue_id', ('seeking_talent',)),
+    'artists': (Artist, 'ArtistForm', artist_record, artist_genre_table, 'artist_id', ('seeking_venue',)),
+    'shows': (Show, 'ShowForm', show_record, None, None, ()),
+}
+
+#----------------------------------------------------------------------------#
+# Loading.
+#----------------------------------------------------------------------------#
+
+def serial_sequence(connection, table):
+    return connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"),
+                              {'table': '"%s"' % table.name}).scalar()
+
+def allocate_ids(connection, table, count):
+    if not count:
+        return []
+    if connection.dialect.name == 'postgresql':
+        return [row[0] for row in connection.execute(
+            text('SELECT nextval(:sequence) FROM generate_series(1, :count)'),
+            {'sequence': serial_sequence(connection, table), 'count': count})]
+    # Other databases serialize writers, so the next ids are free.
+    start = connection.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar() + 1
+    return list(range(start, start + count))
+
+def sync_sequence(connection, table):
+    # Moves the id sequence past ids that came from the input file.
+    if connection.dialect.name == 'postgresql':
+        sequence = serial_sequence(connection, table)
+        connection.execute(text(
+            'SELECT setval(:sequence, greatest((SELECT coalesce(max(id), 1) FROM "%s"), '
+            '(SELECT last_value FROM %s)))' % (table.name, sequence)), {'sequence': sequence})
+
+def copy_rows(connection, table, rows):
+    # COPY is only used through psycopg2; other drivers fall back to
+    # executemany.
+    cursor = connection.connection.cursor()
+    if not hasattr(cursor, 'copy_expert'):
+        return False
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    # Strings are quoted, so '' stays an empty string and None becomes NULL.
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+    buffer.seek(0)
+    cursor.copy_expert('COPY "%s" (%s) FROM STDIN WITH (FORMAT csv)' % (
+        table.name, ', '.join('"%s"' % column for column in columns)), buffer)
+    return True
+
+def insert_rows(connection, table, rows, use_copy):
+    if not rows:
+        return
+    if use_copy and connection.dialect.name == 'postgresql' and copy_rows(connection, table, rows):
+        return
+    connection.execute(table.insert(), rows)
+
+def load_batch(kind, batch, use_copy):
+    model, _, _, link_table, owner_column, _ = KINDS[kind]
+    table = model.__table__
+
+    genre_ids = {}
+    if link_table is not None:
+        genre_ids = resolve_genre_ids(db.session, [g for _, genres in batch for g in genres])
+        db.session.commit()
+
+    with db.engine.begin() as connection:
+        records = [record for record, _ in batch]
+        if kind == 'shows':
+            insert_rows(connection, table, records, use_copy)
+            show_stats.refresh(connection, Venue, {r['venue_id'] for r in records})
+            show_stats.refresh(connection, Artist, {r['artist_id'] for r in records})
+            return {'venue:%d' % r['venue_id'] for r in records} | {'artist:%d' % r['artist_id'] for r in records}
+
+        explicit = any(record['id'] is not None for record in records)
+        fresh = iter(allocate_ids(connection, table, sum(record['id'] is None for record in records)))
+        for record in records:
+            if record['id'] is None:
+                record['id'] = next(fresh)
+        insert_rows(connection, table, records, use_copy)
+        if explicit:
+            sync_sequence(connection, table)
+
+        insert_rows(connection, link_table, [
+            {'genre_id': genre_ids[name], owner_column: record['id']}
+            for record, genres in batch for name in dict.fromkeys(g.strip() for g in genres if g.strip())
+        ], use_copy)
+
+        search_kind = search.KINDS[model]
+        search.write_documents(connection, [
+            search.make_document(search_kind, record['id'], record['name'], record['city'], record['state'], genres)
+            for record, genres in batch])
+        if model is Venue:
+            areas.refresh(connection, {(record['state'], record['city']) for record in records})
+        version = autocomplete.bump(connection)
+
+    if autocomplete.index.loaded:
+        autocomplete.index.update([(search_kind, r['id'], r['name']) for r in records], [], version)
+    return {kind}
+
+def reject_conflicts(batch, sources, rejects):
+    # Drops the shows of a batch that overlap a stored show or an earlier
+    # show of the batch, and returns how many were dropped.
+    with db.engine.connect() as connection:
+        conflicts = scheduling.report(connection, [record for record, _ in batch])
+    errors = {}
+    for conflict in conflicts:
+        if conflict['other_booking'] is not None:
+            conflict['other_booking'] = sources[conflict['other_booking']][0]
+        errors.setdefault(conflict['booking'], []).append(scheduling.describe(conflict, 'line %d'))
+    for index in sorted(errors, reverse=True):
+        number, row = sources.pop(index)
+        del batch[index]
+        rejects.write(json.dumps({'line': number, 'errors': {'start_time': errors[index]}, 'row': row},
+                                 default=str) + '\n')
+    return len(errors)
+
+def validate_row(kind, form_class, booleans, known, row):
+    # Returns the filled form and the row's errors by field. `known` maps
+    # id columns to the ids they may refer to.
+    if kind == 'shows':
+        row.update(normalize_show(row))
+    form = form_class(formdata=form_data(row, booleans), meta={'csrf': False})
+    errors = {} if form.validate() else dict(form.errors)
+    if kind == 'shows' and not row.get('start_time'):
+        errors.setdefault('start_time', []).append('This field is required.')
+    if row.get('id') not in (None, '') and not str(row['id']).strip().isdigit():
+        errors.setdefault('id', []).append('Invalid id %r.' % row['id'])
+    for column, ids in known.items():
+        value = str(row.get(column, '')).strip()
+        if not value.isdigit() or int(value) not in ids:
+            errors.setdefault(column, []).append('Unknown id %r.' % value)
+    return form, errors
+
+def run_import(kind, path, format, batch_size, use_copy, rejects):
+    import forms
+    model, form_name, to_record, _, _, booleans = KINDS[kind]
+    form_class = getattr(forms, form_name)
+    known = {}
+    if kind == 'shows':
+        known['venue_id'] = {venue_id for venue_id, in db.session.query(Venue.id)}
+        known['artist_id'] = {artist_id for artist_id, in db.session.query(Artist.id)}
+
+    imported = rejected = 0
+    tags = {'shows'} if kind == 'shows' else set()
+    loaded_ids = set()
+    unplaced = {}
+    started = time.monotonic()
+    batch = []
+    sources = []
+
+    def flush():
+        nonlocal imported, rejected
+        if kind == 'shows' and batch:
+            rejected += reject_conflicts(batch, sources, rejects)
+        sources.clear()
+        if batch:
+            tags.update(load_batch(kind, batch, use_copy))
+            if kind != 'shows':
+                loaded_ids.update(record['id'] for record, _ in batch)
+            for record, _ in batch:
+                if kind == 'venues' and record['latitude'] is None:
+                    place = (record['city'], record['state'])
+                    unplaced[place] = unplaced.get(place, 0) + 1
+            imported += len(batch)
+            batch.clear()
+            rate = imported / max(time.monotonic() - started, 1e-9)
+            click.echo(f'{kind}: {imported} imported, {rejected} rejected ({rate:.0f} rows/s)')
+
+    with current_app.test_request_context():
+        for number, row, errors in read_rows(path, format):
+            if not errors:
+                form, errors = validate_row(kind, form_class, booleans, known, row)
+            if errors:
+                rejected += 1
+                rejects.write(json.dumps({'line': number, 'errors': errors, 'row': row}, default=str) + '\n')
+                continue
+
+            batch.append(to_record(form, row))
+            sources.append((number, row))
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+
+    if loaded_ids:
+        venue_ids, artist_ids = (loaded_ids, ()) if kind == 'venues' else ((), loaded_ids)
+        with db.engine.begin() as connection:
+            changed = recommendations.refresh(connection, current_app.config['RECOMMENDATIONS_COUNT'],
+                                              venue_ids, artist_ids)
+        tags |= recommendations.tags(changed)
+    response_cache.invalidate(tags)
+    if unplaced:
+        click.echo('%d venues are in cities without a centroid and will not show up in nearby searches: %s'
+                   % (sum(unplaced.values()), geo.describe_unplaced(unplaced)))
+    return imported, rejected
+
+def init_app(app):
+    @app.cli.command('import')
+    @click.argument('kind', type=click.Choice(sorted(KINDS)))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', type=click.Choice(['csv', 'jsonl']),
+                  help='Input format. Defaults to the file extension.')
+    @click.option('--batch-size', type=int, help='Rows per transaction. Defaults to IMPORT_BATCH_SIZE.')
+    @click.option('--copy/--no-copy', 'use_copy', default=True, help='Use COPY on Postgres.')
+    @click.option('--rejects', type=click.File('w'),
+                  help='Write rejected rows and their errors to this JSONL file instead of stderr.')
+    def import_command(kind, path, format, batch_size, use_copy, rejects):
+        """Bulk load venues, artists or shows from a CSV or JSONL file."""
+        format = format or ('jsonl' if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson', '.json') else 'csv')
+        batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+        imported, rejected = run_import(kind, path, format, batch_size, use_copy, rejects or sys.stderr)
+        click.echo(f'Done: {imported} {kind} imported, {rejected} rejected.')
+        if imported and isinstance(response_cache.cache.backend, response_cache.MemoryBackend):
+            click.echo('Running workers keep their cached pages for up to %d seconds (RESPONSE_CACHE_TTL); '
+                       'restart them to show the import at once.' % current_app.config['RESPONSE_CACHE_TTL'])
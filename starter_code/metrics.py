@@ -0,0 +1,153 @@
+import bisect
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from response_cache import cache
+
+#----------------------------------------------------------------------------#
+# Request metrics.
+#
+# Every request records its route, status, wall time, SQL statement count
+# and SQL time. Statements are timed with engine events and charged to the
+# request that runs them, including statements run while a streamed
+# response is being sent. The totals are kept as histograms per route and
+# served at /metrics in the Prometheus text format.
+#
+# Requests slower than SLOW_REQUEST_MS are logged with their slowest
+# statements.
+#----------------------------------------------------------------------------#
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                # Per-bucket counts, then sum and count.
+                series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        with self.lock:
+            series = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self.series.items())
+        for label_values, (counts, total, count) in series:
+            labels = format_labels(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket{%sle="%s"} %d' % (self.name, labels + ',' if labels else '', bound, cumulative))
+            lines.append('%s_bucket{%sle="+Inf"} %d' % (self.name, labels + ',' if labels else '', count))
+            lines.append('%s_sum{%s} %r' % (self.name, labels, total))
+            lines.append('%s_count{%s} %d' % (self.name, labels, count))
+        return lines
+
+def format_labels(pairs):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join('%s="%s"' % (name, escape(value)) for name, value in pairs)
+
+request_seconds = Histogram('fyyur_request_duration_seconds', 'Wall time of requests, streaming included.',
+                            SECONDS_BUCKETS, ('route', 'method', 'status'))
+sql_statements = Histogram('fyyur_request_sql_statements', 'SQL statements run per request.',
+                           STATEMENT_BUCKETS, ('route', 'method'))
+sql_seconds = Histogram('fyyur_request_sql_seconds', 'Time spent in SQL statements per request.',
+                        SECONDS_BUCKETS, ('route', 'method'))
+
+def expose():
+    lines = []
+    for histogram in (request_seconds, sql_statements, sql_seconds):
+        lines += histogram.expose()
+    stats = cache.stats()
+    for name, kind, value in (('hits_total', 'counter', stats['hits']),
+                              ('misses_total', 'counter', stats['misses']),
+                              ('invalidations_total', 'counter', stats['invalidations']),
+                              ('entries', 'gauge', stats['entries'])):
+        lines += ['# TYPE fyyur_response_cache_%s %s' % (name, kind),
+                  'fyyur_response_cache_%s %d' % (name, value)]
+    return '\n'.join(lines) + '\n'
+
+#----------------------------------------------------------------------------#
+# Collection.
+#----------------------------------------------------------------------------#
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+        # (seconds, statement) of every statement, for the slow request log.
+        self.timings = []
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def end_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_started'].pop()
+    stats = g.get('request_stats') if has_request_context() else None
+    if stats is not None:
+        elapsed = time.perf_counter() - started
+        stats.statements += 1
+        stats.sql_seconds += elapsed
+        stats.timings.append((elapsed, statement))
+
+@event.listens_for(Engine, 'handle_error')
+def discard_statement(context):
+    started = context.connection.info.get('metrics_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+def record(app, stats, route, method, status):
+    elapsed = time.perf_counter() - stats.started
+    request_seconds.observe(elapsed, route, method, status)
+    sql_statements.observe(stats.statements, route, method)
+    sql_seconds.observe(stats.sql_seconds, route, method)
+
+    slow_ms = app.config.get('SLOW_REQUEST_MS')
+    if slow_ms is not None and elapsed * 1000 >= slow_ms:
+        slowest = sorted(stats.timings, key=lambda timing: timing[0], reverse=True)
+        slowest = slowest[:app.config.get('SLOW_REQUEST_STATEMENTS', 3)]
+        app.logger.warning('Slow request %s %s: %d in %.1f ms, %d statements in %.1f ms%s',
+                           method, route, status, elapsed * 1000, stats.statements, stats.sql_seconds * 1000,
+                           ''.join('\n  %.1f ms  %s' % (seconds * 1000, ' '.join(statement.split()))
+                                   for seconds, statement in slowest))
+
+def init_app(app):
+    @app.before_request
+    def start_request():
+        g.request_stats = RequestStats()
+
+    @app.after_request
+    def finish_request(response):
+        stats = g.get('request_stats')
+        if stats is not None:
+            route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+            method = request.method
+            # Recorded once the body has been sent, so streamed responses
+            # count their full time and the statements run while streaming.
+            response.call_on_close(lambda: record(app, stats, route, method, response.status_code))
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(expose(), mimetype='text/plain; version=0.0.4')
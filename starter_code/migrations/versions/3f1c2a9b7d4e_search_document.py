@@ -0,0 +1,87 @@
+"""search document index
+
+Revision ID: 3f1c2a9b7d4e
+Revises: e550310ebbfd
+Create Date: 2026-10-18 10:12:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9b7d4e'
+down_revision = 'e550310ebbfd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('search_document',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('location', sa.String(), nullable=False),
+    sa.Column('genres', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'entity_id')
+    )
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            "CREATE INDEX ix_search_document_vector ON search_document USING gin ("
+            "(setweight(to_tsvector('simple', name), 'A') || "
+            "setweight(to_tsvector('simple', location), 'B') || "
+            "setweight(to_tsvector('simple', genres), 'C')))")
+        op.execute(
+            "CREATE INDEX ix_search_document_name_trgm ON search_document "
+            "USING gin (name gin_trgm_ops)")
+        genre_list = "string_agg(\"Genre\".name, ' ')"
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE search_document_fts USING fts5("
+            "name, location, genres, content='search_document', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+        op.execute(
+            "CREATE TRIGGER search_document_ai AFTER INSERT ON search_document BEGIN "
+            "INSERT INTO search_document_fts(rowid, name, location, genres) "
+            "VALUES (new.id, new.name, new.location, new.genres); END")
+        op.execute(
+            "CREATE TRIGGER search_document_ad AFTER DELETE ON search_document BEGIN "
+            "INSERT INTO search_document_fts(search_document_fts, rowid, name, location, genres) "
+            "VALUES ('delete', old.id, old.name, old.location, old.genres); END")
+        op.execute(
+            "CREATE TRIGGER search_document_au AFTER UPDATE ON search_document BEGIN "
+            "INSERT INTO search_document_fts(search_document_fts, rowid, name, location, genres) "
+            "VALUES ('delete', old.id, old.name, old.location, old.genres); "
+            "INSERT INTO search_document_fts(rowid, name, location, genres) "
+            "VALUES (new.id, new.name, new.location, new.genres); END")
+        genre_list = "group_concat(\"Genre\".name, ' ')"
+    else:
+        genre_list = "''"
+
+    # Backfill one document per existing venue and artist.
+    for kind, entity, link in (('venue', 'Venue', 'venue_genre_table'),
+                               ('artist', 'Artist', 'artist_genre_table')):
+        op.execute(
+            f"INSERT INTO search_document (kind, entity_id, name, location, genres) "
+            f"SELECT '{kind}', e.id, coalesce(e.name, ''), "
+            f"trim(coalesce(e.city, '') || ' ' || coalesce(e.state, '')), "
+            f"coalesce({genre_list}, '') "
+            f"FROM \"{entity}\" e "
+            f"LEFT JOIN {link} ON {link}.{kind}_id = e.id "
+            f"LEFT JOIN \"Genre\" ON \"Genre\".id = {link}.genre_id "
+            f"GROUP BY e.id, e.name, e.city, e.state")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS search_document_au")
+        op.execute("DROP TRIGGER IF EXISTS search_document_ad")
+        op.execute("DROP TRIGGER IF EXISTS search_document_ai")
+        op.execute("DROP TABLE IF EXISTS search_document_fts")
+    op.drop_table('search_document')
@@ -0,0 +1,46 @@
+"""show counters on venue and artist
+
+Revision ID: 5b8e03d7c4a1
+Revises: c92d5e8f1a06
+Create Date: 2026-10-18 13:41:52.207716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e03d7c4a1'
+down_revision = 'c92d5e8f1a06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        now = "datetime('now', 'localtime')"
+    else:
+        now = 'LOCALTIMESTAMP'
+
+    for table, owner in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('upcoming_show_count', sa.Integer(), nullable=False, server_default='0'))
+            batch_op.add_column(sa.Column('past_show_count', sa.Integer(), nullable=False, server_default='0'))
+            batch_op.add_column(sa.Column('next_show_at', sa.DateTime(), nullable=True))
+        op.create_index(op.f(f'ix_{table}_next_show_at'), table, ['next_show_at'], unique=False)
+
+        shows = f'FROM "Show" s WHERE s.{owner} = "{table}".id'
+        op.execute(
+            f'UPDATE "{table}" SET '
+            f'upcoming_show_count = (SELECT count(*) {shows} AND s.start_time > {now}), '
+            f'past_show_count = (SELECT count(*) {shows} AND s.start_time <= {now}), '
+            f'next_show_at = (SELECT min(s.start_time) {shows} AND s.start_time > {now})')
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index(op.f(f'ix_{table}_next_show_at'), table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('next_show_at')
+            batch_op.drop_column('past_show_count')
+            batch_op.drop_column('upcoming_show_count')
@@ -0,0 +1,26 @@
+"""genre change counter
+
+Revision ID: 6e0c4b9d2f18
+Revises: a9d3e7b05c62
+Create Date: 2026-10-20 10:12:44.301957
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e0c4b9d2f18'
+down_revision = 'a9d3e7b05c62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    counter = sa.table('change_counter', sa.column('name', sa.String), sa.column('value', sa.Integer))
+    op.bulk_insert(counter, [{'name': 'genres', 'value': 0}])
+
+
+def downgrade():
+    counter = sa.table('change_counter', sa.column('name', sa.String))
+    op.execute(counter.delete().where(counter.c.name == 'genres'))
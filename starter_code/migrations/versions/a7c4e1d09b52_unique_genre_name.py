@@ -0,0 +1,39 @@
+"""unique genre name
+
+Revision ID: a7c4e1d09b52
+Revises: 3f1c2a9b7d4e
+Create Date: 2026-10-18 11:03:27.540981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e1d09b52'
+down_revision = '3f1c2a9b7d4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Concurrent form posts could insert the same genre twice. Point every
+    # link at the oldest genre of each name, then drop the duplicates.
+    canonical = 'SELECT name, min(id) AS id FROM "Genre" GROUP BY name'
+    for link, owner in (('venue_genre_table', 'venue_id'), ('artist_genre_table', 'artist_id')):
+        op.execute(
+            f'INSERT INTO {link} (genre_id, {owner}) '
+            f'SELECT DISTINCT keep.id, l.{owner} FROM {link} l '
+            f'JOIN "Genre" g ON g.id = l.genre_id '
+            f'JOIN ({canonical}) keep ON keep.name = g.name '
+            f'WHERE g.id <> keep.id AND NOT EXISTS ('
+            f'SELECT 1 FROM {link} x WHERE x.genre_id = keep.id AND x.{owner} = l.{owner})')
+        op.execute(
+            f'DELETE FROM {link} WHERE genre_id NOT IN (SELECT min(id) FROM "Genre" GROUP BY name)')
+    op.execute('DELETE FROM "Genre" WHERE id NOT IN (SELECT min(id) FROM "Genre" GROUP BY name)')
+
+    op.create_index(op.f('ix_Genre_name'), 'Genre', ['name'], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Genre_name'), table_name='Genre')
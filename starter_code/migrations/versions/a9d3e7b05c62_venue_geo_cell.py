@@ -0,0 +1,47 @@
+"""grid cells for venue proximity search
+
+Revision ID: a9d3e7b05c62
+Revises: f2b6d9a41c37
+Create Date: 2026-10-19 11:18:52.640217
+
+geo_cell is filled from the stored coordinates; keep CELL_DEGREES in
+step with geo.py.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3e7b05c62'
+down_revision = 'f2b6d9a41c37'
+branch_labels = None
+depends_on = None
+
+CELL_DEGREES = 0.25
+
+
+def cell(lat, lon):
+    row = min(int((lat + 90) / CELL_DEGREES), int(180 / CELL_DEGREES) - 1)
+    column = min(int((lon + 180) / CELL_DEGREES), int(360 / CELL_DEGREES) - 1)
+    return row * int(360 / CELL_DEGREES) + column
+
+
+def upgrade():
+    op.drop_index('ix_Venue_latitude_longitude', table_name='Venue')
+    op.add_column('Venue', sa.Column('geo_cell', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_Venue_geo_cell'), 'Venue', ['geo_cell'], unique=False)
+
+    connection = op.get_bind()
+    venue = sa.table('Venue', sa.column('id'), sa.column('latitude'), sa.column('longitude'), sa.column('geo_cell'))
+    cells = [{'venue_id': venue_id, 'geo_cell': cell(lat, lon)} for venue_id, lat, lon in connection.execute(
+        sa.select(venue.c.id, venue.c.latitude, venue.c.longitude).where(venue.c.latitude.isnot(None)))]
+    if cells:
+        connection.execute(venue.update().where(venue.c.id == sa.bindparam('venue_id'))
+                           .values(geo_cell=sa.bindparam('geo_cell')), cells)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Venue_geo_cell'), table_name='Venue')
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.drop_column('geo_cell')
+    op.create_index('ix_Venue_latitude_longitude', 'Venue', ['latitude', 'longitude'], unique=False)
@@ -0,0 +1,31 @@
+"""venue coordinates for proximity search
+
+Revision ID: b3e8d2c6f471
+Revises: e7a9c3f15b20
+Create Date: 2026-10-18 21:05:37.482913
+
+Existing venues are placed afterwards with `flask geocode-venues`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8d2c6f471'
+down_revision = 'e7a9c3f15b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+    op.create_index('ix_Venue_latitude_longitude', 'Venue', ['latitude', 'longitude'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Venue_latitude_longitude', table_name='Venue')
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
@@ -0,0 +1,34 @@
+"""genre recommendations of venues and artists
+
+Revision ID: c5f0a9e2d817
+Revises: b3e8d2c6f471
+Create Date: 2026-10-18 23:12:08.305164
+
+The table is filled afterwards with `flask refresh-recommendations`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f0a9e2d817'
+down_revision = 'b3e8d2c6f471'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('recommendation',
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('rank', sa.Integer(), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('kind', 'entity_id', 'rank')
+    )
+    op.create_index('ix_recommendation_kind_artist_id', 'recommendation', ['kind', 'artist_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_recommendation_kind_artist_id', table_name='recommendation')
+    op.drop_table('recommendation')
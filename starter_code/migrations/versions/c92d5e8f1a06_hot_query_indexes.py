@@ -0,0 +1,52 @@
+"""hot query indexes
+
+Revision ID: c92d5e8f1a06
+Revises: a7c4e1d09b52
+Create Date: 2026-10-18 12:20:09.733415
+
+"""
+from contextlib import nullcontext
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c92d5e8f1a06'
+down_revision = 'a7c4e1d09b52'
+branch_labels = None
+depends_on = None
+
+# Plans before and after each index: benchmarks/query_plans.py
+INDEXES = [
+    # show_venue / show_artist sections and counts, upcoming counts in
+    # /venues and the searches.
+    ('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time']),
+    ('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time']),
+    # Keyset pagination of /shows.
+    ('ix_Show_start_time_id', 'Show', ['start_time', 'id']),
+    # Area grouping of /venues.
+    ('ix_Venue_state_city', 'Venue', ['state', 'city']),
+]
+
+
+def online_block():
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction, but it
+    # lets Postgres build the index without locking out writes.
+    if op.get_bind().dialect.name == 'postgresql':
+        return op.get_context().autocommit_block(), True
+    return nullcontext(), False
+
+
+def upgrade():
+    block, concurrently = online_block()
+    with block:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    block, concurrently = online_block()
+    with block:
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=concurrently)
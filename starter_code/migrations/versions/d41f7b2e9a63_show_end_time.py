@@ -0,0 +1,88 @@
+"""show end time and double-booking constraints
+
+Revision ID: d41f7b2e9a63
+Revises: 5b8e03d7c4a1
+Create Date: 2026-10-18 16:05:12.480331
+
+On Postgres the upgrade adds exclusion constraints against double
+bookings and stops, listing them, if existing shows already overlap.
+Every show gets a two hour end time, so the same shows can be listed on
+the old schema beforehand with:
+
+    SELECT a.id, b.id, a.venue_id, a.artist_id, b.venue_id, b.artist_id
+    FROM "Show" a JOIN "Show" b
+      ON (a.venue_id = b.venue_id OR a.artist_id = b.artist_id)
+     AND a.id < b.id
+     AND b.start_time < a.start_time + interval '2 hours'
+     AND a.start_time < b.start_time + interval '2 hours';
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f7b2e9a63'
+down_revision = '5b8e03d7c4a1'
+branch_labels = None
+depends_on = None
+
+
+# Overlapping shows listed when the upgrade stops.
+MAX_LISTED = 50
+
+
+def overlaps(owner):
+    # Pairs of shows of one venue or artist that overlap, the later one
+    # starting inside the earlier one.
+    return sa.text(
+        f'SELECT a.id, b.id, a.{owner}, b.start_time FROM "Show" a JOIN "Show" b '
+        f'ON b.{owner} = a.{owner} AND b.start_time >= a.start_time AND b.start_time < a.end_time '
+        f'AND (b.start_time > a.start_time OR b.id > a.id) '
+        f'ORDER BY a.{owner}, b.start_time LIMIT {MAX_LISTED + 1}')
+
+
+def check_overlaps():
+    connection = op.get_bind()
+    lines = []
+    for name, owner in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        lines += [f'  shows {first} and {second}: {name} {owner_id} at {start}'
+                  for first, second, owner_id, start in connection.execute(overlaps(owner))]
+    if lines:
+        raise RuntimeError(
+            'Existing shows overlap, so the double-booking constraints cannot be added. '
+            'Move or delete one show of each pair and upgrade again:\n' + '\n'.join(lines[:MAX_LISTED])
+            + ('\n  ...' if len(lines) > MAX_LISTED else ''))
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        # Same text format as SQLAlchemy writes, so comparisons stay correct.
+        end = "strftime('%Y-%m-%d %H:%M:%S.000000', start_time, '+2 hours')"
+    else:
+        end = "start_time + interval '2 hours'"
+
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.add_column(sa.Column('end_time', sa.DateTime(), nullable=True))
+    op.execute(f'UPDATE "Show" SET end_time = {end}')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_check_constraint('ck_Show_end_after_start', 'end_time > start_time')
+
+    if dialect == 'postgresql':
+        # The transaction rolls back, leaving the old schema in place.
+        check_overlaps()
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        for name, owner in (('venue', 'venue_id'), ('artist', 'artist_id')):
+            op.execute(
+                f'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_{name}_overlap" '
+                f'EXCLUDE USING gist ({owner} WITH =, tsrange(start_time, end_time) WITH &&)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for name in ('artist', 'venue'):
+            op.execute(f'ALTER TABLE "Show" DROP CONSTRAINT "ex_Show_{name}_overlap"')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_constraint('ck_Show_end_after_start', type_='check')
+        batch_op.drop_column('end_time')
@@ -0,0 +1,34 @@
+"""area rollup for the venues page
+
+Revision ID: e7a9c3f15b20
+Revises: d41f7b2e9a63
+Create Date: 2026-10-18 17:22:40.918254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a9c3f15b20'
+down_revision = 'd41f7b2e9a63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('area',
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('city', sa.String(length=120), nullable=False),
+        sa.Column('venue_count', sa.Integer(), nullable=False),
+        sa.Column('upcoming_show_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('state', 'city')
+    )
+    op.execute(
+        'INSERT INTO area (state, city, venue_count, upcoming_show_count) '
+        'SELECT state, city, count(*), coalesce(sum(upcoming_show_count), 0) FROM "Venue" '
+        'WHERE state IS NOT NULL AND city IS NOT NULL GROUP BY state, city')
+
+
+def downgrade():
+    op.drop_table('area')
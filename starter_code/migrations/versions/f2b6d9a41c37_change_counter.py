@@ -0,0 +1,29 @@
+"""change counters
+
+Revision ID: f2b6d9a41c37
+Revises: c5f0a9e2d817
+Create Date: 2026-10-19 09:41:26.518903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6d9a41c37'
+down_revision = 'c5f0a9e2d817'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    counter = op.create_table('change_counter',
+        sa.Column('name', sa.String(length=32), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(counter, [{'name': 'names', 'value': 0}, {'name': 'recommendations', 'value': 0}])
+
+
+def downgrade():
+    op.drop_table('change_counter')
@@ -1,11 +1,12 @@
-from app import db
-from datetime import datetime
+from extensions import db
+from datetime import datetime, timedelta
+from sqlalchemy import event
 
 class Genre(db.Model):
     __tablename__ = 'Genre'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    name = db.Column(db.String, unique=True, index=True)
 
 artist_genre_table = db.Table('artist_genre_table',
     db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
@@ -36,6 +37,19 @@ class Venue(db.Model):
 
     shows = db.relationship('Show', backref='venue', lazy=True)
 
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime, index=True)
+
+    # City centroid and its cell of the search grid, set by geo.py.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geo_cell = db.Column(db.Integer, index=True)
+
+    __table_args__ = (
+        db.Index('ix_Venue_state_city', 'state', 'city'),
+    )
+
     def __repr__(self):
         return f'<Venue {self.id} {self.name}>'
 
@@ -57,17 +71,83 @@ class Artist(db.Model):
 
     shows = db.relationship('Show', backref='artist', lazy=True)
 
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime, index=True)
+
     def __repr__(self):
         return f'<Artist {self.id} {self.name}>'
 
+# A show without an end time lasts DEFAULT_SHOW_DURATION. None may last
+# longer than MAX_SHOW_DURATION, which bounds the overlap checks in
+# scheduling.py.
+DEFAULT_SHOW_DURATION = timedelta(hours=2)
+MAX_SHOW_DURATION = timedelta(hours=24)
+
+def default_end_time(context):
+    return context.get_current_parameters()['start_time'] + DEFAULT_SHOW_DURATION
+
 class Show(db.Model):
     __tablename__ = 'Show'
 
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
 
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+        db.CheckConstraint('end_time > start_time', name='ck_Show_end_after_start'),
+    )
+
     def __repr__(self):
-        return f'<Show {self.id} {self.start_time} artist_id={artist_id} venue_id={venue_id}>'
\ No newline at end of file
+        return f'<Show {self.id} {self.start_time} artist_id={artist_id} venue_id={venue_id}>'
+
+search_document = db.Table('search_document',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('kind', db.String(16), nullable=False),
+    db.Column('entity_id', db.Integer, nullable=False),
+    db.Column('name', db.String, nullable=False, default=''),
+    db.Column('location', db.String, nullable=False, default=''),
+    db.Column('genres', db.String, nullable=False, default=''),
+    db.UniqueConstraint('kind', 'entity_id')
+)
+
+# One row per (state, city) with venues, maintained by areas.py.
+area = db.Table('area',
+    db.Column('state', db.String(120), primary_key=True),
+    db.Column('city', db.String(120), primary_key=True),
+    db.Column('venue_count', db.Integer, nullable=False, default=0),
+    db.Column('upcoming_show_count', db.Integer, nullable=False, default=0)
+)
+
+# Artists recommended by genre, maintained by recommendations.py: for kind
+# 'artist' the artists most like artist entity_id, for kind 'venue' the
+# artists that best fit venue entity_id, best first.
+recommendation = db.Table('recommendation',
+    db.Column('kind', db.String(16), primary_key=True),
+    db.Column('entity_id', db.Integer, primary_key=True),
+    db.Column('rank', db.Integer, primary_key=True),
+    db.Column('artist_id', db.Integer, nullable=False),
+    db.Column('score', db.Float, nullable=False),
+    db.Index('ix_recommendation_kind_artist_id', 'kind', 'artist_id')
+)
+
+# Named counters, bumped by every transaction that changes what they
+# count, so that a process holding a copy can tell that it is out of date.
+# 'names' counts venue and artist name changes (autocomplete.py),
+# 'recommendations' rewrites of the stored lists (recommendations.py) and
+# 'genres' genre renames and deletes (genre_cache.py).
+change_counter = db.Table('change_counter',
+    db.Column('name', db.String(32), primary_key=True),
+    db.Column('value', db.Integer, nullable=False, default=0)
+)
+
+@event.listens_for(change_counter, 'after_create')
+def create_counters(target, connection, **kw):
+    connection.execute(target.insert(), [{'name': 'names', 'value': 0}, {'name': 'recommendations', 'value': 0},
+                                         {'name': 'genres', 'value': 0}])
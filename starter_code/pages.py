@@ -0,0 +1,37 @@
+from flask import Blueprint, current_app, jsonify, render_template, request
+
+import autocomplete
+from response_cache import cache
+from routing import replica_reads
+
+#----------------------------------------------------------------------------#
+# Home page, autocomplete, cache stats and error pages.
+#----------------------------------------------------------------------------#
+
+bp = Blueprint('pages', __name__)
+
+@bp.route('/')
+def index():
+    return render_template('pages/home.html')
+
+@bp.route('/api/autocomplete')
+@replica_reads
+def autocomplete_names():
+    limit = request.args.get('limit', current_app.config['AUTOCOMPLETE_LIMIT'], type=int)
+    results = autocomplete.lookup(request.args.get('q', ''), max(1, min(limit, 50)))
+    return jsonify({
+        "venues": [{ "id": venue_id, "name": name } for venue_id, name in results['venue']],
+        "artists": [{ "id": artist_id, "name": name } for artist_id, name in results['artist']]
+    })
+
+@bp.route('/cache/stats')
+def cache_stats():
+    return jsonify(cache.stats())
+
+@bp.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('errors/404.html'), 404
+
+@bp.app_errorhandler(500)
+def server_error(error):
+    return render_template('errors/500.html'), 500
@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from flask import abort, current_app, jsonify, request
+from sqlalchemy import and_, func, select
+
+from models import Artist, Show, recommendation
+import response_cache
+import scheduling
+
+#----------------------------------------------------------------------------#
+# Queries shared by the venue and artist pages.
+#
+# These are read view steps (see read_views.py): they yield statements and
+# are used with `yield from`.
+#----------------------------------------------------------------------------#
+
+def partition_shows(owner_key, owner_id, other, prefix, limit=None):
+    # Splits one venue's or artist's shows into upcoming and past in SQL.
+    # `other` is the model on the far side of each show (Artist for a venue
+    # page, Venue for an artist page) and is joined in so that no show row
+    # triggers a lazy load. Returns the two lists and their full counts.
+    ts = datetime.now()
+    is_upcoming = (Show.start_time > ts).label('is_upcoming')
+    counts = dict((yield select(is_upcoming, func.count(Show.id))
+        .where(owner_key == owner_id)
+        .group_by(is_upcoming)).all())
+
+    def section(upcoming):
+        if upcoming:
+            condition, order = Show.start_time > ts, Show.start_time
+        else:
+            condition, order = Show.start_time <= ts, Show.start_time.desc()
+        query = select(Show.start_time, other.id, other.name, other.image_link) \
+            .join(other) \
+            .where(owner_key == owner_id, condition) \
+            .order_by(order, Show.id)
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    sections = {}
+    for upcoming in (True, False):
+        rows = (yield section(upcoming)).all() if counts.get(upcoming, 0) else []
+        sections[upcoming] = [{
+            prefix + "_id": other_id,
+            prefix + "_name": name,
+            prefix + "_image_link": image_link,
+            "start_time": start_time
+        } for start_time, other_id, name, image_link in rows]
+
+    return sections[True], counts.get(True, 0), sections[False], counts.get(False, 0)
+
+def search_results(model, ids):
+    # Names and upcoming show counts for a ranked list of search hits, in one
+    # query, keeping the ranking order.
+    rows = (yield select(model.id, model.name, model.upcoming_show_count)
+        .where(model.id.in_(ids))).all() if ids else []
+    by_id = { row[0]: row for row in rows }
+
+    data = []
+    for entity_id in ids:
+        if entity_id in by_id:
+            _, name, num_upcoming_shows = by_id[entity_id]
+            data.append({
+                "id": entity_id,
+                "name": name,
+                "num_upcoming_shows": num_upcoming_shows,
+            })
+    return {
+        "count": len(data),
+        "data": data
+    }
+
+def recommended_artists(kind, entity_id):
+    # The artists recommendations.py stored for a venue or artist, best
+    # first. Artists deleted since are skipped by the join.
+    rows = (yield select(Artist.id, Artist.name, Artist.image_link, recommendation.c.score)
+        .select_from(recommendation)
+        .join(Artist, Artist.id == recommendation.c.artist_id)
+        .where(recommendation.c.kind == kind, recommendation.c.entity_id == entity_id)
+        .order_by(recommendation.c.rank)).all()
+    response_cache.tag(*{ 'artist:%d' % artist_id for artist_id, _, _, _ in rows })
+    return [{
+        "artist_id": artist_id,
+        "artist_name": name,
+        "artist_image_link": image_link,
+        "score": score
+    } for artist_id, name, image_link, score in rows]
+
+def availability(owner, owner_key, other, other_key, prefix, where, start, end):
+    # The shows in [start, end) of every venue or artist matching `where`, as
+    # [(owner id, owner name, [(start, end, show)])], from one query. Each
+    # owner's shows come from a range scan of its (owner, start_time) index
+    # and are outer joined, so owners without shows are listed too.
+    rows = (yield select(owner.id, owner.name, Show.id, Show.start_time, Show.end_time, other.id, other.name)
+        .select_from(owner)
+        .outerjoin(Show, and_(owner_key == owner.id, *scheduling.overlapping(start, end)))
+        .outerjoin(other, other.id == other_key)
+        .where(where)
+        .order_by(owner.id, Show.start_time, Show.id)).all()
+
+    return [(owner_id, name, [(show_start, show_end, {
+            "id": show_id,
+            prefix + "_id": other_id,
+            prefix + "_name": other_name,
+            "start_time": show_start,
+            "end_time": show_end
+        }) for _, _, show_id, show_start, show_end, other_id, other_name in group if show_id is not None])
+        for (owner_id, name), group in groupby(rows, key=itemgetter(0, 1))]
+
+def availability_range():
+    # [from, to) from ?from= and ?to=, or the day of ?date=. Defaults to the
+    # AVAILABILITY_DAYS days from today.
+    import dateutil.parser
+    try:
+        if request.args.get('date'):
+            start = dateutil.parser.parse(request.args['date']).replace(hour=0, minute=0, second=0, microsecond=0)
+            end = start + timedelta(days=1)
+        else:
+            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            start = dateutil.parser.parse(request.args['from']) if request.args.get('from') else today
+            end = dateutil.parser.parse(request.args['to']) if request.args.get('to') \
+                else start + timedelta(days=current_app.config['AVAILABILITY_DAYS'])
+    except (ValueError, OverflowError):
+        abort(400)
+    if start.tzinfo or end.tzinfo or end <= start \
+            or end - start > timedelta(days=current_app.config['AVAILABILITY_MAX_DAYS']):
+        abort(400)
+    return start, end
+
+def slot_json(slot):
+    data = dict(slot, start_time=slot['start_time'].isoformat(), end_time=slot['end_time'].isoformat())
+    if 'shows' in slot:
+        data['shows'] = [dict(show, start_time=show['start_time'].isoformat(), end_time=show['end_time'].isoformat())
+            for show in slot['shows']]
+    return data
+
+def availability_response(owner_id, owners, prefix, start, end):
+    if not owners:
+        abort(404)
+    (_, name, bookings), = owners
+    response_cache.tag(*{ '%s:%d' % (prefix, show[prefix + '_id']) for _, _, show in bookings })
+    return jsonify({
+        "id": owner_id,
+        "name": name,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "slots": [slot_json(slot) for slot in scheduling.slots(bookings, start, end)]
+    })
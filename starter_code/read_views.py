@@ -0,0 +1,42 @@
+from functools import wraps
+
+from extensions import db
+
+#----------------------------------------------------------------------------#
+# Read views that run on sync and async sessions alike.
+#
+# A read view is written as a generator: it yields each statement it needs
+# and gets the statement's Result back, then returns what a Flask view
+# returns. It may also yield a function of a sync Connection, for work
+# such as dialect checks that needs one. @read_view turns the generator
+# into an ordinary Flask view on db.session; the generator itself stays
+# available as view.page, which asgi.py runs on an AsyncSession.
+#----------------------------------------------------------------------------#
+
+def run(page, session):
+    result = None
+    try:
+        while True:
+            step = page.send(result)
+            result = step(session.connection()) if callable(step) else session.execute(step)
+    except StopIteration as stop:
+        return stop.value
+
+async def run_async(page, session):
+    result = None
+    try:
+        while True:
+            step = page.send(result)
+            if callable(step):
+                result = await session.run_sync(lambda sync_session: step(sync_session.connection()))
+            else:
+                result = await session.execute(step)
+    except StopIteration as stop:
+        return stop.value
+
+def read_view(page):
+    @wraps(page)
+    def view(**kwargs):
+        return run(page(**kwargs), db.session)
+    view.page = page
+    return view
@@ -0,0 +1,356 @@
+import itertools
+import threading
+
+import click
+from flask import current_app
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Venue, Artist, artist_genre_table, venue_genre_table, recommendation, change_counter
+
+#----------------------------------------------------------------------------#
+# Artist recommendations by genre.
+#
+# The artist and venue genre tables form a bipartite graph between
+# entities and genres. From it `recommendation` stores, for every artist,
+# the RECOMMENDATIONS_COUNT artists with the most similar genres and, for
+# every venue, the artists whose genres best fit it, so the pages read a
+# ranked list instead of comparing genres per request.
+#
+# Similarity is the Jaccard index of two genre sets. Entities only differ
+# by their genre set, and there are far fewer distinct sets than entities,
+# so the genre links are loaded as NumPy arrays, the entities are grouped
+# by set, and one matrix product scores every pair of sets. Each set's
+# best artists are then read off in order of score and, among equal
+# scores, of upcoming shows.
+#
+# Changing the genres of a venue or artist, or creating or deleting one,
+# queues it for a background thread. The thread loads the genre sets, but
+# only scores and rewrites the changed entities and the entities whose
+# list holds a changed artist or may now take one in: those sharing a
+# set whose stored list is short or ends at or below the artist's score
+# against it. It then invalidates their cached pages. The importer
+# refreshes its rows in the same way. Show counts only break ties, so
+# lists follow them when `flask refresh-recommendations` rebuilds the
+# whole table, e.g. nightly.
+#
+# Every worker runs its own thread, so each rewrite first bumps the
+# 'recommendations' change counter. The row lock lasts until commit and
+# makes concurrent refreshes, rebuilds and imports wait for each other.
+#----------------------------------------------------------------------------#
+
+# Kind -> column of its genre links. Recommendations are always artists.
+RELATIONS = {
+    'artist': artist_genre_table.c.artist_id,
+    'venue': venue_genre_table.c.venue_id,
+}
+
+KINDS = {Artist: 'artist', Venue: 'venue'}
+
+# Change counter bumped by every rewrite of stored lists.
+COUNTER = 'recommendations'
+
+# Entities per statement when rewriting lists.
+KEY_CHUNK = 500
+
+#----------------------------------------------------------------------------#
+# Scoring.
+#----------------------------------------------------------------------------#
+
+def genre_sets(links, genres):
+    """Groups the entities of (entity id, genre id) `links` by genre set.
+
+    Returns the entity ids in ascending order, the index of each one's set
+    and the sets as a boolean (sets x genres) matrix over `genres`.
+    """
+    import numpy as np
+
+    links = np.asarray(links, dtype=np.int64).reshape(-1, 2)
+    ids, rows = np.unique(links[:, 0], return_inverse=True)
+    incidence = np.zeros((len(ids), len(genres)), dtype=bool)
+    incidence[rows.reshape(-1), np.searchsorted(genres, links[:, 1])] = True
+    # Each row packed into one opaque value, which np.unique sorts far
+    # faster than rows.
+    packed = np.ascontiguousarray(np.packbits(incidence, axis=1))
+    keys = packed.view(np.dtype((np.void, packed.shape[1]))).reshape(-1)
+    _, first, set_of = np.unique(keys, return_index=True, return_inverse=True)
+    return ids, set_of.reshape(-1), incidence[first]
+
+def jaccard(a, b):
+    # Pairwise |a & b| / |a | b| of the rows of two boolean matrices.
+    import numpy as np
+
+    a, b = a.astype(np.float32), b.astype(np.float32)
+    shared = a @ b.T
+    union = a.sum(axis=1)[:, None] + b.sum(axis=1)[None, :] - shared
+    return np.divide(shared, union, out=np.zeros_like(shared), where=shared > 0)
+
+def best(scores, members, count):
+    # The first `count` (target index, score) pairs for one source set, by
+    # descending score and then by target index. `members` lists the
+    # target indices of each target set in ascending order. Lists usually
+    # fill from the one or two best scores, so those are taken one at a
+    # time rather than sorting every score.
+    import numpy as np
+
+    scores = scores.copy()
+    picked = []
+    while len(picked) < count:
+        score = scores.max(initial=0)
+        if score <= 0:
+            break
+        group = np.flatnonzero(scores == score)
+        scores[group] = 0
+        need = count - len(picked)
+        pool = np.sort(np.concatenate([members[target][:need] for target in group]))[:need]
+        picked += [(index, float(score)) for index in pool.tolist()]
+    return picked
+
+class Catalogue:
+    """The genre sets of every venue and artist.
+
+    Without any genre links only `genres`, empty, is set. Otherwise
+    `entities[kind]` holds the entity ids, the index of each one's set and
+    the sets, as returned by genre_sets(); artist ids are in priority
+    order. `members` lists the artist indices of each artist set.
+    """
+
+    def __init__(self, connection):
+        import numpy as np
+
+        # Rows are flattened straight into arrays; going through Row objects
+        # costs more than all of the scoring.
+        links = {kind: np.fromiter(itertools.chain.from_iterable(
+                    connection.execute(select(column, column.table.c.genre_id))), dtype=np.int64).reshape(-1, 2)
+                 for kind, column in RELATIONS.items()}
+        self.genres = np.unique(np.concatenate([pairs[:, 1] for pairs in links.values()]))
+        if not len(self.genres):
+            return
+        self.entities = {kind: genre_sets(links[kind], self.genres) for kind in RELATIONS}
+
+        # Artists are numbered by priority, so that among equal scores the
+        # artist with the lowest index, i.e. the most upcoming shows, wins.
+        artist_ids, artist_set_of, artist_sets = self.entities['artist']
+        ordered = np.fromiter(connection.execute(select(Artist.id)
+            .order_by(Artist.upcoming_show_count.desc(), Artist.id)).scalars(), dtype=np.int64)
+        ordered = ordered[np.isin(ordered, artist_ids)]
+        artist_set_of = artist_set_of[np.searchsorted(artist_ids, ordered)]
+        self.entities['artist'] = ordered, artist_set_of, artist_sets
+        # A stable sort keeps each set's members in priority order.
+        by_set = np.argsort(artist_set_of, kind='stable')
+        self.members = np.split(by_set, np.cumsum(np.bincount(artist_set_of, minlength=len(artist_sets)))[:-1])
+
+    def lists(self, kind, count, entity_ids=None):
+        """Scores entities of `kind`, all of them or those in `entity_ids`.
+
+        Returns {entity id: [(artist id, score), ...]}, best first, for
+        those with genres.
+        """
+        import numpy as np
+
+        ids, set_of, sets = self.entities[kind]
+        if entity_ids is not None:
+            keep = np.isin(ids, np.fromiter(entity_ids, dtype=np.int64))
+            ids, set_of = ids[keep], set_of[keep]
+        # Only the sets of the entities asked for are scored.
+        scored, set_of = np.unique(set_of, return_inverse=True)
+        artist_ids, _, artist_sets = self.entities['artist']
+        artist_list = artist_ids.tolist()
+        # One extra, in case an artist's list holds the artist itself.
+        lists = [[(artist_list[index], score) for index, score in best(row, self.members, count + 1)]
+                 for row in jaccard(sets[scored], artist_sets)]
+        if kind == 'artist':
+            return {entity_id: [pick for pick in lists[set_index] if pick[0] != entity_id][:count]
+                    for entity_id, set_index in zip(ids.tolist(), set_of.reshape(-1).tolist())}
+        return {entity_id: lists[set_index][:count]
+                for entity_id, set_index in zip(ids.tolist(), set_of.reshape(-1).tolist())}
+
+    def gaining(self, connection, kind, count, artist_ids, current):
+        """Entities of `kind` whose list the given artists may now enter.
+
+        That is every entity sharing a genre set with one whose stored
+        list is short, or ends at or below the artists' best score against
+        the set. `current` are entities whose stored list is out of date
+        anyway; they never stand in for their set.
+        """
+        import numpy as np
+
+        ids, set_of, sets = self.entities[kind]
+        artists, artist_set_of, artist_sets = self.entities['artist']
+        changed_sets = np.unique(artist_set_of[np.isin(artists, np.fromiter(artist_ids, dtype=np.int64))])
+        if not len(ids) or not len(changed_sets):
+            return set()
+        top = jaccard(sets, artist_sets[changed_sets]).max(axis=1)
+        # Entities of one set share their list, so one of each set whose
+        # list is still current is read back.
+        standing = np.flatnonzero(~np.isin(ids, np.fromiter(current, dtype=np.int64)))
+        scored, first = np.unique(set_of[standing], return_index=True)
+        keep = top[scored] > 0
+        scored, stand_ins = scored[keep], ids[standing[first[keep]]].tolist()
+        stored = {}
+        for i in range(0, len(stand_ins), KEY_CHUNK):
+            stored.update((entity_id, (length, lowest)) for entity_id, length, lowest in connection.execute(
+                select(recommendation.c.entity_id, func.count(), func.min(recommendation.c.score))
+                .where(recommendation.c.kind == kind, recommendation.c.entity_id.in_(stand_ins[i:i + KEY_CHUNK]))
+                .group_by(recommendation.c.entity_id)))
+        reached = [set_index for set_index, entity_id in zip(scored.tolist(), stand_ins)
+                   if entity_id not in stored or stored[entity_id][0] < count or top[set_index] >= stored[entity_id][1]]
+        return set(ids[np.isin(set_of, reached)].tolist())
+
+def compute(connection, count):
+    """Scores every venue and artist against every artist.
+
+    Returns {kind: {entity id: [(artist id, score), ...]}}, best first,
+    for every entity with genres.
+    """
+    catalogue = Catalogue(connection)
+    if not len(catalogue.genres):
+        return {kind: {} for kind in RELATIONS}
+    return {kind: catalogue.lists(kind, count) for kind in RELATIONS}
+
+#----------------------------------------------------------------------------#
+# Storage.
+#----------------------------------------------------------------------------#
+
+def rows(kind, lists, ids):
+    return [{'kind': kind, 'entity_id': entity_id, 'rank': rank, 'artist_id': artist_id, 'score': score}
+            for entity_id in ids for rank, (artist_id, score) in enumerate(lists.get(entity_id, ()))]
+
+def write(connection, kind, lists, ids):
+    # Replaces the stored lists of the given entities.
+    ids = sorted(ids)
+    for i in range(0, len(ids), KEY_CHUNK):
+        chunk = ids[i:i + KEY_CHUNK]
+        connection.execute(recommendation.delete().where(
+            recommendation.c.kind == kind, recommendation.c.entity_id.in_(chunk)))
+        chunk_rows = rows(kind, lists, chunk)
+        if chunk_rows:
+            connection.execute(recommendation.insert(), chunk_rows)
+
+def lock(connection):
+    # Counts a rewrite of the stored lists, first thing in the transaction.
+    # The row lock this takes (the database write lock on SQLite) is held
+    # until commit, so the refreshes of several workers and of the importer
+    # run one after another instead of deleting and inserting the same
+    # rows side by side.
+    if not connection.execute(update(change_counter).where(change_counter.c.name == COUNTER)
+                              .values(value=change_counter.c.value + 1)).rowcount:
+        connection.execute(change_counter.insert().values(name=COUNTER, value=1))
+
+def rebuild(connection, count):
+    lock(connection)
+    results = compute(connection, count)
+    connection.execute(recommendation.delete())
+    for kind, lists in results.items():
+        ids = sorted(lists)
+        for i in range(0, len(ids), KEY_CHUNK):
+            chunk_rows = rows(kind, lists, ids[i:i + KEY_CHUNK])
+            if chunk_rows:
+                connection.execute(recommendation.insert(), chunk_rows)
+    return {kind: len(lists) for kind, lists in results.items()}
+
+def refresh(connection, count, venue_ids=(), artist_ids=()):
+    """Rewrites the lists that changing the given entities can change.
+
+    Those are the lists of the entities themselves, every list that holds
+    one of the artists and every list one of them may now enter. Only
+    those entities are scored. Returns the rewritten ids by kind.
+    """
+    lock(connection)
+    catalogue = Catalogue(connection)
+    artist_ids = set(artist_ids)
+    changed = {'venue': set(venue_ids), 'artist': set(artist_ids)}
+    stale = sorted(artist_ids)
+    for kind, ids in changed.items():
+        for i in range(0, len(stale), KEY_CHUNK):
+            ids.update(connection.execute(select(recommendation.c.entity_id).where(
+                recommendation.c.kind == kind, recommendation.c.artist_id.in_(stale[i:i + KEY_CHUNK]))).scalars())
+        lists = {}
+        if len(catalogue.genres):
+            ids |= catalogue.gaining(connection, kind, count, artist_ids, ids)
+            lists = catalogue.lists(kind, count, ids)
+        write(connection, kind, lists, ids)
+    return changed
+
+def tags(changed):
+    # Cache tags of the pages showing the given lists.
+    return {'%s:%d' % (kind, entity_id) for kind, ids in changed.items() for entity_id in ids}
+
+#----------------------------------------------------------------------------#
+# Background refresh.
+#----------------------------------------------------------------------------#
+
+class Refresher:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {kind: set() for kind in RELATIONS}
+        self.wake = threading.Event()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.worker = None
+
+    def add(self, changed):
+        with self.lock:
+            for kind, ids in changed.items():
+                self.pending[kind] |= ids
+            self.idle.clear()
+            self.wake.set()
+            if self.worker is None or not self.worker.is_alive():
+                app = current_app._get_current_object()
+                self.worker = threading.Thread(target=self.work, args=(app,), name='recommendations', daemon=True)
+                self.worker.start()
+
+    def wait(self, timeout=None):
+        # Blocks until every queued change has been written.
+        return self.idle.wait(timeout)
+
+    def work(self, app):
+        import response_cache
+
+        with app.app_context():
+            while True:
+                self.wake.wait()
+                with self.lock:
+                    self.wake.clear()
+                    changed, self.pending = self.pending, {kind: set() for kind in RELATIONS}
+                try:
+                    with db.engine.begin() as connection:
+                        changed = refresh(connection, app.config['RECOMMENDATIONS_COUNT'],
+                                          changed['venue'], changed['artist'])
+                    response_cache.invalidate(tags(changed))
+                except Exception:
+                    app.logger.exception('refreshing recommendations failed')
+                with self.lock:
+                    if not self.wake.is_set():
+                        self.idle.set()
+
+refresher = Refresher()
+
+@event.listens_for(Session, 'after_flush')
+def collect_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        kind = KINDS.get(type(obj))
+        if kind is None:
+            continue
+        if obj in session.dirty and not inspect(obj).attrs.genres.history.has_changes():
+            continue
+        session.info.setdefault('recommendations', {kind: set() for kind in RELATIONS})[kind].add(obj.id)
+
+@event.listens_for(Session, 'after_commit')
+def refresh_committed(session):
+    changed = session.info.pop('recommendations', None)
+    if changed:
+        refresher.add(changed)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_changes(session):
+    session.info.pop('recommendations', None)
+
+def init_app(app):
+    @app.cli.command('refresh-recommendations')
+    def refresh_recommendations_command():
+        """Rebuild the genre recommendations of every venue and artist."""
+        with db.engine.begin() as connection:
+            counts = rebuild(connection, app.config['RECOMMENDATIONS_COUNT'])
+        click.echo('Recommendations rebuilt for %d artists and %d venues.' % (counts['artist'], counts['venue']))
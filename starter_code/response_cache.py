@@ -0,0 +1,254 @@
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from flask import g, request, session, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Response cache for read-heavy pages.
+#
+# Cached pages are tagged with the entities they show ("venue:3",
+# "artist:7", or a listing such as "venues"). Views add tags for whatever
+# they render with tag(), and every commit that touches a venue, artist or
+# show invalidates exactly the pages carrying the matching tags.
+#
+# The default backend is an in-process LRU with a TTL. RedisBackend shares
+# one cache between workers; it accepts any client with the redis-py
+# get/set/setex/sadd/smembers/expire/delete/scan_iter/pipeline methods.
+#----------------------------------------------------------------------------#
+
+class MemoryBackend:
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.tagged = defaultdict(set)
+        self.invalidated_at = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _drop(self, key):
+        _, _, tags = self.entries.pop(key)
+        for tag in tags:
+            keys = self.tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tagged[tag]
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._drop(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl, tags):
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self.tagged[tag].add(key)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+
+    def invalidate(self, tags):
+        with self.lock:
+            keys = set()
+            for tag in tags:
+                keys |= self.tagged.get(tag, set())
+            for key in keys:
+                self._drop(key)
+            self.invalidated_at = time.time()
+            return len(keys)
+
+    def last_invalidation(self):
+        return self.invalidated_at
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tagged.clear()
+
+class RedisBackend:
+    def __init__(self, client, prefix='fyyur:page:'):
+        self.client = client
+        self.prefix = prefix
+
+    def __len__(self):
+        # Pages are stored under their paths, which start with a slash;
+        # tag sets and the invalidation time are not counted. SCAN walks
+        # the keyspace in batches without blocking the server.
+        return sum(1 for _ in self.client.scan_iter(self.prefix + '/*'))
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl, tags):
+        pipe = self.client.pipeline()
+        pipe.setex(self.prefix + key, ttl, json.dumps(value))
+        for tag in tags:
+            # A tag set expires together with the newest page it lists.
+            pipe.sadd(self.prefix + 'tag:' + tag, key)
+            pipe.expire(self.prefix + 'tag:' + tag, ttl)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        tag_keys = [self.prefix + 'tag:' + tag for tag in tags]
+        keys = set()
+        for tag_key in tag_keys:
+            keys |= {k.decode() if isinstance(k, bytes) else k for k in self.client.smembers(tag_key)}
+        if keys or tag_keys:
+            self.client.delete(*([self.prefix + key for key in keys] + tag_keys))
+        self.client.set(self.prefix + 'invalidated_at', time.time())
+        return len(keys)
+
+    def last_invalidation(self):
+        # Shared, so that every worker sees the others' invalidations.
+        value = self.client.get(self.prefix + 'invalidated_at')
+        return float(value) if value is not None else 0
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+class ResponseCache:
+    def __init__(self):
+        self.backend = None
+        self.ttl = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app, backend=None):
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+        if backend is not None:
+            self.backend = backend
+        elif app.config.get('RESPONSE_CACHE_BACKEND', 'memory') == 'redis':
+            import redis
+            self.backend = RedisBackend(redis.Redis.from_url(app.config['RESPONSE_CACHE_REDIS_URL']))
+        else:
+            self.backend = MemoryBackend(app.config.get('RESPONSE_CACHE_SIZE', 512))
+
+    def _count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'entries': len(self.backend) if self.backend is not None else 0,
+            }
+
+    def usable(self):
+        # Pages carry flashed messages, so requests with pending flashes
+        # neither read nor fill the cache.
+        return self.backend is not None and self.ttl and request.method == 'GET' and '_flashes' not in session
+
+    def lookup(self, tags, kwargs):
+        # Returns the cached response for the current request, or None after
+        # starting to collect the page's tags.
+        hit = self.backend.get(request.full_path)
+        if hit is not None:
+            self._count('hits')
+            status, headers, body = hit
+            return Response(body, status=status, headers=headers)
+        self._count('misses')
+        g.cache_tags = {tag.format(**kwargs) for tag in tags}
+        return None
+
+    def store(self, response):
+        if response.status_code == 200 and not response.direct_passthrough:
+            headers = [(k, v) for k, v in response.headers.items() if k.lower() != 'set-cookie']
+            self.backend.set(request.full_path, (200, headers, response.get_data(as_text=True)), self.ttl, g.cache_tags)
+
+    def cached(self, *tags):
+        # Caches a GET view's response under its full path. Tags may use
+        # the view's URL arguments, e.g. cached('venue:{venue_id}').
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if not self.usable():
+                    return view(**kwargs)
+                hit = self.lookup(tags, kwargs)
+                if hit is not None:
+                    return hit
+                response = view(**kwargs)
+                if not isinstance(response, Response):
+                    response = Response(response)
+                self.store(response)
+                return response
+            wrapper.cache_tags = tags
+            return wrapper
+        return decorator
+
+    def invalidate(self, tags):
+        if self.backend is not None and tags:
+            self.backend.invalidate(tags)
+            self._count('invalidations')
+
+    def invalidated_within(self, seconds):
+        # Whether pages were invalidated in the last `seconds`, by this
+        # worker or, with a shared backend, by any.
+        return self.backend is not None and self.backend.last_invalidation() > time.time() - seconds
+
+cache = ResponseCache()
+
+def tag(*tags):
+    # Marks the page being rendered as depending on further entities.
+    if 'cache_tags' in g:
+        g.cache_tags.update(tags)
+
+#----------------------------------------------------------------------------#
+# Invalidation.
+#----------------------------------------------------------------------------#
+
+def affected_tags(obj):
+    if isinstance(obj, Venue):
+        return {'venues', 'venue:%s' % obj.id}
+    if isinstance(obj, Artist):
+        return {'artists', 'artist:%s' % obj.id}
+    if isinstance(obj, Show):
+        return {'shows', 'venues', 'venue:%s' % obj.venue_id, 'artist:%s' % obj.artist_id}
+    return set()
+
+@event.listens_for(Session, 'after_flush')
+def collect_tags(session, flush_context):
+    tags = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tags |= affected_tags(obj)
+    if tags:
+        session.info.setdefault('response_cache', set()).update(tags)
+
+def invalidate(tags):
+    cache.invalidate(tags)
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_committed(session):
+    tags = session.info.pop('response_cache', None)
+    if tags:
+        invalidate(tags)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_tags(session):
+    session.info.pop('response_cache', None)
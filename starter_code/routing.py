@@ -0,0 +1,86 @@
+import random
+import time
+
+from flask import g, has_app_context, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#
+# Views marked with @replica_reads (listings, detail pages, searches and
+# the read API) run their queries on one of the DATABASE_REPLICA_URLS
+# binds, picked per request. Writes always go to the primary: flushes are
+# routed there, and so is every view that is not marked. A client that has
+# just written reads from the primary for REPLICA_READ_AFTER_WRITE_SECONDS
+# afterwards, so the redirect after a form post shows its own change even
+# while the replicas lag behind.
+#
+# A cached page is filled by whichever client misses first, and kept until
+# the next write. For REPLICA_READ_AFTER_WRITE_SECONDS after any
+# invalidation, cached views therefore read from the primary too, so that
+# a replica that has not caught up with the write cannot put the old page
+# back under the fresh key.
+#----------------------------------------------------------------------------#
+
+REPLICA_PREFIX = 'replica'
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # The choice is kept on g rather than on the session: a streamed
+        # response runs its queries after the request's session has been
+        # removed, in a new one.
+        replica = g.get('replica') if has_app_context() else None
+        if bind is None and replica is not None and not self._flushing:
+            return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def replica_reads(view):
+    view.replica_reads = True
+    return view
+
+def replicas(app):
+    return sorted(key for key in app.config.get('SQLALCHEMY_BINDS') or {} if key.startswith(REPLICA_PREFIX))
+
+@event.listens_for(RoutingSession, 'after_commit')
+def remember_write(session):
+    if has_request_context() and session.info.get('wrote'):
+        g.wrote = True
+    session.info.pop('wrote', None)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def mark_write(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def forget_write(session):
+    session.info.pop('wrote', None)
+
+def read_bind(app, view):
+    # The replica bind the current request should read from, or None for
+    # the primary.
+    from response_cache import cache
+
+    keys = replicas(app)
+    if not keys or not getattr(view, 'replica_reads', False):
+        return None
+    if session.get('read_primary_until', 0) > time.time():
+        return None
+    lag = app.config['REPLICA_READ_AFTER_WRITE_SECONDS']
+    if getattr(view, 'cache_tags', None) is not None and cache.invalidated_within(lag):
+        return None
+    return random.choice(keys)
+
+def init_app(app):
+    if not replicas(app):
+        return
+
+    @app.before_request
+    def choose_bind():
+        g.replica = read_bind(app, app.view_functions.get(request.endpoint))
+
+    @app.after_request
+    def stick_to_primary(response):
+        if g.get('wrote'):
+            session['read_primary_until'] = time.time() + app.config['REPLICA_READ_AFTER_WRITE_SECONDS']
+        return response
@@ -0,0 +1,252 @@
+import heapq
+from itertools import groupby
+from operator import attrgetter, itemgetter
+
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.orm import Session
+
+from models import Show, DEFAULT_SHOW_DURATION, MAX_SHOW_DURATION
+
+#----------------------------------------------------------------------------#
+# Double-booking detection.
+#
+# A show holds its venue and its artist from start_time up to, but not
+# including, end_time, and two shows of one venue or one artist may not
+# overlap. On Postgres, exclusion constraints over tsrange (btree_gist)
+# enforce that even between concurrent transactions. On every database,
+# shows are checked before they are flushed, which is what enforces it
+# elsewhere and gives the create page a readable error on Postgres.
+#
+# No show lasts longer than MAX_SHOW_DURATION, so every show that can
+# overlap [start, end) starts within [start - MAX_SHOW_DURATION, end): a
+# range scan of ix_Show_venue_id_start_time or ix_Show_artist_id_start_time
+# whose length does not grow with the table.
+#
+# report() checks many proposed bookings in one go. It loads the shows of
+# the venues and artists involved over the dates the bookings span, one
+# query per kind, and sweeps over each venue's and each artist's bookings
+# in start time order.
+#----------------------------------------------------------------------------#
+
+RESOURCES = (('venue', Show.venue_id), ('artist', Show.artist_id))
+
+POSTGRES_DDL = [
+    'CREATE EXTENSION IF NOT EXISTS btree_gist',
+    'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_venue_overlap" '
+    'EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)',
+    'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_artist_overlap" '
+    'EXCLUDE USING gist (artist_id WITH =, tsrange(start_time, end_time) WITH &&)',
+]
+
+# Ids per IN list when loading the shows of many venues or artists.
+ID_CHUNK = 500
+
+SHOW_COLUMNS = (Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time)
+
+class ShowConflict(ValueError):
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__('; '.join(describe(conflict) for conflict in conflicts))
+
+def describe(conflict, booking_label='booking %d'):
+    other = ('show %d' % conflict['show_id'] if conflict['show_id'] is not None
+             else booking_label % conflict['other_booking'])
+    return '%s %d is already booked from %s to %s (%s)' % (
+        conflict['resource'].title(), conflict['resource_id'],
+        conflict['start_time'], conflict['end_time'], other)
+
+def invalid(booking):
+    # Why a booking's times cannot be stored, or None.
+    start, end = booking['start_time'], booking['end_time']
+    if end <= start:
+        return 'The show must end after it starts.'
+    if end - start > MAX_SHOW_DURATION:
+        return 'A show may last at most %d hours.' % (MAX_SHOW_DURATION.total_seconds() // 3600)
+    return None
+
+def install(connection):
+    if connection.dialect.name == 'postgresql':
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+
+@event.listens_for(Show.__table__, 'after_create')
+def install_after_create(target, connection, **kw):
+    install(connection)
+
+#----------------------------------------------------------------------------#
+# Overlap search.
+#----------------------------------------------------------------------------#
+
+def overlapping(start, end):
+    # Conditions for shows overlapping [start, end), bounded below so that
+    # an index on (owner, start_time) serves them as one range scan.
+    return (Show.start_time >= start - MAX_SHOW_DURATION,
+            Show.start_time < end,
+            Show.end_time > start)
+
+def booked(connection, key, ids, start, end):
+    # Shows of the given venues or artists that overlap [start, end).
+    ids = sorted(ids)
+    for i in range(0, len(ids), ID_CHUNK):
+        yield from connection.execute(
+            select(*SHOW_COLUMNS).where(key.in_(ids[i:i + ID_CHUNK]), *overlapping(start, end)))
+
+def overlaps(intervals):
+    # Sweep over (start, end, item) triples of one venue or artist, yielding
+    # each overlapping pair once as (earlier, later). The heap holds the
+    # intervals still open at the current start, so the work is
+    # O(n log n) plus the number of pairs.
+    active = []
+    for n, (start, end, item) in enumerate(sorted(intervals, key=itemgetter(0, 1))):
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for _, _, other in active:
+            yield other, item
+        heapq.heappush(active, (end, n, item))
+
+def report(connection, bookings):
+    """Conflicts of proposed bookings with stored shows and with each other.
+
+    Bookings are dicts with venue_id, artist_id, start_time and end_time,
+    and an id when they move a stored show. Every conflict names the
+    booking (its index), the venue or artist, and either the stored show
+    or the other booking it overlaps. Of two overlapping bookings, the one
+    that starts later is reported.
+    """
+    conflicts = []
+    if not bookings:
+        return conflicts
+    start = min(booking['start_time'] for booking in bookings)
+    end = max(booking['end_time'] for booking in bookings)
+    moved = {booking['id'] for booking in bookings if booking.get('id') is not None}
+
+    for resource, key in RESOURCES:
+        owner = key.name
+        intervals = [(row.start_time, row.end_time, (row.id, None, row._mapping))
+                     for row in booked(connection, key, {b[owner] for b in bookings}, start, end)
+                     if row.id not in moved]
+        intervals += [(booking['start_time'], booking['end_time'], (None, index, booking))
+                      for index, booking in enumerate(bookings)]
+        intervals.sort(key=lambda interval: interval[2][2][owner])
+
+        for resource_id, group in groupby(intervals, key=lambda interval: interval[2][2][owner]):
+            for earlier, later in overlaps(group):
+                if later[1] is None:
+                    earlier, later = later, earlier
+                show_id, other_index, other = earlier
+                index = later[1]
+                if index is None:
+                    continue
+                conflicts.append({
+                    'booking': index,
+                    'resource': resource,
+                    'resource_id': resource_id,
+                    'show_id': show_id,
+                    'other_booking': other_index,
+                    'start_time': other['start_time'],
+                    'end_time': other['end_time'],
+                })
+
+    conflicts.sort(key=itemgetter('booking'))
+    return conflicts
+
+def stored_conflicts(connection, start, end):
+    """Pairs of stored shows that overlap within [start, end).
+
+    Postgres rejects these outright; on other databases they can only come
+    from data written before the checks existed.
+    """
+    rows = connection.execute(select(*SHOW_COLUMNS).where(*overlapping(start, end))).all()
+    conflicts = []
+    for resource, key in RESOURCES:
+        owner = attrgetter(key.name)
+        for resource_id, group in groupby(sorted(rows, key=owner), key=owner):
+            for first, second in overlaps((row.start_time, row.end_time, row) for row in group):
+                conflicts.append({
+                    'resource': resource,
+                    'resource_id': resource_id,
+                    'show_id': first.id,
+                    'other_show_id': second.id,
+                    'start_time': max(first.start_time, second.start_time),
+                    'end_time': min(first.end_time, second.end_time),
+                })
+    return conflicts
+
+#----------------------------------------------------------------------------#
+# Flush-time check.
+#----------------------------------------------------------------------------#
+
+BOOKING_ATTRS = ('venue_id', 'artist_id', 'start_time', 'end_time')
+
+def rescheduled(show):
+    state = inspect(show)
+    return state.pending or any(state.attrs[name].history.has_changes() for name in BOOKING_ATTRS)
+
+def booking_id(show, resource):
+    value = getattr(show, resource + '_id')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError('%s ID must be a number, not %r.' % (resource.title(), value)) from None
+
+@event.listens_for(Session, 'before_flush')
+def check_bookings(session, flush_context, instances):
+    shows = [obj for obj in list(session.new) + list(session.dirty)
+             if isinstance(obj, Show) and obj not in session.deleted and rescheduled(obj)]
+    bookings = []
+    for show in shows:
+        if show.start_time is None:
+            continue
+        if show.end_time is None:
+            show.end_time = show.start_time + DEFAULT_SHOW_DURATION
+        booking = {
+            'id': show.id,
+            'venue_id': booking_id(show, 'venue'),
+            'artist_id': booking_id(show, 'artist'),
+            'start_time': show.start_time,
+            'end_time': show.end_time,
+        }
+        error = invalid(booking)
+        if error:
+            raise ValueError(error)
+        bookings.append(booking)
+
+    if bookings:
+        with session.no_autoflush:
+            conflicts = report(session.connection(), bookings)
+        if conflicts:
+            raise ShowConflict(conflicts)
+
+#----------------------------------------------------------------------------#
+# Availability.
+#----------------------------------------------------------------------------#
+
+def slots(bookings, start, end):
+    """Free and booked slots covering [start, end), in one pass.
+
+    Bookings are (start_time, end_time, show) triples of one venue or
+    artist in start time order, as one range query returns them. Shows
+    that touch or overlap share a booked slot.
+    """
+    result = []
+    cursor = start
+    for show_start, show_end, show in bookings:
+        show_start, show_end = max(show_start, start), min(show_end, end)
+        if show_start >= show_end:
+            continue
+        if show_start > cursor:
+            result.append({'status': 'free', 'start_time': cursor, 'end_time': show_start})
+        if result and result[-1]['status'] == 'booked' and show_start <= cursor:
+            result[-1]['end_time'] = max(cursor, show_end)
+            result[-1]['shows'].append(show)
+        else:
+            result.append({'status': 'booked', 'start_time': show_start, 'end_time': show_end, 'shows': [show]})
+        cursor = max(cursor, show_end)
+    if cursor < end:
+        result.append({'status': 'free', 'start_time': cursor, 'end_time': end})
+    return result
+
+def free_slots(bookings, start, end, duration=None):
+    # The free slots of slots(), keeping those at least `duration` long.
+    return [slot for slot in slots(bookings, start, end)
+            if slot['status'] == 'free' and (duration is None or slot['end_time'] - slot['start_time'] >= duration)]
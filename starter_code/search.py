@@ -0,0 +1,216 @@
+import logging
+import re
+
+import click
+from sqlalchemy import event, func, or_, select, text, table, column, literal_column
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, selectinload
+
+from extensions import db
+from models import Venue, Artist, search_document
+
+#----------------------------------------------------------------------------#
+# Full-text search over venues and artists.
+#
+# Every venue and artist has one row in `search_document` holding its name,
+# location ("city state") and genre names. The row is rewritten whenever the
+# entity is flushed, so the index is always in step with the committed data.
+#
+# The text index on top of that table depends on the database:
+#   * PostgreSQL: a GIN index over a weighted tsvector for word/prefix
+#     matches plus a pg_trgm GIN index on name for substring matches.
+#   * SQLite: an external-content FTS5 table kept in sync by triggers.
+#   * Anything else (or SQLite without FTS5): a plain ilike scan.
+#----------------------------------------------------------------------------#
+
+logger = logging.getLogger(__name__)
+
+KINDS = {Venue: 'venue', Artist: 'artist'}
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_search_document_vector ON search_document USING gin ("
+    "(setweight(to_tsvector('simple', name), 'A') || "
+    "setweight(to_tsvector('simple', location), 'B') || "
+    "setweight(to_tsvector('simple', genres), 'C')))",
+    "CREATE INDEX IF NOT EXISTS ix_search_document_name_trgm ON search_document "
+    "USING gin (name gin_trgm_ops)",
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_document_fts USING fts5("
+    "name, location, genres, content='search_document', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS search_document_ai AFTER INSERT ON search_document BEGIN "
+    "INSERT INTO search_document_fts(rowid, name, location, genres) "
+    "VALUES (new.id, new.name, new.location, new.genres); END",
+    "CREATE TRIGGER IF NOT EXISTS search_document_ad AFTER DELETE ON search_document BEGIN "
+    "INSERT INTO search_document_fts(search_document_fts, rowid, name, location, genres) "
+    "VALUES ('delete', old.id, old.name, old.location, old.genres); END",
+    "CREATE TRIGGER IF NOT EXISTS search_document_au AFTER UPDATE ON search_document BEGIN "
+    "INSERT INTO search_document_fts(search_document_fts, rowid, name, location, genres) "
+    "VALUES ('delete', old.id, old.name, old.location, old.genres); "
+    "INSERT INTO search_document_fts(rowid, name, location, genres) "
+    "VALUES (new.id, new.name, new.location, new.genres); END",
+]
+
+search_document_fts = table('search_document_fts', column('rowid'))
+
+_backends = {}
+
+def install(connection):
+    # Creates the database-specific text index over search_document.
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+    elif dialect == 'sqlite':
+        try:
+            for statement in SQLITE_DDL:
+                connection.execute(text(statement))
+        except OperationalError as e:
+            logger.warning('FTS5 is unavailable, search falls back to ilike: %s', e)
+    _backends.pop(str(connection.engine.url), None)
+
+@event.listens_for(search_document, 'after_create')
+def install_after_create(target, connection, **kw):
+    install(connection)
+
+def backend(connection):
+    key = str(connection.engine.url)
+    if key not in _backends:
+        dialect = connection.dialect.name
+        if dialect == 'sqlite' and connection.dialect.has_table(connection, 'search_document_fts'):
+            _backends[key] = 'fts5'
+        elif dialect == 'postgresql':
+            _backends[key] = 'postgresql'
+        else:
+            _backends[key] = 'like'
+    return _backends[key]
+
+#----------------------------------------------------------------------------#
+# Index maintenance.
+#----------------------------------------------------------------------------#
+
+def make_document(kind, entity_id, name, city, state, genres):
+    return {
+        'kind': kind,
+        'entity_id': entity_id,
+        'name': name or '',
+        'location': ' '.join(part for part in (city, state) if part),
+        'genres': ' '.join(genre for genre in genres if genre),
+    }
+
+def document(entity):
+    return make_document(KINDS[type(entity)], entity.id, entity.name, entity.city, entity.state,
+                         [genre.name for genre in entity.genres])
+
+def remove(connection, kind, ids):
+    if ids:
+        connection.execute(search_document.delete().where(
+            (search_document.c.kind == kind) & search_document.c.entity_id.in_(ids)))
+
+def write_documents(connection, documents):
+    by_kind = {}
+    for doc in documents:
+        by_kind.setdefault(doc['kind'], []).append(doc['entity_id'])
+    for kind, ids in by_kind.items():
+        remove(connection, kind, ids)
+    if documents:
+        connection.execute(search_document.insert(), documents)
+
+def write(connection, entities):
+    write_documents(connection, [document(entity) for entity in entities])
+
+@event.listens_for(Session, 'after_flush')
+def sync_search_index(session, flush_context):
+    changed = [obj for obj in list(session.new) + list(session.dirty)
+               if type(obj) in KINDS and obj not in session.deleted]
+    deleted = [obj for obj in session.deleted if type(obj) in KINDS]
+    if not changed and not deleted:
+        return
+
+    connection = session.connection()
+    for kind in KINDS.values():
+        remove(connection, kind, [obj.id for obj in deleted if KINDS[type(obj)] == kind])
+    write(connection, changed)
+
+def rebuild():
+    connection = db.session.connection()
+    connection.execute(search_document.delete())
+    for model in KINDS:
+        entities = model.query.options(selectinload(model.genres)).all()
+        write(connection, entities)
+    db.session.commit()
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def escape_like(term):
+    return re.sub(r'([\\%_])', r'\\\1', term)
+
+def document_vector():
+    return func.setweight(func.to_tsvector('simple', search_document.c.name), 'A') \
+        .op('||')(func.setweight(func.to_tsvector('simple', search_document.c.location), 'B')) \
+        .op('||')(func.setweight(func.to_tsvector('simple', search_document.c.genres), 'C'))
+
+def query(kind, term, limit=None, engine='like'):
+    # Selects the ids of matching entities of `kind`, best match first.
+    # Every word of the term has to match the start of a word in the
+    # document, so partial input still finds results. `engine` is the
+    # backend() of the connection the statement will run on.
+    words = re.findall(r'\w+', term.lower())
+    statement = select(search_document.c.entity_id) \
+        .where(search_document.c.kind == kind)
+
+    if not words:
+        statement = statement.order_by(search_document.c.name)
+    elif engine == 'fts5':
+        match = ' '.join('"%s"*' % word for word in words)
+        fts = literal_column('search_document_fts')
+        # bm25() weights: a name hit outranks a location hit, which
+        # outranks a genre hit. Lower scores are better.
+        statement = statement.join(search_document_fts, search_document_fts.c.rowid == search_document.c.id) \
+            .where(fts.op('MATCH')(match)) \
+            .order_by(func.bm25(fts, 10.0, 4.0, 1.0))
+    elif engine == 'postgresql':
+        vector = document_vector()
+        tsquery = func.to_tsquery('simple', ' & '.join(word + ':*' for word in words))
+        pattern = '%' + escape_like(term.strip()) + '%'
+        statement = statement.where(or_(
+                vector.op('@@')(tsquery),
+                search_document.c.name.ilike(pattern, escape='\\'))) \
+            .order_by((func.ts_rank(vector, tsquery)
+                + func.similarity(search_document.c.name, term)).desc())
+    else:
+        for word in words:
+            pattern = '%' + escape_like(word) + '%'
+            statement = statement.where(or_(
+                search_document.c.name.ilike(pattern, escape='\\'),
+                search_document.c.location.ilike(pattern, escape='\\'),
+                search_document.c.genres.ilike(pattern, escape='\\')))
+        statement = statement.order_by(search_document.c.name)
+
+    if limit:
+        statement = statement.limit(limit)
+    return statement
+
+def find(kind, term, limit=None):
+    # Read view step: yields the backend check and the query, returns the
+    # ids. Use as `ids = yield from search.find(...)`.
+    engine = yield backend
+    result = yield query(kind, term, limit, engine)
+    return [entity_id for entity_id, in result]
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+def init_app(app):
+    @app.cli.command('reindex')
+    def reindex_command():
+        """Rebuild the venue and artist search index."""
+        install(db.session.connection())
+        rebuild()
+        click.echo('Search index rebuilt.')
@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import click
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Venue, Artist, Show
+import areas
+
+#----------------------------------------------------------------------------#
+# Show counters on Venue and Artist.
+#
+# upcoming_show_count, past_show_count and next_show_at are denormalized
+# from the Show table so that listing pages read a column instead of
+# aggregating shows. They are recomputed for the affected venues and artists
+# whenever shows are inserted, moved or deleted, and `flask roll-shows`
+# (run from cron every few minutes) recomputes the entities whose next show
+# has started since, moving it from upcoming to past. The rows are locked
+# before they are recounted, so concurrent bookings of one venue or artist
+# are counted one after the other. Venue changes carry over to the area
+# rollup (areas.py).
+#----------------------------------------------------------------------------#
+
+OWNERS = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+def refresh(connection, model, ids=None, now=None):
+    # Recomputes the counters of the given venues or artists (all of them
+    # when ids is None) with one UPDATE of correlated, index-backed counts,
+    # after locking the given rows.
+    if ids is not None and not ids:
+        return
+    now = now or datetime.now()
+    owner_key = dict(OWNERS)[model]
+    owned = owner_key == model.id
+
+    update = model.__table__.update().values(
+        upcoming_show_count=select(func.count(Show.id)).where(owned, Show.start_time > now).scalar_subquery(),
+        past_show_count=select(func.count(Show.id)).where(owned, Show.start_time <= now).scalar_subquery(),
+        next_show_at=select(func.min(Show.start_time)).where(owned, Show.start_time > now).scalar_subquery(),
+    )
+    if ids is not None:
+        ids = sorted(ids)
+        # Under READ COMMITTED the counts of two transactions that add
+        # shows to one venue would each miss the other's show. Locking the
+        # owners first makes the second wait for the first to commit, and
+        # the UPDATE, a new statement, then counts both.
+        connection.execute(select(model.id).where(model.id.in_(ids)).order_by(model.id).with_for_update())
+        update = update.where(model.id.in_(ids))
+    connection.execute(update)
+    if model is Venue:
+        areas.refresh_venues(connection, ids)
+
+def roll_forward(connection, now=None):
+    now = now or datetime.now()
+    for model, _ in OWNERS:
+        started = [entity_id for entity_id, in connection.execute(
+            select(model.id).where(model.next_show_at <= now))]
+        refresh(connection, model, started, now)
+
+@event.listens_for(Show.venue_id, 'set', active_history=True)
+@event.listens_for(Show.artist_id, 'set', active_history=True)
+def load_previous_owner(target, value, oldvalue, initiator):
+    # active_history loads the old owner of an expired show before it is
+    # replaced, so that moving the show recounts the venue or artist it
+    # left as well.
+    pass
+
+@event.listens_for(Session, 'after_flush')
+def refresh_after_flush(session, flush_context):
+    venue_ids, artist_ids = set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Show):
+            continue
+        state = inspect(obj)
+        for ids, attr in ((venue_ids, state.attrs.venue_id), (artist_ids, state.attrs.artist_id)):
+            history = attr.history
+            for value in list(history.added) + list(history.unchanged) + list(history.deleted):
+                if value is not None:
+                    ids.add(int(value))
+
+    if venue_ids or artist_ids:
+        connection = session.connection()
+        refresh(connection, Venue, venue_ids)
+        refresh(connection, Artist, artist_ids)
+
+def init_app(app):
+    @app.cli.command('roll-shows')
+    @click.option('--all', 'everything', is_flag=True, help='Recompute every venue and artist.')
+    def roll_shows_command(everything):
+        """Move started shows from upcoming to past in the show counters."""
+        with db.engine.begin() as connection:
+            if everything:
+                for model, _ in OWNERS:
+                    refresh(connection, model)
+            else:
+                roll_forward(connection)
+        click.echo('Show counters updated.')
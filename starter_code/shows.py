@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+
+from flask import Blueprint, abort, current_app, flash, render_template, request, url_for
+from sqlalchemy import select, tuple_
+
+from extensions import db
+from models import Venue, Artist, Show
+from read_views import read_view
+from response_cache import cache
+from routing import replica_reads
+import response_cache
+
+#----------------------------------------------------------------------------#
+# Show pages.
+#----------------------------------------------------------------------------#
+
+bp = Blueprint('shows', __name__)
+
+def parse_show_cursor(cursor):
+    # Cursors are "<start_time isoformat>_<show id>" of the last show on the
+    # previous page.
+    try:
+        start_time, show_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(start_time), int(show_id)
+    except ValueError:
+        abort(400)
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    import dateutil.parser
+    try:
+        return dateutil.parser.parse(value)
+    except (ValueError, OverflowError):
+        abort(400)
+
+@bp.route('/shows')
+@replica_reads
+@cache.cached('shows')
+@read_view
+def shows():
+    start = parse_date_arg('from') or datetime.now()
+    end = parse_date_arg('to')
+    venue_id = request.args.get('venue_id', type=int)
+    artist_id = request.args.get('artist_id', type=int)
+    after = request.args.get('after')
+    per_page = current_app.config['SHOWS_PER_PAGE']
+
+    query = select(
+        Show.id, Show.start_time,
+        Artist.id, Artist.name, Artist.image_link,
+        Venue.id, Venue.name
+    ).join(Artist, Show.artist_id == Artist.id) \
+        .join(Venue, Show.venue_id == Venue.id) \
+        .where(Show.start_time >= start)
+    if end:
+        query = query.where(Show.start_time < end)
+    if venue_id:
+        query = query.where(Show.venue_id == venue_id)
+    if artist_id:
+        query = query.where(Show.artist_id == artist_id)
+    if after:
+        query = query.where(tuple_(Show.start_time, Show.id) > parse_show_cursor(after))
+    rows = (yield query.order_by(Show.start_time, Show.id).limit(per_page + 1)).all()
+
+    next_url = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last_id, last_start_time = rows[-1][:2]
+        args = request.args.to_dict()
+        args['after'] = f'{last_start_time.isoformat()}_{last_id}'
+        next_url = url_for('.shows', **args)
+
+    data = [{
+        "id": show_id,
+        "artist_id": show_artist_id,
+        "artist_name": artist_name,
+        "artist_image_link": artist_image_link,
+        "venue_id": show_venue_id,
+        "venue_name": venue_name,
+        "start_time": start_time
+    } for show_id, start_time, show_artist_id, artist_name, artist_image_link, show_venue_id, venue_name in rows]
+    response_cache.tag(*{ 'artist:%d' % show['artist_id'] for show in data })
+    response_cache.tag(*{ 'venue:%d' % show['venue_id'] for show in data })
+
+    return render_template('pages/shows.html', shows=data, next_url=next_url)
+
+@bp.route('/shows/create')
+def create_shows():
+    from forms import ShowForm
+    # renders form. do not touch.
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+@bp.route('/shows/create', methods=['POST'])
+def create_show_submission():
+    from forms import ShowForm
+    form = ShowForm()
+    if not form.validate():
+        return render_template('forms/new_show.html', form=form)
+
+    artist_id=form.artist_id.data.strip()
+    venue_id=form.venue_id.data.strip()
+    start_time=form.start_time.data
+    end_time=None
+    if start_time and form.duration.data:
+        end_time=start_time + timedelta(minutes=form.duration.data)
+
+    error_in_insert = False
+    error_message = None
+
+    bad_ids = [label for label, value in (('Artist', artist_id), ('Venue', venue_id)) if not value.isdigit()]
+    if bad_ids:
+        flash('Show could not be listed. ' + ' '.join('%s ID must be a number.' % label for label in bad_ids))
+        return render_template('pages/home.html')
+
+    try:
+        add_show = Show(start_time=start_time, end_time=end_time, artist_id=artist_id, venue_id=venue_id)
+        db.session.add(add_show)
+        db.session.commit()
+    except ValueError as e:
+        # Double bookings (scheduling.ShowConflict) and impossible durations.
+        error_in_insert = True
+        error_message = str(e)
+        db.session.rollback()
+    except Exception as e:
+        error_in_insert = True
+        print(e)
+        db.session.rollback()
+    finally:
+        db.session.close()
+
+    if error_in_insert:
+        flash(f'An error occurred.  Show could not be listed.' + (f' {error_message}' if error_message else ''))
+        print("Error in create_show_submission()")
+    else:
+        flash('Show was successfully listed!')
+
+    return render_template('pages/home.html')
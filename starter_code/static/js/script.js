@@ -2,3 +2,32 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Typeahead for the navbar search boxes, fed by /api/autocomplete.
+(function() {
+  var inputs = document.querySelectorAll('input[data-autocomplete]');
+  Array.prototype.forEach.call(inputs, function(input) {
+    var kind = input.getAttribute('data-autocomplete');
+    var list = document.getElementById(input.getAttribute('list'));
+    var pending = null;
+
+    input.addEventListener('input', function() {
+      var term = input.value;
+      if (pending) { pending.abort(); }
+      if (!term) { list.innerHTML = ''; return; }
+
+      pending = new XMLHttpRequest();
+      pending.open('GET', '/api/autocomplete?q=' + encodeURIComponent(term));
+      pending.onload = function() {
+        var data = JSON.parse(this.responseText);
+        list.innerHTML = '';
+        data[kind].forEach(function(item) {
+          var option = document.createElement('option');
+          option.value = item.name;
+          list.appendChild(option);
+        });
+      };
+      pending.send(null);
+    });
+  });
+})();
@@ -0,0 +1,23 @@
+import click
+from jinja2 import FileSystemBytecodeCache
+
+#----------------------------------------------------------------------------#
+# Template compilation.
+#
+# Compiled templates are kept in a Jinja bytecode cache on disk, so a new
+# worker loads bytecode instead of parsing and compiling every template on
+# first use. `flask compile-templates` fills the cache ahead of a deploy.
+#----------------------------------------------------------------------------#
+
+def init_app(app):
+    if app.config.get('TEMPLATE_BYTECODE_CACHE', True):
+        # None keeps Jinja's per-user directory under the system temp dir.
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config.get('TEMPLATE_BYTECODE_CACHE_DIR'))
+
+    @app.cli.command('compile-templates')
+    def compile_templates_command():
+        """Compile every template into the bytecode cache."""
+        names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+        for name in names:
+            app.jinja_env.get_template(name)
+        click.echo(f'{len(names)} templates compiled.')
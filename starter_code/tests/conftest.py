@@ -0,0 +1,36 @@
+import os
+import tempfile
+
+import pytest
+
+# config.py reads these when the app is first imported.
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'tests.db')
+os.environ['ASSETS_DIR'] = tempfile.mkdtemp()
+os.environ['THUMBNAIL_CACHE_DIR'] = tempfile.mkdtemp()
+
+
+def create_test_app(**settings):
+    # An app on config.py with some settings replaced.
+    import config
+    from app import create_app
+    options = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    options.update(settings)
+    return create_app(type('TestConfig', (), options))
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    return create_app()
+
+
+@pytest.fixture
+def database(app):
+    # An empty schema in an app context, for tests that write rows. Only
+    # the primary's: other test apps may have added replica binds.
+    from extensions import db
+    with app.app_context():
+        db.drop_all(bind_key=None)
+        db.create_all(bind_key=None)
+        yield db
+        db.session.remove()
@@ -0,0 +1,51 @@
+"""Read views served by asgi.AsyncReads on an AsyncSession."""
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Artist
+
+
+async def request(application, path):
+    # One GET through the ASGI app, then the lifespan shutdown that
+    # disposes of its async engines on the same event loop.
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'headers': []}
+    await application(scope, receive, send)
+
+    shutdown = iter([{'type': 'lifespan.shutdown'}])
+
+    async def lifespan_receive():
+        return next(shutdown)
+
+    await application({'type': 'lifespan'}, lifespan_receive, send)
+    start, body = sent[0], sent[1]
+    return start['status'], body['body'].decode()
+
+
+def test_read_view_runs_on_an_async_session(database, monkeypatch):
+    import asgi
+    from response_cache import cache
+    database.session.add(Artist(name='Async Band', city='Springfield', state='IL', phone='5555555555'))
+    database.session.commit()
+    cache.backend.clear()
+
+    sessions = []
+    run_async = asgi.run_async
+
+    async def recording(page, session):
+        sessions.append(session)
+        return await run_async(page, session)
+
+    monkeypatch.setattr(asgi, 'run_async', recording)
+    status, html = asyncio.run(request(asgi.application, '/artists/1'))
+    assert status == 200
+    assert 'Async Band' in html
+    assert [type(session) for session in sessions] == [AsyncSession]
@@ -0,0 +1,67 @@
+"""The process-wide genre id cache and its change counter."""
+import pytest
+from sqlalchemy import event
+
+import genre_cache
+from models import Genre, Artist
+
+
+@pytest.fixture
+def session(database):
+    genre_cache.invalidate()
+    return database.session
+
+
+@pytest.fixture
+def statements(database):
+    # The SQL run on the app's engine during the test.
+    seen = []
+
+    def record(connection, cursor, statement, *args):
+        seen.append(statement)
+
+    event.listen(database.engine, 'before_cursor_execute', record)
+    yield seen
+    event.remove(database.engine, 'before_cursor_execute', record)
+
+
+def test_known_names_only_read_the_counter(session, statements):
+    ids = genre_cache.resolve_genre_ids(session, ['Jazz', 'Blues'])
+    session.commit()
+    del statements[:]
+    assert genre_cache.resolve_genre_ids(session, ['Blues', 'Jazz']) == ids
+    assert len(statements) == 1 and 'change_counter' in statements[0]
+
+
+def test_delete_in_another_process_drops_cached_ids(database, session):
+    stale = genre_cache.resolve_genre_ids(session, ['Jazz', 'Blues'])['Jazz']
+    session.commit()
+    # Another worker deletes the genre through the ORM, which bumps the
+    # counter in its transaction.
+    with database.engine.begin() as connection:
+        connection.execute(Genre.__table__.delete().where(Genre.id == stale))
+        genre_cache.bump(connection)
+
+    fresh = genre_cache.resolve_genre_ids(session, ['Jazz'])['Jazz']
+    session.commit()
+    assert fresh != stale
+    assert session.get(Genre, fresh).name == 'Jazz'
+
+
+def test_rename_and_delete_bump_the_counter(session):
+    genre = genre_cache.resolve_genres(session, ['Jazz'])[0]
+    session.commit()
+    before = genre_cache.read_counter(session)
+
+    # Linking the genre marks it dirty, but is not a rename.
+    session.add(Artist(name='Band', city='Springfield', state='IL', phone='5555555555', genres=[genre]))
+    session.commit()
+    assert genre_cache.read_counter(session) == before
+
+    session.get(Genre, genre.id).name = 'Bebop'
+    session.commit()
+    assert genre_cache.read_counter(session) == before + 1
+    session.delete(session.get(Genre, genre.id))
+    session.commit()
+    assert genre_cache.read_counter(session) == before + 2
+    assert genre_cache.cached_ids() == {}
@@ -0,0 +1,96 @@
+"""SQL statements per request of the read routes, at two sizes of data.
+
+A route whose statement count grows with the number of rows, e.g. one
+query per venue, fails here even when it stays within its budget in
+benchmarks/routes.py. Budgets and URLs are taken from that benchmark.
+"""
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from benchmarks.routes import CASES, busiest, csrf_token, fill
+
+ROUTES = [
+    'GET /venues',
+    'POST /venues/search',
+    'GET /venues/<int:venue_id>',
+    'GET /venues/<int:venue_id>/availability',
+    'GET /venues/availability',
+    'GET /venues/nearby',
+    'GET /artists',
+    'POST /artists/search',
+    'GET /artists/<int:artist_id>',
+    'GET /artists/<int:artist_id>/availability',
+    'GET /shows',
+    'GET /api/v1/venues',
+    'GET /api/v1/artists',
+    'GET /api/v1/shows',
+]
+
+# Shows to seed; venues and artists scale with them.
+SIZES = (200, 2000)
+
+
+def count_statements(app, shows):
+    # Seeds a fresh database with `shows` shows and returns the statements
+    # each route in ROUTES runs with a cold response cache.
+    from datetime import datetime, timedelta
+    from extensions import db
+    from response_cache import cache
+    from benchmarks.generate import seed
+
+    with app.app_context():
+        db.drop_all(bind_key=None)
+        db.create_all(bind_key=None)
+        with db.engine.begin() as connection:
+            seed(connection, shows=shows)
+        ids = busiest(db)
+        today = datetime.now().date()
+        ids.update(today=today.isoformat(), next_month=(today + timedelta(days=30)).isoformat())
+        engine = db.engine
+
+    counter = [0]
+
+    def count(*_):
+        if threading.current_thread() is threading.main_thread():
+            counter[0] += 1
+
+    client = app.test_client()
+    token = csrf_token(client)
+    counts = {}
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        for key in ROUTES:
+            url, data, _ = CASES[key]
+            method = key.split(' ', 1)[0]
+            if data is not None:
+                data = dict(data, csrf_token=token)
+            cache.backend.clear()
+            counter[0] = 0
+            # Streamed pages run their queries while the body is read, and
+            # closing the response pops the contexts they hold.
+            with client.open(fill(url, ids), method=method, data=fill(data, ids)) as response:
+                response.get_data()
+            assert response.status_code < 400, '%s: status %d' % (key, response.status_code)
+            counts[key] = counter[0]
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return counts
+
+
+@pytest.fixture(scope='module')
+def counts(app):
+    return {shows: count_statements(app, shows) for shows in SIZES}
+
+
+@pytest.mark.parametrize('key', ROUTES)
+def test_statements_do_not_grow_with_data(counts, key):
+    small, large = (counts[shows][key] for shows in SIZES)
+    assert small == large, '%s: %d statements with %d shows, %d with %d' % (key, small, SIZES[0], large, SIZES[1])
+
+
+@pytest.mark.parametrize('key', ROUTES)
+def test_statements_within_budget(counts, key):
+    budget = CASES[key][2]
+    assert counts[SIZES[-1]][key] <= budget
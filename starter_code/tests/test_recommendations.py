@@ -0,0 +1,133 @@
+"""Incremental refreshes of the stored recommendation lists."""
+import pytest
+
+import recommendations
+from models import Genre, Venue, Artist, recommendation
+
+COUNT = 2
+
+
+@pytest.fixture
+def catalogue(app, database, monkeypatch):
+    # Venues and artists by name, with lists COUNT long kept up to date by
+    # a refresher of this app's own.
+    monkeypatch.setitem(app.config, 'RECOMMENDATIONS_COUNT', COUNT)
+    monkeypatch.setattr(recommendations, 'refresher', recommendations.Refresher())
+    genres = {name: Genre(name=name) for name in ('Rock', 'Jazz', 'Pop', 'Blues')}
+    owners = {}
+    for model, name, names in ((Venue, 'Cellar', 'Rock Jazz'), (Venue, 'Basement', 'Rock Jazz'),
+                               (Venue, 'Lounge', 'Blues'), (Artist, 'Rocker', 'Rock'),
+                               (Artist, 'Crooner', 'Jazz'), (Artist, 'Idol', 'Pop'),
+                               (Artist, 'Drummer', 'Rock')):
+        owners[name] = model(name=name, city='Springfield', state='IL', phone='5555555555',
+                             genres=[genres[genre] for genre in names.split()])
+    database.session.add_all(list(genres.values()) + list(owners.values()))
+    commit(database)
+    return genres, owners
+
+
+def commit(db):
+    db.session.commit()
+    assert recommendations.refresher.wait(10)
+
+
+def stored(db):
+    # {(kind, entity id): [(artist id, score), ...]} as stored.
+    lists = {}
+    for row in db.session.execute(recommendation.select().order_by(
+            recommendation.c.kind, recommendation.c.entity_id, recommendation.c.rank)):
+        lists.setdefault((row.kind, row.entity_id), []).append((row.artist_id, row.score))
+    return lists
+
+
+def rebuilt(db):
+    # The lists a full rebuild computes, in the shape of stored().
+    results = recommendations.compute(db.session.connection(), COUNT)
+    return {(kind, entity_id): picks for kind, lists in results.items()
+            for entity_id, picks in lists.items() if picks}
+
+
+def listed(db, kind, owner):
+    return [artist_id for artist_id, _ in stored(db).get((kind, owner.id), [])]
+
+
+def tied(owners, *names):
+    # Artists of equal score and show count, in the order they are listed.
+    return sorted(owners[name].id for name in names)
+
+
+def test_lists_follow_creation(database, catalogue):
+    genres, owners = catalogue
+    assert listed(database, 'venue', owners['Cellar']) == tied(owners, 'Rocker', 'Crooner')
+    assert listed(database, 'artist', owners['Rocker']) == [owners['Drummer'].id]
+    assert listed(database, 'venue', owners['Lounge']) == []
+    assert stored(database) == rebuilt(database)
+
+
+def test_genre_change_rewrites_own_list(database, catalogue):
+    genres, owners = catalogue
+    owners['Lounge'].genres = [genres['Pop']]
+    commit(database)
+    assert listed(database, 'venue', owners['Lounge']) == [owners['Idol'].id]
+    assert stored(database) == rebuilt(database)
+
+
+def test_genre_change_rewrites_lists_holding_the_artist(database, catalogue):
+    genres, owners = catalogue
+    owners['Rocker'].genres = [genres['Blues']]
+    commit(database)
+    # Its own list, both venues that listed it and the artist that did.
+    assert listed(database, 'artist', owners['Rocker']) == []
+    assert listed(database, 'venue', owners['Cellar']) == tied(owners, 'Crooner', 'Drummer')
+    assert listed(database, 'venue', owners['Basement']) == tied(owners, 'Crooner', 'Drummer')
+    assert listed(database, 'artist', owners['Drummer']) == []
+    # And the venue it now fits.
+    assert listed(database, 'venue', owners['Lounge']) == [owners['Rocker'].id]
+    assert stored(database) == rebuilt(database)
+
+
+def test_higher_scoring_artist_enters_full_list(database, catalogue):
+    genres, owners = catalogue
+    # Both Rock Jazz venues hold two artists scoring 1/2.
+    assert [score for _, score in stored(database)[('venue', owners['Cellar'].id)]] == [0.5, 0.5]
+    owners['Idol'].genres = [genres['Rock'], genres['Jazz']]
+    commit(database)
+    for venue in ('Cellar', 'Basement'):
+        assert listed(database, 'venue', owners[venue]) == [owners['Idol'].id] + tied(owners, 'Rocker', 'Crooner')[:1]
+    assert stored(database) == rebuilt(database)
+
+
+def test_gaining_picks_sets_the_artist_can_enter(database, catalogue):
+    genres, owners = catalogue
+    cellar, basement, lounge = (owners[name].id for name in ('Cellar', 'Basement', 'Lounge'))
+    connection = database.session.connection()
+
+    # Against Rock Jazz, Rock Pop scores 1/3, below the full lists' 1/2.
+    owners['Idol'].genres = [genres['Rock'], genres['Pop']]
+    database.session.flush()
+    gaining = recommendations.Catalogue(connection).gaining
+    assert gaining(connection, 'venue', COUNT, {owners['Idol'].id}, set()) == set()
+    # Lists one longer are short, so any positive score gets in.
+    assert gaining(connection, 'venue', COUNT + 1, {owners['Idol'].id}, set()) == {cellar, basement}
+
+    # Rock Jazz scores 1 and enters both, found through either stand-in.
+    owners['Idol'].genres = [genres['Rock'], genres['Jazz']]
+    database.session.flush()
+    gaining = recommendations.Catalogue(connection).gaining
+    assert gaining(connection, 'venue', COUNT, {owners['Idol'].id}, set()) == {cellar, basement}
+    assert gaining(connection, 'venue', COUNT, {owners['Idol'].id}, {cellar}) == {cellar, basement}
+    assert lounge not in gaining(connection, 'venue', COUNT + 1, {owners['Idol'].id}, set())
+    database.session.rollback()
+
+
+def test_refresh_rewrites_only_affected_lists(database, catalogue):
+    genres, owners = catalogue
+    owners['Crooner'].genres = [genres['Blues']]
+    database.session.flush()
+    changed = recommendations.refresh(database.session.connection(), COUNT, artist_ids={owners['Crooner'].id})
+    assert changed == {
+        'venue': {owners['Cellar'].id, owners['Basement'].id, owners['Lounge'].id},
+        'artist': {owners['Crooner'].id},
+    }
+    assert stored(database) == rebuilt(database)
+    database.session.rollback()
@@ -0,0 +1,123 @@
+"""Tag invalidation of the response cache, on both backends."""
+import fnmatch
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Venue, Artist, Show
+from response_cache import cache, MemoryBackend, RedisBackend
+
+PAGES = ['/venues', '/venues/1', '/venues/2', '/artists', '/artists/1', '/artists/2', '/shows']
+
+
+class FakeRedis:
+    # The redis-py methods RedisBackend uses, over a dict. Values come
+    # back as bytes, as from a real server; TTLs are not enforced.
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = str(value).encode()
+
+    def setex(self, key, ttl, value):
+        self.set(key, value)
+
+    def sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(member.encode() for member in members)
+
+    def smembers(self, key):
+        return set(self.data.get(key, ()))
+
+    def expire(self, key, ttl):
+        pass
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if fnmatch.fnmatchcase(key, match)]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((getattr(self.client, name), args))
+
+    def execute(self):
+        for method, args in self.calls:
+            method(*args)
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def client(request, app, database):
+    db = database
+    start = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    db.session.add_all([Venue(name=name, city='Springfield', state='IL', phone='5555555555') for name in ('Hall', 'Club')])
+    db.session.add_all([Artist(name=name, city='Springfield', state='IL', phone='5555555555') for name in ('Band', 'Duo')])
+    db.session.flush()
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=start))
+    db.session.commit()
+
+    backend = MemoryBackend() if request.param == 'memory' else RedisBackend(FakeRedis())
+    previous = cache.backend
+    cache.init_app(app, backend=backend)
+    yield app.test_client()
+    cache.backend = previous
+
+
+def fill(client):
+    for page in PAGES:
+        assert client.get(page).status_code == 200
+    assert cached(client) == set(PAGES)
+
+
+def cached(client):
+    return {page for page in PAGES if cache.backend.get(page + '?') is not None}
+
+
+def test_entries_counts_cached_pages(client):
+    fill(client)
+    assert cache.stats()['entries'] == len(PAGES)
+    cache.invalidate({'venue:2'})
+    assert cache.stats()['entries'] == len(PAGES) - 1
+
+
+def test_venue_write_invalidates_its_pages(client, database):
+    fill(client)
+    database.session.get(Venue, 2).name = 'Cellar'
+    database.session.commit()
+    assert cached(client) == {'/venues/1', '/artists', '/artists/1', '/artists/2', '/shows'}
+
+
+def test_artist_write_invalidates_pages_showing_it(client, database):
+    fill(client)
+    database.session.get(Artist, 1).name = 'Trio'
+    database.session.commit()
+    # The venue page and the show listing list the artist's show.
+    assert cached(client) == {'/venues', '/venues/2', '/artists/2'}
+
+
+def test_show_write_invalidates_its_venue_and_artist(client, database):
+    fill(client)
+    start = datetime.now().replace(microsecond=0) + timedelta(days=2)
+    database.session.add(Show(venue_id=2, artist_id=2, start_time=start))
+    database.session.commit()
+    assert cached(client) == {'/venues/1', '/artists', '/artists/1'}
+
+
+def test_rolled_back_write_invalidates_nothing(client, database):
+    fill(client)
+    database.session.get(Venue, 1).name = 'Cellar'
+    database.session.flush()
+    database.session.rollback()
+    assert cached(client) == set(PAGES)
@@ -0,0 +1,83 @@
+"""Read replica routing, with a second SQLite database as the replica."""
+import os
+import tempfile
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from conftest import create_test_app
+from benchmarks.routes import VENUE_FORM, csrf_token
+
+
+def add_venue(connection, name):
+    from models import Venue
+    connection.execute(Venue.__table__.insert().values(
+        id=1, name=name, city='Springfield', state='IL', phone='5555555555'))
+
+
+@pytest.fixture(scope='module')
+def replicated():
+    # The replica holds the same venue under another name, so every
+    # response shows which database it was read from.
+    from extensions import db
+    directory = tempfile.mkdtemp()
+    primary_url = 'sqlite:///' + os.path.join(directory, 'primary.db')
+    replica_url = 'sqlite:///' + os.path.join(directory, 'replica.db')
+    app = create_test_app(SQLALCHEMY_DATABASE_URI=primary_url, SQLALCHEMY_BINDS={'replica0': {'url': replica_url}})
+    replica = create_engine(replica_url)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        with db.engine.begin() as connection:
+            add_venue(connection, 'Primary Hall')
+    db.metadata.create_all(replica)
+    with replica.begin() as connection:
+        add_venue(connection, 'Replica Hall')
+    yield app, replica
+    replica.dispose()
+
+
+def venue_names(client):
+    return [venue['name'] for venue in client.get('/api/v1/venues').get_json()]
+
+
+def test_marked_views_read_from_the_replica(replicated):
+    app, _ = replicated
+    assert venue_names(app.test_client()) == ['Replica Hall']
+
+
+def test_unmarked_views_read_from_the_primary(replicated):
+    app, _ = replicated
+    html = app.test_client().get('/venues/1/edit').get_data(as_text=True)
+    assert 'Primary Hall' in html and 'Replica Hall' not in html
+
+
+def test_writes_and_the_next_reads_use_the_primary(replicated):
+    import recommendations
+    from models import Venue
+    app, replica = replicated
+    client = app.test_client()
+    response = client.post('/venues/1/edit', data=dict(VENUE_FORM, name='Renamed Hall', csrf_token=csrf_token(client)))
+    recommendations.refresher.wait()
+    assert response.status_code == 302
+    with replica.connect() as connection:
+        assert connection.execute(Venue.__table__.select()).one().name == 'Replica Hall'
+
+    with client.session_transaction() as session:
+        assert session['read_primary_until'] > time.time()
+    assert venue_names(client) == ['Renamed Hall']
+    # Another client has not written.
+    assert venue_names(app.test_client()) == ['Replica Hall']
+
+    with client.session_transaction() as session:
+        session['read_primary_until'] = time.time() - 1
+    assert venue_names(client) == ['Replica Hall']
+
+
+def test_reads_use_the_primary_without_replicas(app, database):
+    import routing
+    with database.engine.begin() as connection:
+        add_venue(connection, 'Primary Hall')
+    assert routing.replicas(app) == []
+    assert routing.read_bind(app, app.view_functions['api_v1.venues']) is None
+    assert venue_names(app.test_client()) == ['Primary Hall']
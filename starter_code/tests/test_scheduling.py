@@ -0,0 +1,139 @@
+"""Double-booking checks: the flush-time check, report() and the API."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import scheduling
+from benchmarks.routes import csrf_token
+from models import Venue, Artist, Show
+
+START = datetime(2030, 6, 1, 20)
+
+
+def hours(start, end):
+    return START + timedelta(hours=start), START + timedelta(hours=end)
+
+
+@pytest.fixture
+def owners(database):
+    venues = [Venue(name='Hall %d' % n, city='Springfield', state='IL', phone='5555555555') for n in range(2)]
+    artists = [Artist(name='Band %d' % n, city='Springfield', state='IL', phone='5555555555') for n in range(2)]
+    database.session.add_all(venues + artists)
+    database.session.commit()
+    return [venue.id for venue in venues], [artist.id for artist in artists]
+
+
+def book(db, venue_id, artist_id, start, end):
+    start_time, end_time = hours(start, end)
+    db.session.add(Show(venue_id=venue_id, artist_id=artist_id, start_time=start_time, end_time=end_time))
+    db.session.commit()
+
+
+# (stored show, new show), in hours after START.
+ADJACENT = ((0, 2), (2, 4))
+OVERLAPPING = ((0, 2), (1, 3))
+NESTED = ((0, 4), (1, 2))
+
+
+@pytest.mark.parametrize('resource', ['venue', 'artist'])
+@pytest.mark.parametrize('stored, new', [OVERLAPPING, NESTED, NESTED[::-1]])
+def test_flush_rejects_overlapping_shows(database, owners, resource, stored, new):
+    (venue, other_venue), (artist, other_artist) = owners
+    book(database, venue, artist, *stored)
+    # Shared only by the resource under test.
+    shared = (venue, other_artist) if resource == 'venue' else (other_venue, artist)
+    with pytest.raises(scheduling.ShowConflict) as raised:
+        book(database, *shared, *new)
+    database.session.rollback()
+    assert [(conflict['resource'], conflict['show_id']) for conflict in raised.value.conflicts] == [(resource, 1)]
+    assert database.session.query(Show).count() == 1
+
+
+def test_flush_accepts_adjacent_shows(database, owners):
+    (venue, _), (artist, _) = owners
+    for start, end in ADJACENT:
+        book(database, venue, artist, start, end)
+    assert database.session.query(Show).count() == 2
+
+
+def test_flush_rejects_moving_a_show_onto_another(database, owners):
+    (venue, _), (artist, _) = owners
+    book(database, venue, artist, 0, 2)
+    book(database, venue, artist, 3, 5)
+    show = database.session.get(Show, 2)
+    show.start_time, show.end_time = hours(1, 3)
+    with pytest.raises(scheduling.ShowConflict):
+        database.session.commit()
+    database.session.rollback()
+
+
+def proposal(venue_id, artist_id, start, end, **extra):
+    start_time, end_time = hours(start, end)
+    return dict(extra, venue_id=venue_id, artist_id=artist_id, start_time=start_time, end_time=end_time)
+
+
+@pytest.mark.parametrize('stored, new, conflicting', [
+    (*ADJACENT, False), (*OVERLAPPING, True), (*NESTED, True), (*NESTED[::-1], True)])
+def test_report_against_stored_shows(database, owners, stored, new, conflicting):
+    (venue, _), (artist, other_artist) = owners
+    book(database, venue, artist, *stored)
+    conflicts = scheduling.report(database.session.connection(), [proposal(venue, other_artist, *new)])
+    assert [(c['booking'], c['resource'], c['show_id']) for c in conflicts] == ([(0, 'venue', 1)] if conflicting else [])
+
+
+def test_report_between_bookings(database, owners):
+    (venue, other_venue), (artist, other_artist) = owners
+    bookings = [
+        proposal(venue, artist, 0, 2),
+        proposal(venue, other_artist, 2, 4),   # adjacent to the first
+        proposal(other_venue, artist, 1, 3),   # the artist is busy
+        proposal(venue, other_artist, 2.5, 3),  # inside the second
+    ]
+    conflicts = scheduling.report(database.session.connection(), bookings)
+    assert [(c['booking'], c['resource'], c['other_booking']) for c in conflicts] == [
+        (2, 'artist', 0), (3, 'venue', 1), (3, 'artist', 1)]
+
+
+def test_report_ignores_the_show_being_moved(database, owners):
+    (venue, _), (artist, _) = owners
+    book(database, venue, artist, 0, 2)
+    conflicts = scheduling.report(database.session.connection(), [proposal(venue, artist, 1, 3, id=1)])
+    assert conflicts == []
+
+
+def test_conflicts_api(app, database, owners):
+    (venue, _), (artist, other_artist) = owners
+    book(database, venue, artist, 0, 2)
+    # Written before the checks existed: straight into the table.
+    start_time, end_time = hours(1, 3)
+    database.session.execute(Show.__table__.insert().values(
+        venue_id=venue, artist_id=other_artist, start_time=start_time, end_time=end_time))
+    database.session.commit()
+    client = app.test_client()
+
+    stored = client.get('/api/v1/shows/conflicts?from=2030-06-01&to=2030-06-02').get_json()
+    assert [(c['resource'], c['show_id'], c['other_show_id']) for c in stored] == [('venue', 1, 2)]
+
+    checked = client.post('/api/v1/shows/conflicts', json={'bookings': [
+        # Inside stored show 2, right after it, and inside show 1 up to
+        # where show 2 starts.
+        {'venue_id': venue, 'artist_id': other_artist, 'start_time': '2030-06-01T22:00:00', 'duration': 60},
+        {'venue_id': venue, 'artist_id': other_artist, 'start_time': '2030-06-01T23:00:00', 'duration': 60},
+        {'venue_id': venue, 'artist_id': artist, 'start_time': '2030-06-01T20:30:00', 'duration': 30},
+        {'venue_id': 'x', 'artist_id': artist, 'start_time': '2030-06-01T20:30:00'},
+    ]}).get_json()
+    assert checked['checked'] == 3
+    assert [invalid['booking'] for invalid in checked['invalid']] == [3]
+    assert sorted((c['booking'], c['resource'], c['show_id']) for c in checked['conflicts']) == [
+        (0, 'artist', 2), (0, 'venue', 2), (2, 'artist', 1), (2, 'venue', 1)]
+
+
+@pytest.mark.parametrize('duration', ['-30', '0', '1441'])
+def test_show_form_rejects_durations_out_of_range(app, database, owners, duration):
+    (venue, _), (artist, _) = owners
+    client = app.test_client()
+    response = client.post('/shows/create', data={
+        'venue_id': venue, 'artist_id': artist, 'start_time': '2030-06-01 20:00:00', 'duration': duration,
+        'csrf_token': csrf_token(client)})
+    assert 'Number must be between 1 and 1440.' in response.get_data(as_text=True)
+    assert database.session.query(Show).count() == 0
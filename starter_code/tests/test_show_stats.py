@@ -0,0 +1,54 @@
+"""Show counters on Venue and Artist, and the area rollup that follows them."""
+from datetime import datetime, timedelta
+
+from models import Venue, Artist, Show, area
+
+
+def counters(db, venue, artist):
+    db.session.expire_all()
+    rows = [(owner.upcoming_show_count, owner.past_show_count, owner.next_show_at) for owner in (venue, artist)]
+    rollup = db.session.execute(area.select()).one()
+    return rows[0], rows[1], (rollup.venue_count, rollup.upcoming_show_count)
+
+
+def test_counters_follow_create_reschedule_and_delete(database):
+    db = database
+    now = datetime.now().replace(microsecond=0)
+    soon, later, earlier = now + timedelta(days=1), now + timedelta(days=3), now - timedelta(days=2)
+    venue = Venue(name='Hall', city='Springfield', state='IL', phone='5555555555')
+    artist = Artist(name='Band', city='Springfield', state='IL', phone='5555555555')
+    db.session.add_all([venue, artist])
+    db.session.commit()
+    assert counters(db, venue, artist) == ((0, 0, None), (0, 0, None), (1, 0))
+
+    shows = [Show(venue_id=venue.id, artist_id=artist.id, start_time=start) for start in (soon, later, earlier)]
+    db.session.add_all(shows)
+    db.session.commit()
+    assert counters(db, venue, artist) == ((2, 1, soon), (2, 1, soon), (1, 2))
+
+    # Moving the next show into the past.
+    shows[0].start_time, shows[0].end_time = now - timedelta(days=1), now - timedelta(hours=22)
+    db.session.commit()
+    assert counters(db, venue, artist) == ((1, 2, later), (1, 2, later), (1, 1))
+
+    db.session.delete(shows[1])
+    db.session.commit()
+    assert counters(db, venue, artist) == ((0, 2, None), (0, 2, None), (1, 0))
+
+
+def test_moving_a_show_recounts_both_venues(database):
+    db = database
+    start = datetime.now().replace(microsecond=0) + timedelta(days=1)
+    first, second = (Venue(name=name, city='Springfield', state='IL', phone='5555555555') for name in 'AB')
+    artist = Artist(name='Band', city='Springfield', state='IL', phone='5555555555')
+    db.session.add_all([first, second, artist])
+    db.session.commit()
+    show = Show(venue_id=first.id, artist_id=artist.id, start_time=start)
+    db.session.add(show)
+    db.session.commit()
+
+    show.venue_id = second.id
+    db.session.commit()
+    db.session.expire_all()
+    assert (first.upcoming_show_count, first.next_show_at) == (0, None)
+    assert (second.upcoming_show_count, second.next_show_at) == (1, start)
@@ -0,0 +1,153 @@
+"""Thumbnail fetching and caching against a local stand-in for image hosts."""
+import io
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+import thumbnails as thumbnails_module
+from models import Venue, Artist
+from thumbnails import thumbnails, fetch
+
+# The stand-in listens on 127.0.0.1. URLs naming this host are let through
+# the address check as if it were public; every other host is checked.
+PUBLIC_HOST = 'images.test'
+
+
+def picture():
+    output = io.BytesIO()
+    Image.new('RGB', (1200, 800), (200, 40, 40)).save(output, 'PNG')
+    return output.getvalue()
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Answers from server.routes, {path: (status, headers, body)}, and
+    # records the paths asked for.
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        status, headers, body = self.server.routes.get(self.path, (404, {}, b''))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.routes, server.requests = {}, []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def host(server, monkeypatch):
+    # (public URL, private URL) of the stand-in.
+    server.routes.clear()
+    del server.requests[:]
+    check_url = thumbnails_module.check_url
+
+    def check_public_host(url, allow_private=False):
+        if url.startswith('http://%s:' % PUBLIC_HOST):
+            return '127.0.0.1'
+        return check_url(url, allow_private)
+
+    monkeypatch.setattr(thumbnails_module, 'check_url', check_public_host)
+    port = server.server_address[1]
+    return 'http://%s:%d' % (PUBLIC_HOST, port), 'http://127.0.0.1:%d' % port
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnails, 'directory', str(tmp_path))
+    monkeypatch.setattr(thumbnails, 'used', None)
+    return tmp_path
+
+
+def blobs(cache_dir):
+    return [name for _, _, files in os.walk(cache_dir / 'blobs') for name in files]
+
+
+def test_private_address_is_not_fetched(server, host):
+    public, private = host
+    server.routes['/a.png'] = (200, {'Content-Type': 'image/png'}, picture())
+    with pytest.raises(ValueError, match='private address'):
+        fetch(private + '/a.png')
+    assert server.requests == []
+
+
+def test_redirect_to_private_address_is_not_followed(server, host):
+    public, private = host
+    server.routes['/moved'] = (302, {'Location': private + '/a.png'}, b'')
+    server.routes['/a.png'] = (200, {'Content-Type': 'image/png'}, picture())
+    with pytest.raises(ValueError, match='private address'):
+        fetch(public + '/moved')
+    assert server.requests == ['/moved']
+
+
+def test_redirect_to_public_address_is_followed(server, host):
+    public, private = host
+    data = picture()
+    server.routes['/moved'] = (301, {'Location': '/a.png'}, b'')
+    server.routes['/a.png'] = (200, {'Content-Type': 'image/png'}, data)
+    assert fetch(public + '/moved') == data
+    assert server.requests == ['/moved', '/a.png']
+
+
+def test_too_large_body_is_rejected(server, host):
+    public, private = host
+    server.routes['/large.png'] = (200, {'Content-Type': 'image/png'}, b'x' * 2048)
+    assert fetch(public + '/large.png', max_bytes=2048) == b'x' * 2048
+    with pytest.raises(ValueError, match='larger than 2047 bytes'):
+        fetch(public + '/large.png', max_bytes=2047)
+
+
+def test_failed_source_is_redirected_to(app, database, server, host, cache_dir):
+    public, private = host
+    server.routes['/a.png'] = (200, {'Content-Type': 'image/png'}, picture())
+    database.session.add(Venue(name='Hall', city='Springfield', state='IL', image_link=private + '/a.png'))
+    database.session.commit()
+
+    response = app.test_client().get('/img/venue/1/small')
+    assert response.status_code == 302
+    assert response.headers['Location'] == private + '/a.png'
+    assert server.requests == []
+    assert blobs(cache_dir) == []
+
+
+def test_thumbnail_is_served_from_its_blob(app, database, server, host, cache_dir):
+    public, private = host
+    data = picture()
+    server.routes['/a.png'] = (200, {'Content-Type': 'image/png'}, data)
+    server.routes['/copy.png'] = (200, {'Content-Type': 'image/png'}, data)
+    database.session.add(Venue(name='Hall', city='Springfield', state='IL', image_link=public + '/a.png'))
+    database.session.add(Artist(name='Band', city='Springfield', state='IL', image_link=public + '/copy.png'))
+    database.session.commit()
+    client = app.test_client()
+
+    first = client.get('/img/venue/1/small')
+    assert first.status_code == 200
+    assert first.mimetype == 'image/jpeg'
+    assert Image.open(io.BytesIO(first.data)).size == (400, 267)
+    (name,) = blobs(cache_dir)
+    assert first.headers['ETag'] == '"%s"' % name.partition('.')[0]
+
+    second = client.get('/img/venue/1/small')
+    assert (second.status_code, second.data) == (200, first.data)
+    assert server.requests == ['/a.png']
+
+    # The same picture under another URL is fetched, but stored once.
+    third = client.get('/img/artist/1/small')
+    assert (third.status_code, third.headers['ETag']) == (200, first.headers['ETag'])
+    assert server.requests == ['/a.png', '/copy.png']
+    assert blobs(cache_dir) == [name]
@@ -0,0 +1,379 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import queue
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+
+import click
+from flask import Blueprint, abort, current_app, redirect, send_file, url_for
+from sqlalchemy import select
+
+from extensions import db
+from models import Venue, Artist
+from routing import replica_reads
+
+#----------------------------------------------------------------------------#
+# Thumbnails of venue and artist images.
+#
+#   /img/<venue|artist>/<id>/<size>
+#
+# image_link is whatever URL the owner typed in. Rather than have every
+# page view hot-link it at full size, the first request for a thumbnail
+# fetches the source once, scales it down to THUMBNAIL_SIZES[size] and
+# stores it under THUMBNAIL_CACHE_DIR:
+#
+#   blobs/ab/abcdef....jpg   thumbnail bytes, named after their SHA-256
+#   refs/<key>               name of the blob for one (source URL, size)
+#
+# Blobs are content-addressed, so the same picture linked twice is stored
+# once and its hash is the ETag. Refs older than THUMBNAIL_REFRESH_SECONDS
+# are still served, and a background thread refetches them. The same
+# thread trims the blobs to THUMBNAIL_CACHE_BYTES, least recently served
+# first. `flask prune-thumbnails` trims from the command line.
+#
+# Sources are only fetched over http(s) from public addresses, so an
+# image_link cannot make the server read its own network. The host is
+# resolved once, and the connection goes to the address that was checked,
+# so a DNS answer that changes in between cannot point the fetch
+# elsewhere; each redirect is checked the same way.
+# THUMBNAIL_ALLOW_PRIVATE_HOSTS lifts the check for a local stand-in. A
+# source that cannot be fetched or decoded is redirected to instead.
+#----------------------------------------------------------------------------#
+
+KINDS = {'venue': Venue, 'artist': Artist}
+
+# Content of a ref whose source could not be thumbnailed, and how long
+# until the worker tries it again.
+FAILED = '-'
+RETRY_SECONDS = 300
+
+# Images above this many pixels are not decoded at all.
+MAX_PIXELS = 40 * 1000 * 1000
+
+# Blobs are served far more often than their mtime needs updating.
+TOUCH_SECONDS = 60
+
+MIMETYPES = {'.jpg': 'image/jpeg', '.png': 'image/png'}
+
+#----------------------------------------------------------------------------#
+# Fetching.
+#----------------------------------------------------------------------------#
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Redirects followed per fetch.
+MAX_REDIRECTS = 5
+
+def check_url(url, allow_private=False):
+    """Resolves the host of an http(s) URL and returns the address to use.
+
+    Raises ValueError for other URLs and, unless `allow_private`, when any
+    address of the host is not public.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in DEFAULT_PORTS or not parts.hostname:
+        raise ValueError('not an http(s) URL: %r' % url)
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, parts.port or DEFAULT_PORTS[parts.scheme],
+                                       proto=socket.IPPROTO_TCP)
+    except socket.gaierror as error:
+        raise ValueError('cannot resolve %r: %s' % (parts.hostname, error))
+    hosts = [address[4][0].split('%')[0] for address in addresses]
+    if not allow_private:
+        for host in hosts:
+            if not ipaddress.ip_address(host).is_global:
+                raise ValueError('%r resolves to a private address' % parts.hostname)
+    return hosts[0]
+
+class PinnedHTTPConnection(http.client.HTTPConnection):
+    # Connects to an address resolved beforehand instead of resolving the
+    # host again. Requests still carry the host name.
+    def __init__(self, host, port, address, timeout):
+        super().__init__(host, port, timeout=timeout)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port), self.timeout)
+
+class PinnedHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, host, port, address, timeout):
+        super().__init__(host, port, timeout=timeout, context=ssl.create_default_context())
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port), self.timeout)
+        # SNI and the certificate check use the host name.
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+def fetch(url, timeout=5, max_bytes=10 * 1024 * 1024, allow_private=False):
+    for _ in range(MAX_REDIRECTS + 1):
+        address = check_url(url, allow_private)
+        parts = urllib.parse.urlsplit(url)
+        connection_class = PinnedHTTPSConnection if parts.scheme == 'https' else PinnedHTTPConnection
+        connection = connection_class(parts.hostname, parts.port or DEFAULT_PORTS[parts.scheme], address, timeout)
+        try:
+            path = urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+            connection.request('GET', path, headers={'User-Agent': 'fyyur-thumbnails'})
+            response = connection.getresponse()
+            if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                continue
+            if response.status != 200:
+                raise ValueError('%r answered %d %s' % (url, response.status, response.reason))
+            data = response.read(max_bytes + 1)
+        finally:
+            connection.close()
+        if len(data) > max_bytes:
+            raise ValueError('%r is larger than %d bytes' % (url, max_bytes))
+        return data
+    raise ValueError('more than %d redirects from %r' % (MAX_REDIRECTS, url))
+
+def resize(data, size):
+    """Scales image `data` to fit a `size` pixel square.
+
+    Returns the encoded thumbnail and its extension: PNG for images with
+    transparency, JPEG otherwise.
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    if image.width * image.height > MAX_PIXELS:
+        raise ValueError('image of %dx%d pixels' % image.size)
+    # JPEGs are decoded straight at the nearest larger scale.
+    image.draft('RGB', (size, size))
+    image.thumbnail((size, size))
+    output = io.BytesIO()
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        image.convert('RGBA').save(output, 'PNG', optimize=True)
+        return output.getvalue(), '.png'
+    image.convert('RGB').save(output, 'JPEG', quality=85, optimize=True, progressive=True)
+    return output.getvalue(), '.jpg'
+
+#----------------------------------------------------------------------------#
+# Cache.
+#----------------------------------------------------------------------------#
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+class Thumbnails:
+    def __init__(self):
+        self.directory = None
+        self.sizes = {}
+        self.max_bytes = 0
+        self.refresh_seconds = 0
+        self.max_age = 0
+        self.fetch_options = {}
+        # One lock per ref being fetched, so concurrent misses fetch once.
+        self.lock = threading.Lock()
+        self.fetching = {}
+        self.queue = queue.Queue()
+        self.queued = set()
+        self.worker = None
+        # Bytes of blobs, once the worker has counted them.
+        self.used = None
+
+    def init_app(self, app):
+        self.directory = app.config['THUMBNAIL_CACHE_DIR']
+        self.sizes = app.config['THUMBNAIL_SIZES']
+        self.max_bytes = app.config['THUMBNAIL_CACHE_BYTES']
+        self.refresh_seconds = app.config['THUMBNAIL_REFRESH_SECONDS']
+        self.max_age = app.config['THUMBNAIL_MAX_AGE']
+        self.fetch_options = {
+            'timeout': app.config['THUMBNAIL_FETCH_TIMEOUT'],
+            'max_bytes': app.config['THUMBNAIL_MAX_SOURCE_BYTES'],
+            'allow_private': app.config['THUMBNAIL_ALLOW_PRIVATE_HOSTS'],
+        }
+        app.add_template_global(thumbnail_url, 'thumbnail')
+        app.register_blueprint(bp)
+
+        @app.cli.command('prune-thumbnails')
+        @click.option('--max-bytes', type=int, default=None, help='Size to trim to (default THUMBNAIL_CACHE_BYTES).')
+        def prune_thumbnails_command(max_bytes):
+            """Delete the least recently served thumbnails over the cache size."""
+            removed, used = self.trim(self.max_bytes if max_bytes is None else max_bytes)
+            click.echo('removed %d thumbnails, %d bytes left' % (removed, used))
+
+    def key(self, url, size):
+        return hashlib.sha256(('%s\n%d' % (url, size)).encode('utf-8')).hexdigest()
+
+    def ref_path(self, key):
+        return os.path.join(self.directory, 'refs', key)
+
+    def blob_path(self, name):
+        return os.path.join(self.directory, 'blobs', name[:2], name)
+
+    def read_ref(self, key):
+        # (blob name or FAILED, age in seconds), or None without a ref.
+        path = self.ref_path(key)
+        try:
+            with open(path, encoding='ascii') as file:
+                name = file.read().strip()
+            age = time.time() - os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        if name != FAILED and not os.path.isfile(self.blob_path(name)):
+            return None
+        return name, age
+
+    def get(self, url, size):
+        """Returns the blob name of `url` at `size`, or None if it has none.
+
+        A missing thumbnail is made before returning; a stale one is
+        returned as is and queued for a refresh.
+        """
+        key = self.key(url, size)
+        ref = self.read_ref(key)
+        if ref is None:
+            with self.lock:
+                lock = self.fetching.setdefault(key, threading.Lock())
+            with lock:
+                # Whoever held the lock may have made it meanwhile.
+                ref = self.read_ref(key) or (self.refresh(url, size), 0)
+            with self.lock:
+                self.fetching.pop(key, None)
+        name, age = ref
+        if age > (RETRY_SECONDS if name == FAILED else self.refresh_seconds):
+            self.enqueue(('refresh', url, size))
+        if name == FAILED:
+            return None
+        self.touch(self.blob_path(name))
+        return name
+
+    def refresh(self, url, size):
+        """Fetches `url`, stores its thumbnail and returns the blob name."""
+        try:
+            data, extension = resize(fetch(url, **self.fetch_options), size)
+        except Exception as error:
+            current_app.logger.info('thumbnail of %s failed: %s', url, error)
+            # A thumbnail made before stays until its source is back.
+            ref = self.read_ref(self.key(url, size))
+            name = FAILED if ref is None else ref[0]
+        else:
+            name = hashlib.sha256(data).hexdigest() + extension
+            path = self.blob_path(name)
+            if not os.path.isfile(path):
+                write(path, data)
+                if self.used is not None:
+                    self.used += len(data)
+                if self.used is None or self.used > self.max_bytes:
+                    self.enqueue(('trim',))
+        write(self.ref_path(self.key(url, size)), name.encode('ascii'))
+        return name
+
+    def touch(self, path):
+        try:
+            if time.time() - os.stat(path).st_mtime > TOUCH_SECONDS:
+                os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def trim(self, max_bytes, low=None):
+        """Once the blobs take more than `max_bytes`, deletes the least
+        recently served until the rest fit in `low` (default `max_bytes`).
+        Returns how many were deleted and the bytes left.
+
+        Refs to deleted blobs count as missing, so their thumbnails are
+        made again on the next request.
+        """
+        blobs = []
+        for root, _, files in os.walk(os.path.join(self.directory, 'blobs')):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, path))
+        used = sum(size for _, size, _ in blobs)
+        removed = 0
+        if used <= max_bytes:
+            blobs = []
+        for _, size, path in sorted(blobs):
+            if used <= (max_bytes if low is None else low):
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            used -= size
+            removed += 1
+        self.used = used
+        return removed, used
+
+    #------------------------------------------------------------------------#
+    # Background worker.
+    #------------------------------------------------------------------------#
+
+    def enqueue(self, job):
+        with self.lock:
+            if job in self.queued:
+                return
+            self.queued.add(job)
+            if self.worker is None or not self.worker.is_alive():
+                app = current_app._get_current_object()
+                self.worker = threading.Thread(target=self.work, args=(app,), name='thumbnails', daemon=True)
+                self.worker.start()
+        self.queue.put(job)
+
+    def work(self, app):
+        with app.app_context():
+            while True:
+                job = self.queue.get()
+                try:
+                    if job[0] == 'refresh':
+                        self.refresh(*job[1:])
+                    else:
+                        # Trimmed to 90% so that the next few thumbnails
+                        # do not each start another walk of the cache.
+                        self.trim(self.max_bytes, self.max_bytes * 9 // 10)
+                except Exception:
+                    app.logger.exception('thumbnail job %r failed', job)
+                finally:
+                    with self.lock:
+                        self.queued.discard(job)
+                    self.queue.task_done()
+
+thumbnails = Thumbnails()
+
+#----------------------------------------------------------------------------#
+# Views.
+#----------------------------------------------------------------------------#
+
+bp = Blueprint('thumbnails', __name__)
+
+def thumbnail_url(kind, entity_id, source, size='large'):
+    # The URL carries a short hash of the source, so pages linking a new
+    # image_link never get the old picture from a browser cache.
+    if not source:
+        return ''
+    return url_for('thumbnails.thumbnail', kind=kind, entity_id=entity_id, size=size,
+                   v=hashlib.sha256(source.encode('utf-8')).hexdigest()[:8])
+
+@bp.route('/img/<kind>/<int:entity_id>/<size>')
+@replica_reads
+def thumbnail(kind, entity_id, size):
+    model = KINDS.get(kind)
+    if model is None or size not in thumbnails.sizes:
+        abort(404)
+    source = db.session.execute(select(model.image_link).where(model.id == entity_id)).scalar_one_or_none()
+    if not source or urllib.parse.urlsplit(source).scheme not in ('http', 'https'):
+        abort(404)
+
+    name = thumbnails.get(source, thumbnails.sizes[size])
+    if name is None:
+        return redirect(source)
+    response = send_file(thumbnails.blob_path(name), mimetype=MIMETYPES[os.path.splitext(name)[1]],
+                         etag=name.partition('.')[0], max_age=thumbnails.max_age)
+    response.cache_control.public = True
+    return response
@@ -0,0 +1,379 @@
+import re
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from flask import Blueprint, abort, current_app, flash, jsonify, redirect, render_template, request, url_for
+from sqlalchemy import and_, select, tuple_
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from genre_cache import resolve_genres
+from models import Venue, Artist, Show, area, DEFAULT_SHOW_DURATION, MAX_SHOW_DURATION
+from queries import partition_shows, search_results, recommended_artists, availability, availability_range, slot_json, availability_response
+from read_views import read_view
+from response_cache import cache
+from routing import replica_reads
+import geo
+import response_cache
+import scheduling
+import search
+
+#----------------------------------------------------------------------------#
+# Venue pages.
+#----------------------------------------------------------------------------#
+
+bp = Blueprint('venues', __name__)
+
+@bp.route('/venues')
+@replica_reads
+@cache.cached('venues')
+@read_view
+def venues():
+    # One page of areas from the rollup (areas.py), in (state, city) order,
+    # joined with their venues in the same query. ?state= narrows it to one
+    # state; ?after= is the "<state>:<city>" of the last area shown.
+    state = request.args.get('state', '').strip().upper()
+    after = request.args.get('after')
+    per_page = current_app.config['AREAS_PER_PAGE']
+
+    page = select(area)
+    if state:
+        page = page.where(area.c.state == state)
+    if after:
+        page = page.where(tuple_(area.c.state, area.c.city) > parse_area_cursor(after))
+    page = page.order_by(area.c.state, area.c.city).limit(per_page + 1).subquery()
+    venue_rows = (yield select(
+        page.c.state, page.c.city, page.c.venue_count, page.c.upcoming_show_count,
+        Venue.id, Venue.name, Venue.upcoming_show_count
+    ).join(Venue, and_(Venue.state == page.c.state, Venue.city == page.c.city))
+        .order_by(page.c.state, page.c.city, Venue.id)).all()
+
+    data = []
+    for (area_state, city, venue_count, upcoming_show_count), rows in groupby(venue_rows, key=itemgetter(0, 1, 2, 3)):
+        data.append({
+            "city": city,
+            "state": area_state,
+            "venue_count": venue_count,
+            "upcoming_show_count": upcoming_show_count,
+            "venues": [{
+            "id": venue_id,
+            "name": name,
+            "num_upcoming_shows": num_upcoming_shows
+            } for _, _, _, _, venue_id, name, num_upcoming_shows in rows]
+        })
+
+    next_url = None
+    if len(data) > per_page:
+        data = data[:per_page]
+        args = request.args.to_dict()
+        args['after'] = '%s:%s' % (data[-1]['state'], data[-1]['city'])
+        next_url = url_for('.venues', **args)
+
+    return render_template('pages/venues.html', areas=data, state=state, next_url=next_url)
+
+def parse_area_cursor(cursor):
+    state, separator, city = cursor.partition(':')
+    if not separator:
+        abort(400)
+    return state, city
+
+@bp.route('/venues/search', methods=['POST'])
+@replica_reads
+@read_view
+def search_venues():
+    search_term = request.form.get('search_term', '')
+    venue_ids = yield from search.find('venue', search_term, current_app.config['SEARCH_RESULTS_LIMIT'])
+    response = yield from search_results(Venue, venue_ids)
+    return render_template('pages/search_venues.html', results=response, search_term=search_term)
+
+@bp.route('/venues/<int:venue_id>')
+@replica_reads
+@cache.cached('venue:{venue_id}')
+@read_view
+def show_venue(venue_id):
+    venue = (yield select(Venue).options(joinedload(Venue.genres))
+        .where(Venue.id == venue_id)).unique().scalar_one_or_none()
+
+    if not venue:
+        return redirect(url_for('pages.index'))
+
+    genres = [ genre.name for genre in venue.genres ]
+    upcoming_shows, upcoming_shows_count, past_shows, past_shows_count = yield from \
+        partition_shows(Show.venue_id, venue_id, Artist, 'artist', current_app.config['SHOWS_PER_SECTION'])
+    response_cache.tag(*{ 'artist:%d' % show['artist_id'] for show in upcoming_shows + past_shows })
+    recommended = yield from recommended_artists('venue', venue_id)
+
+    data={
+        "id": venue_id,
+        "name": venue.name,
+        "genres": genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": (venue.phone[:3] + '-' + venue.phone[3:6] + '-' + venue.phone[6:]),
+        "website": venue.website,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        "past_shows": past_shows,
+        "past_shows_count": past_shows_count,
+        "upcoming_shows": upcoming_shows,
+        "upcoming_shows_count": upcoming_shows_count,
+        "recommended_artists": recommended
+    }
+    return render_template('pages/show_venue.html', venue=data)
+
+@bp.route('/venues/<int:venue_id>/availability')
+@replica_reads
+@cache.cached('venue:{venue_id}')
+@read_view
+def venue_availability(venue_id):
+    start, end = availability_range()
+    venues = yield from availability(Venue, Show.venue_id, Artist, Show.artist_id, 'artist',
+        Venue.id == venue_id, start, end)
+    return availability_response(venue_id, venues, 'artist', start, end)
+
+@bp.route('/venues/availability')
+@replica_reads
+@cache.cached('venues')
+@read_view
+def city_availability():
+    # Venues of ?city= (and ?state=) with a free slot of at least ?duration=
+    # minutes in the range, from the same single query as above.
+    city = request.args.get('city', '').strip()
+    state = request.args.get('state', '').strip().upper()
+    minutes = request.args.get('duration', int(DEFAULT_SHOW_DURATION.total_seconds() // 60), type=int)
+    if not city or not 0 < minutes <= MAX_SHOW_DURATION.total_seconds() // 60:
+        abort(400)
+    start, end = availability_range()
+    where = and_(Venue.state == state, Venue.city == city) if state else Venue.city == city
+    venues = yield from availability(Venue, Show.venue_id, Artist, Show.artist_id, 'artist', where, start, end)
+
+    data = []
+    for venue_id, name, bookings in venues:
+        free = scheduling.free_slots(bookings, start, end, timedelta(minutes=minutes))
+        if free:
+            data.append({ "id": venue_id, "name": name, "free": [slot_json(slot) for slot in free] })
+    return jsonify({
+        "city": city,
+        "state": state or None,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "duration": minutes,
+        "venues": data
+    })
+
+@bp.route('/venues/nearby')
+@replica_reads
+@cache.cached('venues')
+@read_view
+def nearby_venues():
+    # The venues closest to ?lat=&lon= within ?radius= km, nearest first.
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    radius = request.args.get('radius', current_app.config['NEARBY_RADIUS_KM'], type=float)
+    limit = request.args.get('limit', current_app.config['NEARBY_LIMIT'], type=int)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180) \
+            or not 0 < radius <= current_app.config['NEARBY_MAX_RADIUS_KM'] \
+            or not 0 < limit <= current_app.config['NEARBY_MAX_LIMIT']:
+        abort(400)
+    hits = yield from geo.nearby(lat, lon, radius, limit)
+    unlocated = yield from geo.unlocated()
+    return jsonify({
+        "lat": lat,
+        "lon": lon,
+        "radius": radius,
+        # Venues in cities without a centroid, which no search can find.
+        "unlocated_venues": unlocated,
+        "venues": [{
+            "id": row.id,
+            "name": row.name,
+            "city": row.city,
+            "state": row.state,
+            "distance_km": round(distance, 2),
+            "num_upcoming_shows": row.upcoming_show_count
+        } for distance, row in hits]
+    })
+
+#  ----------------------------------------------------------------
+#  Create Venue
+#  ----------------------------------------------------------------
+
+def flash_unplaced(city, state):
+    if geo.locate(city, state)[0] is None:
+        flash(f'{city}, {state} is not in our city list yet, so this venue will not show up in nearby searches.')
+
+@bp.route('/venues/create', methods=['GET'])
+def create_venue_form():
+    from forms import VenueForm
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+@bp.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+    from forms import VenueForm
+    form = VenueForm()
+
+    print(form.seeking_talent.data)
+    print(form.website_link.data)
+
+    name = form.name.data.strip()
+    city = form.city.data.strip()
+    state = form.state.data
+    address = form.address.data.strip()
+    phone = form.phone.data
+    phone = re.sub('\D', '', phone)
+    genres = form.genres.data
+    seeking_talent = form.seeking_talent.data
+    seeking_description = form.seeking_description.data.strip()
+    image_link = form.image_link.data.strip()
+    website = form.website_link.data.strip()
+    facebook_link = form.facebook_link.data.strip()
+
+    if not form.validate():
+        flash( form.errors )
+        return redirect(url_for('.create_venue_submission'))
+
+    else:
+        error_in_insert = False
+
+        try:
+            new_venue = Venue(name=name, city=city, state=state, address=address, phone=phone, \
+                seeking_talent=seeking_talent, seeking_description=seeking_description, image_link=image_link, \
+                website=website, facebook_link=facebook_link, genres=resolve_genres(db.session, genres))
+
+            db.session.add(new_venue)
+            db.session.commit()
+        except Exception as e:
+            error_in_insert = True
+            print(e)
+            db.session.rollback()
+        finally:
+            db.session.close()
+
+        if not error_in_insert:
+            flash('Venue ' + request.form['name'] + ' was successfully listed!')
+            flash_unplaced(city, state)
+            return redirect(url_for('pages.index'))
+        else:
+            flash('An error occurred. Venue ' + name + ' could not be listed.')
+            print("Error in create_venue_submission()")
+            return render_template('pages/home.html')
+
+@bp.route('/venues/<venue_id>/delete', methods=['GET'])
+def delete_venue(venue_id):
+    venue = Venue.query.get(venue_id)
+    error_on_delete = False
+    venue_name = venue.name
+    try:
+        db.session.delete(venue)
+        db.session.commit()
+    except:
+        error_on_delete = True
+        db.session.rollback()
+    finally:
+        db.session.close()
+    if error_on_delete:
+        flash(f'An error occurred deleting venue {venue_name}.')
+        print("Error in delete_venue()")
+        abort(500)
+    else:
+        flash(f'Successfully removed venue {venue_name}')
+        return jsonify({
+            'deleted': True,
+            'url': url_for('.venues')
+        })
+
+#  ----------------------------------------------------------------
+#  Update Venue
+#  ----------------------------------------------------------------
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+    from forms import VenueForm
+    venue = Venue.query.get(venue_id)
+    if not venue:
+        return redirect(url_for('pages.index'))
+    else:
+        form = VenueForm(obj=venue)
+
+    genres = [genre.name for genre in venue.genres]
+
+    print(venue.website)
+
+    venue = {
+        "id": venue_id,
+        "name": venue.name,
+        "genres": genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": (venue.phone[:3] + '-' + venue.phone[3:6] + '-' + venue.phone[6:]),
+        "website_link": venue.website,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link
+    }
+
+    print(form.website_link.data)
+    return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+    from forms import VenueForm
+    form = VenueForm()
+
+    name = form.name.data.strip()
+    city = form.city.data.strip()
+    state = form.state.data
+    address = form.address.data.strip()
+    phone = form.phone.data
+    phone = re.sub('\D', '', phone)
+    genres = form.genres.data
+    seeking_talent = form.seeking_talent.data
+    seeking_description = form.seeking_description.data.strip()
+    image_link = form.image_link.data.strip()
+    website = form.website_link.data.strip()
+    facebook_link = form.facebook_link.data.strip()
+
+    if not form.validate():
+        flash( form.errors )
+        return redirect(url_for('.edit_venue_submission', venue_id=venue_id))
+
+    else:
+        error_in_update = False
+
+        try:
+            venue = Venue.query.get(venue_id)
+            venue.genres = resolve_genres(db.session, genres)
+
+            venue.name=name
+            venue.city=city
+            venue.state=state
+            venue.address=address
+            venue.phone=phone
+            venue.seeking_talent=seeking_talent
+            venue.seeking_description = seeking_description
+            venue.image_link = image_link
+            venue.website = website
+            venue.facebook_link = facebook_link
+
+            db.session.commit()
+        except Exception as e:
+            error_in_update = True
+            print(e)
+            db.session.rollback()
+        finally:
+            db.session.close()
+
+        if not error_in_update:
+            flash('Venue ' + request.form['name'] + ' was successfully updated!')
+            flash_unplaced(city, state)
+            return redirect(url_for('.show_venue', venue_id=venue_id))
+        else:
+            flash('An error occurred. Venue ' + name + ' could not be updated.')
+            print("Error in edit_venue_submission()")
+            return render_template('pages/home.html')